@@ -0,0 +1,417 @@
+"""Loaded bots cache."""
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+
+class BotCacheEntry():
+    """Cached bot and the data needed to check if it's still valid."""
+
+    def __init__(self, bot, version: tuple, bot_id: str, subscription_id: str, size: int) -> None:
+        """
+        Initialize the entry.
+
+        :param bot: BBotCore instance
+        :param version: Bot version (dotbot updatedAt, publisher bot updatedAt)
+        :param bot_id: DotBot ID
+        :param subscription_id: Publisher bot subscription ID
+        :param size: Estimated memory used by the bot in bytes
+        """
+        self.bot = bot
+        self.version = version
+        self.bot_id = bot_id
+        self.subscription_id = subscription_id
+        self.size = size
+
+
+class BotCache():
+    """
+    Bounded LRU cache of loaded bots.
+    Bots are evicted when there are more than max_bots or when their estimated memory is over max_memory_mb,
+    and they are discarded when their version doesn't match the one in the repository.
+    Bots are handed out acquired (see BBotCore.acquire()) so evicted bots are disposed after their running volleys end.
+    """
+
+    PROJECT_PACKAGES = ('bbot', 'engines', 'channels', 'dot_repository', 'flow', 'libs')  # modules walked to estimate bots memory
+
+    def __init__(self, max_bots: int=100, max_memory_mb: int=0) -> None:
+        """
+        Initialize the cache.
+
+        :param max_bots: Maximum number of bots kept in memory
+        :param max_memory_mb: Maximum estimated memory used by cached bots in MB. 0 means no limit
+        """
+        self.max_bots = max_bots
+        self.max_memory_mb = max_memory_mb
+        self.entries = OrderedDict()    # bot key -> BotCacheEntry
+        self.memory = 0                 # estimated bytes used by all cached bots
+        self.lock = threading.RLock()
+        self.loading_locks = {}         # bot key -> lock. Concurrent requests for the same bot load it only once
+        self.invalidator = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self.logger = logging.getLogger('bbot.bot_cache')
+
+    def get(self, key: str, version: tuple):
+        """
+        Returns a cached bot if its version matches
+
+        :param key: Bot key
+        :param version: Current bot version
+        :return: BBotCore instance (acquired for the current thread) or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                entry.bot.acquire()
+                return entry.bot
+            self.misses += 1
+        if entry is not None:  # outdated
+            self.invalidate(key)
+        return None
+
+    def get_or_load(self, key: str, version: tuple, bot_id: str, subscription_id: str, loader):
+        """
+        Returns a cached bot or loads it and stores it in the cache. The bot is acquired for the current thread
+
+        :param key: Bot key
+        :param version: Current bot version
+        :param bot_id: DotBot ID
+        :param subscription_id: Publisher bot subscription ID
+        :param loader: Callable returning a new BBotCore instance
+        :return: BBotCore instance
+        """
+        bot = self.get(key, version)
+        if bot is not None:
+            return bot
+
+        with self.lock:
+            loading_lock = self.loading_locks.setdefault(key, threading.Lock())
+        with loading_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry.version == version:  # another thread loaded it while waiting
+                    entry.bot.acquire()
+                    return entry.bot
+            bot = loader()
+            bot.acquire()
+            self.put(key, version, bot, bot_id, subscription_id)
+        with self.lock:
+            self.loading_locks.pop(key, None)
+        return bot
+
+    def put(self, key: str, version: tuple, bot, bot_id: str, subscription_id: str):
+        """
+        Stores a bot in the cache evicting least recently used bots if limits are reached
+
+        :param key: Bot key
+        :param version: Bot version
+        :param bot: BBotCore instance
+        :param bot_id: DotBot ID
+        :param subscription_id: Publisher bot subscription ID
+        """
+        entry = BotCacheEntry(bot, version, bot_id, subscription_id, BotCache.estimate_size(bot))
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.memory -= old.size
+            self.entries[key] = entry
+            self.memory += entry.size
+            evicted = self._evict()
+        if old is not None and old.bot is not bot:
+            old.bot.dispose()
+        for e in evicted:
+            e.bot.dispose()
+
+    def _evict(self) -> list:
+        """
+        Evicts least recently used bots until the cache is within its limits. Call it holding the lock
+
+        :return: Evicted entries
+        """
+        evicted = []
+        max_memory = self.max_memory_mb * 1024 * 1024
+        while len(self.entries) > 1 and (
+                len(self.entries) > self.max_bots or (max_memory and self.memory > max_memory)):
+            _, entry = self.entries.popitem(last=False)
+            self.memory -= entry.size
+            self.evictions += 1
+            evicted.append(entry)
+        return evicted
+
+    def invalidate(self, key: str):
+        """
+        Removes a bot from the cache
+
+        :param key: Bot key
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return
+            self.memory -= entry.size
+            self.invalidations += 1
+        self.logger.debug('Bot %s removed from cache', key)
+        entry.bot.dispose()
+
+    def invalidate_bot(self, bot_id: str):
+        """
+        Removes all cached bots of a DotBot
+
+        :param bot_id: DotBot ID
+        """
+        with self.lock:
+            keys = [k for k, e in self.entries.items() if e.bot_id == bot_id]
+        for k in keys:
+            self.invalidate(k)
+
+    def invalidate_subscription(self, subscription_id: str):
+        """
+        Removes all cached bots of a publisher bot subscription
+
+        :param subscription_id: Publisher bot subscription ID
+        """
+        with self.lock:
+            keys = [k for k, e in self.entries.items() if e.subscription_id == subscription_id]
+        for k in keys:
+            self.invalidate(k)
+
+    def clear(self):
+        """
+        Removes all bots from the cache
+        """
+        with self.lock:
+            keys = list(self.entries.keys())
+        for k in keys:
+            self.invalidate(k)
+
+    def reset(self):
+        """
+        Drops all bots without waiting for their volleys. It runs in forked children: cached bots hold
+        database handles and plugin threads of the parent, and the volleys using them don't run in the child
+        """
+        for entry in self.entries.values():
+            entry.bot.clear_signals()
+        self.entries = OrderedDict()
+        self.memory = 0
+        self.lock = threading.RLock()
+        self.loading_locks = {}
+        self.invalidator = None  # its thread is not copied by fork. It's started again with the next bot
+
+    def check_versions(self, dotdb):
+        """
+        Removes cached bots outdated in the repository.
+        It uses one query for all dotbots and one for all publisher bots
+
+        :param dotdb: DotBot repository
+        """
+        with self.lock:
+            entries = list(self.entries.items())
+        if not entries:
+            return
+
+        bot_versions = dotdb.find_dotbot_versions(list({e.bot_id for _, e in entries}))
+        sub_ids = list({e.subscription_id for _, e in entries if e.subscription_id})
+        sub_versions = dotdb.find_publisherbot_versions(sub_ids) if sub_ids else {}
+
+        for key, entry in entries:
+            version = (bot_versions.get(entry.bot_id), sub_versions.get(entry.subscription_id) if entry.subscription_id else entry.version[1])
+            if version != entry.version:
+                self.invalidate(key)
+
+    def refresh_sizes(self):
+        """
+        Estimates again memory used by cached bots (they grow while compiling their flows on first volleys)
+        and evicts bots if the memory limit is reached
+        """
+        with self.lock:
+            entries = list(self.entries.items())
+        sizes = [(k, e, BotCache.estimate_size(e.bot)) for k, e in entries]
+        with self.lock:
+            for key, entry, size in sizes:
+                if self.entries.get(key) is entry:  # skip bots removed while estimating
+                    self.memory += size - entry.size
+                    entry.size = size
+            evicted = self._evict()
+        for e in evicted:
+            e.bot.dispose()
+
+    def set_limits(self, max_bots: int, max_memory_mb: int):
+        """
+        Changes cache limits evicting bots if needed
+
+        :param max_bots: Maximum number of bots kept in memory
+        :param max_memory_mb: Maximum estimated memory used by cached bots in MB. 0 means no limit
+        """
+        if max_bots == self.max_bots and max_memory_mb == self.max_memory_mb:
+            return
+        with self.lock:
+            self.max_bots = max_bots
+            self.max_memory_mb = max_memory_mb
+            evicted = self._evict()
+        for e in evicted:
+            e.bot.dispose()
+
+    def start_invalidator(self, dotdb, poll_interval: int=30, use_change_streams: bool=True):
+        """
+        Starts the background invalidation of outdated bots if it's not running yet
+
+        :param dotdb: DotBot repository
+        :param poll_interval: Seconds between version checks when change streams are not available
+        :param use_change_streams: Try to use MongoDB change streams first
+        """
+        with self.lock:
+            if self.invalidator is not None:
+                return
+            self.invalidator = BotCacheInvalidator(self, dotdb, poll_interval, use_change_streams)
+        self.invalidator.start()
+
+    def get_stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: Dictionary with bots, memory and counters
+        """
+        return {
+            'bots': len(self.entries),
+            'max_bots': self.max_bots,
+            'memory_mb': round(self.memory / 1024 / 1024, 2),
+            'max_memory_mb': self.max_memory_mb,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    @staticmethod
+    def estimate_size(obj, max_objects: int=100000) -> int:
+        """
+        Returns an estimation of the memory used by a bot.
+        It walks containers and objects from this project only. Shared resources (db clients, modules, etc) are not counted
+
+        :param obj: Object
+        :param max_objects: Maximum number of objects to walk
+        :return: Size in bytes
+        """
+        size = 0
+        seen = set()
+        pending = [obj]
+        while pending and len(seen) < max_objects:
+            o = pending.pop()
+            if id(o) in seen:
+                continue
+            seen.add(id(o))
+            size += sys.getsizeof(o, 0)
+            if isinstance(o, dict):
+                pending.extend(o.keys())
+                pending.extend(o.values())
+            elif isinstance(o, (list, tuple, set, frozenset)):
+                pending.extend(o)
+            elif type(o).__module__.split('.')[0] in BotCache.PROJECT_PACKAGES:
+                if hasattr(o, '__dict__'):
+                    pending.append(vars(o))
+                for cls in type(o).__mro__:  # slot based objects (ie: dot_repository models)
+                    pending.extend(getattr(o, s) for s in getattr(cls, '__slots__', ()) if hasattr(o, s))
+        return size
+
+
+class BotCacheInvalidator():
+    """
+    Removes outdated bots from the cache in background.
+    It listens to MongoDB change streams on dotbots and publisher bots collections. If they are not available
+    (standalone servers or local test stand-ins) it polls bot versions periodically.
+    """
+
+    COLLECTIONS = ['greenhouse_dotbots', 'greenhouse_publisher_bots']
+
+    def __init__(self, cache: BotCache, dotdb, poll_interval: int=30, use_change_streams: bool=True) -> None:
+        """
+        Initialize the invalidator.
+
+        :param cache: Bot cache
+        :param dotdb: DotBot repository
+        :param poll_interval: Seconds between version checks when change streams are not available
+        :param use_change_streams: Try to use MongoDB change streams first
+        """
+        self.cache = cache
+        self.dotdb = dotdb
+        self.poll_interval = poll_interval
+        self.use_change_streams = use_change_streams
+        self.stopped = threading.Event()
+        self.thread = None
+        self.logger = logging.getLogger('bbot.bot_cache')
+
+    def start(self):
+        """
+        Starts the invalidator thread
+        """
+        self.thread = threading.Thread(target=self.run, name='bot-cache-invalidator', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the invalidator thread
+        """
+        self.stopped.set()
+
+    def run(self):
+        """
+        Invalidator thread loop
+        """
+        if self.use_change_streams:
+            try:
+                self.watch()
+                return
+            except Exception as e:
+                self.logger.warning('Change streams not available. Polling bot versions every %s seconds. Error: %s', self.poll_interval, e)
+        self.poll()
+
+    def watch(self):
+        """
+        Invalidates bots on each change of their dotbot or publisher bot documents
+        """
+        pipeline = [{'$match': {'ns.coll': {'$in': BotCacheInvalidator.COLLECTIONS}}}]
+        last_refresh = time.monotonic()
+        with self.dotdb.mongo.watch(pipeline, full_document='updateLookup') as stream:
+            while not self.stopped.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self.process_change(change)
+                    continue
+                if time.monotonic() - last_refresh > self.poll_interval:
+                    self.cache.refresh_sizes()
+                    last_refresh = time.monotonic()
+                self.stopped.wait(1)
+
+    def process_change(self, change: dict):
+        """
+        Invalidates bots affected by a change stream event
+
+        :param change: Change event
+        """
+        document = change.get('fullDocument')
+        if not document:  # deleted documents can't be mapped to bots
+            self.cache.clear()
+        elif change['ns']['coll'] == 'greenhouse_dotbots':
+            self.cache.invalidate_bot(document.get('botId'))
+        else:
+            self.cache.invalidate_subscription(document.get('subscriptionId'))
+
+    def poll(self):
+        """
+        Checks bot versions periodically
+        """
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                self.cache.check_versions(self.dotdb)
+                self.cache.refresh_sizes()
+            except Exception as e:
+                self.logger.error('Error checking cached bots versions: %s', e)
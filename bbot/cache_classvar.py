@@ -1,10 +1,16 @@
 """Cache for run-time persistance."""
+import time
+import threading
 from bbot.core import Cache
 
 class CacheClassvar(Cache):
-    """Cache."""
+    """
+    Cache.
+    It keeps up to max_size entries. When it's full the oldest set entries are removed (expired ones are removed when read).
+    """
 
-    cache = {} # type: dict
+    cache = {} # type: dict  key -> (value, expiration timestamp or None)
+    lock = threading.Lock()
 
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
@@ -13,16 +19,46 @@ class CacheClassvar(Cache):
         """
         super().__init__(config)
 
+        self.max_size = 10000
 
-    def set(self, key: str, val):
+
+    def set(self, key: str, val, ttl: int=None):
         """
         """
-        super().set()
-        self.cache[key] = val
+        ttl = self.get_ttl(ttl)
+        with CacheClassvar.lock:
+            self.cache.pop(key, None)  # set values are the newest ones
+            self.cache[key] = (val, time.monotonic() + ttl if ttl else None)
+            self.evict()
 
     def get(self, key: str):
         """
         """
-        super().get()
-        return self.cache.get(key)
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            with CacheClassvar.lock:
+                if self.cache.get(key) is entry:  # not set again by another thread
+                    del self.cache[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def delete(self, key: str):
+        """
+        """
+        with CacheClassvar.lock:
+            self.cache.pop(key, None)
 
+    def evict(self) -> None:
+        """
+        Removes the oldest entries until the cache is within max_size. Call it holding the lock
+        """
+        if not self.max_size:
+            return
+        while len(self.cache) > self.max_size:
+            self.cache.pop(next(iter(self.cache)), None)
+            self.evictions += 1
@@ -0,0 +1,127 @@
+"""In-process LRU cache with expiration."""
+import time
+import threading
+from collections import OrderedDict
+from bbot.core import Cache
+
+
+class CacheLRU(Cache):
+    """
+    Process-wide LRU cache with per entry time to live.
+    Entries are shared by all bots in the process but not between processes (see CacheRedis for that).
+    """
+
+    entries = OrderedDict()     # key -> (value, expiration timestamp or None)
+    lock = threading.Lock()
+
+    def __init__(self, config: dict, dotbot: dict) -> None:
+        """
+        Initialize the plugin.
+
+        :param config: Configuration values for the instance.
+        """
+        super().__init__(config)
+
+        self.max_size = 10000
+
+    def set(self, key: str, val, ttl: int=None) -> None:
+        """
+        Set cache value evicting least recently used entries if the cache is full
+
+        :param key: Key
+        :param val: Value
+        :param ttl: Time to live in seconds. Default ttl is used if None
+        """
+        ttl = self.get_ttl(ttl)
+        with CacheLRU.lock:
+            CacheLRU.entries[key] = (val, time.monotonic() + ttl if ttl else None)
+            CacheLRU.entries.move_to_end(key)
+            self.evict()
+
+    def set_many(self, values: dict, ttl: int=None) -> None:
+        """
+        Set many cache values
+
+        :param values: Dictionary with values by key
+        :param ttl: Time to live in seconds. Default ttl is used if None
+        """
+        ttl = self.get_ttl(ttl)
+        expiration = time.monotonic() + ttl if ttl else None
+        with CacheLRU.lock:
+            for key, val in values.items():
+                CacheLRU.entries[key] = (val, expiration)
+                CacheLRU.entries.move_to_end(key)
+            self.evict()
+
+    def get(self, key: str):
+        """
+        Get cached value
+
+        :param key: Key
+        :return: Value or None if not found or expired
+        """
+        with CacheLRU.lock:
+            return self.get_entry(key, time.monotonic())
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Get many cached values
+
+        :param keys: List of keys
+        :return: Dictionary with found values by key
+        """
+        values = {}
+        now = time.monotonic()
+        with CacheLRU.lock:
+            for key in keys:
+                value = self.get_entry(key, now)
+                if value is not None:
+                    values[key] = value
+        return values
+
+    def get_entry(self, key: str, now: float):
+        """
+        Returns a value removing it if expired. Call it holding the lock
+
+        :param key: Key
+        :param now: Current monotonic time
+        :return: Value or None if not found or expired
+        """
+        entry = CacheLRU.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del CacheLRU.entries[key]
+            self.misses += 1
+            return None
+        CacheLRU.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def delete(self, key: str) -> None:
+        """
+        Delete cached value
+
+        :param key: Key
+        """
+        with CacheLRU.lock:
+            CacheLRU.entries.pop(key, None)
+
+    def evict(self) -> None:
+        """
+        Removes least recently used entries until the cache is within max_size. Call it holding the lock
+        """
+        if not self.max_size:
+            return
+        while len(CacheLRU.entries) > self.max_size:
+            CacheLRU.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: Dictionary with size, hits, misses and evictions
+        """
+        return {**super().get_stats(), 'size': len(CacheLRU.entries), 'max_size': self.max_size}
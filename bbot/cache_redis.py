@@ -0,0 +1,129 @@
+"""Redis cache shared between processes."""
+import json
+import logging
+import redis
+from bbot.core import Cache, BBotLoggerAdapter
+
+
+class CacheRedis(Cache):
+    """
+    Cache stored in a Redis compatible server so all workers share it.
+    Values are stored as JSON. Size is bounded by the server maxmemory policy (use allkeys-lru).
+    Server errors are logged and handled as cache misses so the bot keeps working without cache.
+    """
+
+    redis_clients = {}  # redis clients cache by uri
+
+    def __init__(self, config: dict, dotbot: dict) -> None:
+        """
+        Initialize the plugin.
+
+        :param config: Configuration values for the instance.
+        """
+        super().__init__(config)
+
+        if 'uri' not in config:
+            raise RuntimeError("FATAL ERR: Missing config var uri")
+
+        self.config = config
+        self.logger_level = ''
+        self.key_prefix = 'bbot:'
+        self.socket_timeout = 1
+        self.errors = 0
+
+    def init(self, parent):
+        """
+        Initialize the connection
+        """
+        self.logger = BBotLoggerAdapter(logging.getLogger('cache_redis'), self, parent, 'cache_redis')
+
+        uri = self.config['uri']
+        client = CacheRedis.redis_clients.get(uri)
+        if client is None:
+            client = redis.Redis.from_url(uri, socket_timeout=self.socket_timeout, socket_connect_timeout=self.socket_timeout)
+            CacheRedis.redis_clients[uri] = client
+        self.redis = client
+
+    def set(self, key: str, val, ttl: int=None) -> None:
+        """
+        Set cache value
+
+        :param key: Key
+        :param val: Value
+        :param ttl: Time to live in seconds. Default ttl is used if None
+        """
+        self.set_many({key: val}, ttl)
+
+    def set_many(self, values: dict, ttl: int=None) -> None:
+        """
+        Set many cache values in a single round trip
+
+        :param values: Dictionary with values by key
+        :param ttl: Time to live in seconds. Default ttl is used if None
+        """
+        ttl = self.get_ttl(ttl)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, val in values.items():
+                pipe.set(self.key_prefix + key, json.dumps(val), px=int(ttl * 1000) if ttl else None)
+            pipe.execute()
+        except (TypeError, ValueError) as e:
+            self.logger.warning('Value is not serializable. Not caching it: ' + str(e))
+        except redis.RedisError as e:
+            self.errors += 1
+            self.logger.warning('Error writing to cache: ' + str(e))
+
+    def get(self, key: str):
+        """
+        Get cached value
+
+        :param key: Key
+        :return: Value or None if not found or expired
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Get many cached values in a single round trip
+
+        :param keys: List of keys
+        :return: Dictionary with found values by key
+        """
+        if not keys:
+            return {}
+        try:
+            results = self.redis.mget([self.key_prefix + k for k in keys])
+        except redis.RedisError as e:
+            self.errors += 1
+            self.misses += len(keys)
+            self.logger.warning('Error reading from cache: ' + str(e))
+            return {}
+
+        values = {}
+        for key, result in zip(keys, results):
+            if result is None:
+                self.misses += 1
+                continue
+            self.hits += 1
+            values[key] = json.loads(result)
+        return values
+
+    def delete(self, key: str) -> None:
+        """
+        Delete cached value
+
+        :param key: Key
+        """
+        try:
+            self.redis.delete(self.key_prefix + key)
+        except redis.RedisError as e:
+            self.errors += 1
+            self.logger.warning('Error deleting from cache: ' + str(e))
+
+    def get_stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: Dictionary with hits, misses, evictions and errors
+        """
+        return {**super().get_stats(), 'errors': self.errors}
@@ -1,12 +1,63 @@
 """Manage configuration settings."""
-import errno
+import ast
 import os
 import re
+import signal
+import pickle
+import hashlib
+import tempfile
+import threading
 import yaml
 from dotenv import load_dotenv
 
 config_cache = {}
 
+ENV_PATTERN = re.compile(r'^\<%= ENV\[\'(.*)\'\] %\>(.*)$')
+ENV_UNQUOTED_PATTERN = re.compile(r'^\<%= ENV_UNQUOTED\[\'(.*)\'\] %\>(.*)$')
+ENV_NAMES_PATTERN = re.compile(r'\<%= ENV(?:_UNQUOTED)?\[\'(.*?)\'\] %\>')
+
+# Parsed configurations are stored in this folder, created private to the user running bbot.
+# Snapshots contain interpolated secrets so they are only written when the operator sets it
+SNAPSHOT_PATH = os.environ.get('BBOT_CONFIG_SNAPSHOT_PATH')
+
+
+class FrozenDict(dict):
+    """
+    Read only dictionary. Configuration is shared by all threads so it can't be changed once loaded.
+    It's still a dict so it can be used anywhere a dict is expected (ie: {**config, 'key': value} makes a new dict)
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Configuration is read only')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class ConfigLoader(getattr(yaml, 'CLoader', yaml.Loader)):
+    """YAML loader interpolating environment variables. ERB like tags are resolved once, not per load."""
+
+
+def env_constructor(loader, node):
+    value = loader.construct_scalar(node)
+    env_var, remaining_path = ENV_PATTERN.match(value).groups()
+    return os.environ[env_var] + remaining_path
+
+
+def env_unquoted_constructor(loader, node):
+    value = loader.construct_scalar(node)
+    env_var, remaining_path = ENV_UNQUOTED_PATTERN.match(value).groups()
+    return ast.literal_eval(os.environ[env_var] + remaining_path)  # numbers, booleans, lists... not code
+
+
+ConfigLoader.add_implicit_resolver('!env', ENV_PATTERN, None)
+ConfigLoader.add_constructor('!env', env_constructor)
+ConfigLoader.add_implicit_resolver('!env_unquoted', ENV_UNQUOTED_PATTERN, None)
+ConfigLoader.add_constructor('!env_unquoted', env_unquoted_constructor)
+
+
 def load_configuration(config_path: str, var_name: str,
                        environment_name: str = "",) -> dict:
     """
@@ -15,6 +66,8 @@ def load_configuration(config_path: str, var_name: str,
     Load configuration settings from a YAML file and interpolate its content
     with environment variables. If not specified, environment name will be
     autodetected from the environment variable identified by var_name.
+    The result is cached in memory and, if BBOT_CONFIG_SNAPSHOT_PATH is set, in a snapshot file reused
+    while the YAML file and the environment variables it uses don't change. See reload_configuration().
 
     :param config_path: Full path to the configuation files.
     :param var_name: The name of environment variable (e.g.: "BBOT_ENV").
@@ -22,51 +75,116 @@ def load_configuration(config_path: str, var_name: str,
                              to be used instead of the value of 'var_name'
     :raises RuntimeError if environment variable 'var_name' is not defined.
     :raises FileNotFoundError if the configuration file is not found.
-    :return: A dictionary of configuration settings.
-    """    
+    :return: A read only dictionary of configuration settings.
+    """
     if not environment_name:
         if not var_name in os.environ:
             raise RuntimeError(
                 f"FATAL ERRR: Missing environment variable {var_name}"
             )
         environment_name = os.environ[var_name]
-    else:
+    elif os.environ.get(var_name) != environment_name:
         os.environ[var_name] = environment_name
 
     # Remember the path
-    os.environ["BBOT_CONFIG_PATH"] = config_path
+    if os.environ.get("BBOT_CONFIG_PATH") != config_path:
+        os.environ["BBOT_CONFIG_PATH"] = config_path
 
     # Check if config is cached
     config_cache_key = config_path + '|' + environment_name
-    if (config_cache_key in config_cache.keys()):        
-        print("BBot config found in cache")
-        return config_cache[config_cache_key]    
+    config = config_cache.get(config_cache_key)
+    if config is not None:
+        return config
 
     # Load .env file
     env_file = config_path + '/.env_'+ environment_name
     load_dotenv(env_file)
-    
+
     # Load YAML file and interpolate its content with environment variables
     config_file = config_path + "/config_" + environment_name + ".yml"
-
-    pattern = re.compile(r'^\<%= ENV\[\'(.*)\'\] %\>(.*)$')
-    yaml.add_implicit_resolver("!env", pattern)
-    def env_constructor(loader, node):
-        value = loader.construct_scalar(node)
-        env_var, remaining_path = pattern.match(value).groups()
-        return os.environ[env_var] + remaining_path
-    yaml.add_constructor('!env', env_constructor)
-
-    pattern_unquoted = re.compile(r'^\<%= ENV_UNQUOTED\[\'(.*)\'\] %\>(.*)$')
-    yaml.add_implicit_resolver("!env_unquoted", pattern_unquoted)
-    def env_unquoted_constructor(loader, node):
-        value = loader.construct_scalar(node)
-        env_var, remaining_path = pattern_unquoted.match(value).groups()
-        return eval(os.environ[env_var] # pylint: disable=eval-used
-                    + remaining_path)
-    yaml.add_constructor('!env_unquoted', env_unquoted_constructor)
-    
     with open(config_file, 'r') as ymlfile:
-        config = yaml.load(ymlfile, Loader=yaml.Loader) # https://github.com/yaml/pyyaml/issues/265
-        config_cache[config_cache_key] = config
-        return config
+        text = ymlfile.read()
+        mtime = os.fstat(ymlfile.fileno()).st_mtime_ns
+
+    # Snapshot is valid while the file and the environment variables it uses are the same
+    env_values = [name + '=' + os.environ.get(name, '') for name in sorted(set(ENV_NAMES_PATTERN.findall(text)))]
+    snapshot_key = hashlib.sha1('\n'.join([os.path.abspath(config_file), str(mtime)] + env_values).encode()).hexdigest()
+    config = load_snapshot(snapshot_key)
+    if config is None:
+        config = freeze(yaml.load(text, Loader=ConfigLoader)) # https://github.com/yaml/pyyaml/issues/265
+        save_snapshot(snapshot_key, config)
+
+    config_cache[config_cache_key] = config
+    return config
+
+
+def freeze(value):
+    """
+    Returns a read only copy of a configuration value: dicts are converted to FrozenDict and lists to tuples
+
+    :param value: Configuration value
+    :return: Read only value
+    """
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def load_snapshot(snapshot_key: str):
+    """
+    Returns the configuration stored in the snapshot file
+
+    :param snapshot_key: Snapshot key
+    :return: Configuration or None if there is no snapshot for the key
+    """
+    if not SNAPSHOT_PATH:
+        return None
+    try:
+        if hasattr(os, 'getuid') and os.stat(SNAPSHOT_PATH).st_uid != os.getuid():  # only trust our own snapshots
+            return None
+        with open(os.path.join(SNAPSHOT_PATH, snapshot_key + '.pickle'), 'rb') as snapshot_file:
+            return pickle.load(snapshot_file)
+    except Exception: # missing or broken snapshot. It's parsed again
+        return None
+
+
+def save_snapshot(snapshot_key: str, config: dict) -> None:
+    """
+    Stores the configuration in a snapshot file. The file is replaced atomically so concurrent workers don't read it half written
+
+    :param snapshot_key: Snapshot key
+    :param config: Configuration
+    """
+    if not SNAPSHOT_PATH:
+        return
+    try:
+        os.makedirs(SNAPSHOT_PATH, mode=0o700, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=SNAPSHOT_PATH)
+        with os.fdopen(fd, 'wb') as snapshot_file:
+            pickle.dump(config, snapshot_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, os.path.join(SNAPSHOT_PATH, snapshot_key + '.pickle'))
+    except OSError: # read only filesystem. It will be parsed again next time
+        pass
+
+
+def reload_configuration(*args) -> None:
+    """
+    Drops configurations in memory so they are loaded again on next use.
+    Changed files or environment variables are parsed again, others are read from their snapshots.
+    It runs on SIGHUP when the server installs it (see install_reload_signal()). Objects built with the previous
+    configuration keep it.
+    """
+    config_cache.clear()
+
+
+def install_reload_signal() -> None:
+    """
+    Reloads configuration on SIGHUP instead of terminating the process. Server entry points call it when
+    reload_on_sighup setting is enabled. It's installed only if SIGHUP is not handled already (ie: by the server)
+    """
+    if not hasattr(signal, 'SIGHUP') or threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGHUP) == signal.SIG_DFL:
+        signal.signal(signal.SIGHUP, reload_configuration)
@@ -6,17 +6,73 @@ import importlib
 import logging
 import logging.config
 import datetime
+import threading
+import time
+import types
 import smokesignal
 from box import Box
 from logging.config import DictConfigurator
 from bbot.config import load_configuration
+from bbot.bot_cache import BotCache
+from bbot.extensions_cache import ExtensionsCache
+from bbot.function_prefetcher import FunctionPrefetcher
+from bbot.lazy_plugin import LazyPlugin
 
 from typing import Any
 
 
+class VolleyState():
+    """
+    Descriptor for attributes holding data of the running volley (request, response, user id, etc).
+    Bot instances are cached and shared by concurrent requests, so these values are stored per thread
+    while everything else in the bot object graph is built once and only read during volleys.
+    """
+
+    def __init__(self, default=None) -> None:
+        """
+        Initialize the descriptor.
+
+        :param default: Initial value. Use a callable returning the initial value for mutable types
+        """
+        self.default = default
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        state = VolleyState.get_state(instance)
+        try:
+            return getattr(state, self.name)
+        except AttributeError:
+            value = self.default() if callable(self.default) else self.default
+            setattr(state, self.name, value)
+            return value
+
+    def __set__(self, instance, value):
+        setattr(VolleyState.get_state(instance), self.name, value)
+
+    @staticmethod
+    def get_state(instance) -> threading.local:
+        """
+        Returns the volley state storage of the instance for the current thread
+
+        :param instance: Object holding volley state
+        :return: Thread local storage
+        """
+        state = instance.__dict__.get('_volley_state')
+        if state is None:
+            state = instance.__dict__.setdefault('_volley_state', threading.local())
+        return state
+
+
 class Plugin(metaclass=abc.ABCMeta):
     """Generic plugin."""
 
+    load_profile = {}   # plugin class -> {'count', 'import', 'load'} seconds spent loading it. See get_load_profile()
+
     def __init__(self, config: dict) -> None:
         """
         Initialize the plugin.
@@ -38,7 +94,15 @@ class Plugin(metaclass=abc.ABCMeta):
         :return: An instance of the class defined in plugin_settings
         """
         #print('Loading module ' + plugin_settings['plugin_class'])
-        plugin = Plugin.get_class_from_fullyqualified(plugin_settings['plugin_class'])(plugin_settings, dotbot)                
+        if parent is not None and LazyPlugin.is_lazy(plugin_settings):  # imported and loaded on first use
+            plugin = LazyPlugin(plugin_settings, dotbot)
+            plugin.init(parent)
+            return plugin
+
+        start = time.perf_counter()
+        plugin_class = Plugin.get_class_from_fullyqualified(plugin_settings['plugin_class'])
+        imported = time.perf_counter()
+        plugin = plugin_class(plugin_settings, dotbot)
         for attr_name in vars(plugin):
             if attr_name in plugin_settings:
                 attr_config = plugin_settings[attr_name]
@@ -56,8 +120,25 @@ class Plugin(metaclass=abc.ABCMeta):
         #@TODO we might change this to run directly on _init_ with a callback
         if hasattr(plugin, 'init'):            
             plugin.init(parent)
+
+        profile = Plugin.load_profile.get(plugin_settings['plugin_class'], {'count': 0, 'import': 0, 'load': 0})
+        Plugin.load_profile[plugin_settings['plugin_class']] = {
+            'count': profile['count'] + 1,
+            'import': profile['import'] + imported - start,
+            'load': profile['load'] + time.perf_counter() - imported}
         return plugin
 
+    @staticmethod
+    def get_load_profile() -> list:
+        """
+        Returns the time spent importing and loading each plugin class, most expensive first.
+        Load time includes the plugin children and import time includes modules imported for the first time
+
+        :return: List of dicts with plugin_class, count, import and load seconds
+        """
+        profile = [{'plugin_class': plugin_class, **values} for plugin_class, values in Plugin.load_profile.items()]
+        return sorted(profile, key=lambda p: p['import'] + p['load'], reverse=True)
+
     @staticmethod
     def get_class_from_fullyqualified(setting_class):
         """
@@ -82,12 +163,22 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
     SIGNAL_GET_RESPONSE_BEFORE = 'get_response_before'
     SIGNAL_CALL_BBOT_FUNCTION_AFTER = 'call_function_after'
     SIGNAL_CALL_BBOT_FUNCTION_BEFORE = 'call_function_before'
+    SIGNAL_PREFETCH_BBOT_FUNCTION = 'prefetch_function'    # handlers set 'allowed' False if the call would be rejected
     SIGNAL_TEMPLATE_RENDER = 'template_render'
 
     FNC_RESPONSE_OK = 1
     FNC_RESPONSE_ERROR = 0
 
-    bot_memory_repo = {}
+    bot_memory_repo = BotCache()    # loaded bots cache
+
+    # Volley data. It's stored per thread so cached bots can serve concurrent volleys
+    user_id = VolleyState('')
+    request = VolleyState(dict)
+    response = VolleyState(lambda: {'output': []})
+    executed_functions = VolleyState(list)
+    prefetched_calls = VolleyState(dict)     # function calls running in background by key
+    is_fallback = VolleyState(False)
+    held = VolleyState(0)                    # uses of the bot taken by the thread. See acquire()
 
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
@@ -105,20 +196,20 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
         self.extensions = []
         self.pipeline = []
 
-        self.is_fallback = False
-        self.user_id = ''
         self.bot_id = ''
         self.org_id = ''
         self.logger_level = ''
-        self.request = {}
-        self.executed_functions = []
+        self.prefetch_workers = 8     # Threads running prefetchable functions concurrently. 0 disables prefetching
         self.bot = None
 
         self.functions_map = {}    # Registered template functions
 
         self.bbot = BBotFunctionsProxy(self)
 
-        smokesignal.clear_all() # this shouldnt be needed. @TODO build the whole obj hierarchy, store it in a static var and decouple request session data
+        self.signals = set()       # Signals subscribed on this bot. They are namespaced so bots don't get other bots events
+        self.in_use = 0            # Uses not ended yet by all threads. A disposed bot keeps its signals until they end
+        self.disposed = False
+        self.use_lock = threading.Lock()
 
     def init(self, none):
         """
@@ -132,10 +223,15 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
         config_path = os.path.abspath(os.path.dirname(__file__) + "/../instance")
         config = load_configuration(config_path, "BBOT_ENV")
         
+        self.bot_id = self.dotbot.bot_id
         self.bot = Plugin.load_plugin(config["chatbot_engines"][self.dotbot.chatbot_engine['type']], self.dotbot, self)               
         self.logger = BBotLoggerAdapter(logging.getLogger('core'), self, self.bot, 'core')        
         self.bot.core = self
 
+        # All functions are registered now. Build template functions namespace once
+        self.bbot.reset_functions_map()
+        self.bbot.get_functions_namespace()
+
         #self.bot.init()
 
     def register_function(self, function_name: str, callback: dict):
@@ -145,12 +241,24 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
         :param function_name: .flow function name
         :param callback: callable array class/method of plugin method
         """
+        fmap = self.functions_map.get(function_name)
+        if fmap is not None and fmap.get('lazy'):  # lazy plugin loaded. Entry is updated in place as it's already bound
+            fmap.update(callback)
+            fmap['lazy'] = False
+            return
         self.functions_map[function_name] = {**self.functions_map.get(function_name, {}), **callback}
+        self.bbot.reset_functions_map()
+        if hasattr(self.bot, 'reset_compiled'):  # compiled bot objects have function map entries pre-bound
+            self.bot.reset_compiled()
         
     def resolve_arg(self, arg: list, f_type: str='R', render: bool=False):
         """
+        Resolves a function argument with the chatbot engine (ie: DotFlow2 runs the functions and variables in it)
         """        
-        return arg
+        resolve_arg = getattr(self.bot, 'resolve_arg', None)
+        if resolve_arg is None:
+            return arg
+        return resolve_arg(arg, f_type, render)
 
     def get_response(self, request: dict) -> dict:
         """
@@ -160,25 +268,104 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
         :return: A response to the input data.
         """
         
+        self.bot.reset()
         self.response = self.bot.response
         self.request = request
-        self.bot.reset()        
-        self.bot.user_id = request.get('user_id', '')
+        self.user_id = request.get('user_id', '')
+        self.executed_functions = []
+        self.prefetched_calls = {}
+        self.bot.user_id = self.user_id
         self.bot.pub_id = request.get('pub_id', '')
         
         try:
-            smokesignal.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, {})
+            self.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, {})
             self.bot.get_response(request)      # get bot response                       
             self.process_pipeline()             # run pipelin process: this proces changes bot output            
-            smokesignal.emit(BBotCore.SIGNAL_GET_RESPONSE_AFTER, {'bbot_response': self.response})  # triggers event: none of these should modify output
+            self.emit(BBotCore.SIGNAL_GET_RESPONSE_AFTER, {'bbot_response': self.response})  # triggers event: none of these should modify output
         except BBotCoreHalt as e: # this exception is used to do a soft halt
             self.logger.debug(e)  
         #except BBotCoreError as e: # this exception sends exception msg to the bot output
         #    self.bbot.text(e)
+        finally:
+            if self.prefetched_calls:
+                FunctionPrefetcher.cancel(self.prefetched_calls)
+            self.release()
         
-        self.logger.debug('Response from bbot metaengine: ' + str(self.response))
+        self.logger.debug('Response from bbot metaengine: %s', self.response)
         return self.response
 
+    def on(self, signal: str, callback):
+        """
+        Subscribes a callback to a signal emitted by this bot
+
+        :param signal: Signal name (see BBotCore.SIGNAL_* constants)
+        :param callback: Callable receiving the signal data
+        """
+        signal_name = self.get_signal_name(signal)
+        self.signals.add(signal_name)
+        smokesignal.on(signal_name, callback)
+
+    def emit(self, signal: str, *args, **kwargs):
+        """
+        Emits a signal to the callbacks subscribed on this bot
+
+        :param signal: Signal name (see BBotCore.SIGNAL_* constants)
+        """
+        signal_name = self.get_signal_name(signal)
+        if signal_name in self.signals:  # smokesignal adds an entry for every signal emitted, even without callbacks
+            smokesignal.emit(signal_name, *args, **kwargs)
+
+    def get_signal_name(self, signal: str) -> str:
+        """
+        Returns the signal name namespaced for this bot instance
+
+        :param signal: Signal name
+        :return: Namespaced signal name
+        """
+        return signal + ':' + str(id(self))
+
+    def acquire(self):
+        """
+        Marks the bot as in use by the current thread until its volley ends (see release()) so disposing it
+        doesn't unsubscribe its callbacks in the middle of the volley. Bots cache calls it when handing out a bot
+        """
+        with self.use_lock:
+            self.in_use += 1
+        self.held += 1
+
+    def release(self):
+        """
+        Ends the uses of the bot taken by the current thread. A disposed bot is cleaned up when its last use ends
+        """
+        held = self.held
+        if not held:
+            return
+        self.held = 0
+        with self.use_lock:
+            self.in_use -= held
+            dispose = self.disposed and not self.in_use
+        if dispose:
+            self.clear_signals()
+
+    def dispose(self):
+        """
+        Unsubscribes all callbacks of this bot. Call it when the bot instance is discarded.
+        If the bot is in use it's done when the running volleys end
+        """
+        with self.use_lock:
+            self.disposed = True
+            if self.in_use:
+                return
+        self.clear_signals()
+
+    def clear_signals(self):
+        """
+        Unsubscribes all callbacks of this bot
+        """
+        for signal_name in self.signals:
+            smokesignal.receivers.pop(signal_name, None)
+        self.signals = set()
+
     def process_pipeline(self):
         """
         Executes all processes listed in the pipeline configuration
@@ -190,7 +377,7 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
         """      
         Appends a new output object
         """
-        self.logger.debug('Adding to output: ' + str(bbot_output_obj))
+        self.logger.debug('Adding to output: %s', bbot_output_obj)
         if not add_last or len(self.response['output']) == 0:
             self.response['output'].append(bbot_output_obj) # append output
         else:
@@ -212,22 +399,55 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
         :param chatbot_engine_name: Name of engine to create. If ommited,
                             defaults to value specified under the key
                             "bbot.default_chatbot_engine" in configuration file.
-        :return: Instance of BBotCore class.
+        :return: Instance of BBotCore class. Bots not cached are disposed when their volley ends
         """
                 
-        print("5")
-        if config['bot_caching'] and dotbot.id in BBotCore.bot_memory_repo.keys():
-            print('Bot found in memory')
-            bbot = BBotCore.bot_memory_repo[dotbot.id]
-        else:                        
-            print('Loading bot')
-            bbot = Plugin.load_plugin(config, dotbot)  
-
-            if config['bot_caching']:
-                BBotCore.bot_memory_repo[dotbot.id] = bbot # store in memory 
-        
+        if not config.get('bot_caching'):
+            logging.getLogger('core').debug('Loading bot')
+            bbot = Plugin.load_plugin(config, dotbot)
+            bbot.acquire()
+            bbot.dispose()  # not reused. Its callbacks are unsubscribed when its volley ends
+            return bbot
+
+        cache = BBotCore.bot_memory_repo
+        cache.set_limits(config.get('bot_cache_max_bots', 100), config.get('bot_cache_max_memory_mb', 0))
+        botsubscription = getattr(dotbot, 'botsubscription', None)
+        bbot = cache.get_or_load(
+            BBotCore.get_bot_cache_key(dotbot), BBotCore.get_bot_version(dotbot),
+            dotbot.bot_id, getattr(botsubscription, 'id', None),
+            lambda: Plugin.load_plugin(config, dotbot))
+
+        invalidator = config.get('bot_cache_invalidator')  # 'change_streams' or 'polling'
+        if invalidator and cache.invalidator is None:
+            dotdb = bbot.dotdb or getattr(bbot.bot, 'dotdb', None)
+            if dotdb:
+                cache.start_invalidator(dotdb, config.get('bot_cache_poll_interval', 30), invalidator == 'change_streams')
+
         return bbot
 
+    @staticmethod
+    def get_bot_cache_key(dotbot) -> str:
+        """
+        Returns the key of the bot in the memory cache.
+        Same bot subscribed by different publishers has different services and channels so they are cached separately
+
+        :param dotbot: DotBot extended with its subscription
+        :return: Cache key
+        """
+        botsubscription = getattr(dotbot, 'botsubscription', None)
+        return dotbot.bot_id + '_' + str(getattr(botsubscription, 'id', ''))
+
+    @staticmethod
+    def get_bot_version(dotbot) -> tuple:
+        """
+        Returns the version of the bot. Cached bots are rebuilt when it changes
+
+        :param dotbot: DotBot extended with its subscription
+        :return: Bot version
+        """
+        botsubscription = getattr(dotbot, 'botsubscription', None)
+        return (getattr(dotbot, 'updated_at', None), getattr(botsubscription, 'updated_at', None))
+
     @staticmethod
     def create_request(
         chan_input: dict, user_id: str, bot_id: str = "", org_id: str = "", pub_id: str = "", channel_id: str = "") -> dict:
@@ -264,24 +484,14 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
 
     def extensions_cache(func):
         """
-        Decorator to apply cache to extensions
-        @TODO add ttl 5min
-        """
-        def function_wrapper(self, args, f_type):                        
-            # key = botid_methodname_arg0_arg1_arg2
-            # adds args only if they are string, integer or boolean (avoiding nonhashable values [even in nested values])
-            key = self.core.bot_id + "_" + func.__name__
-            for arg in args:
-                if isinstance(arg, (str, int, bool)):
-                    key += "_" + str(arg)
-            cached = self.core.cache.get(key)
-            if cached is None:
-                value = func(self, args, f_type)
-                self.core.cache.set(key, value)
-                return value
-            else:
-                self.logger.debug('Found cached value!')
-                return cached
+        Decorator to apply cache to extensions. Values expire after the function cache_ttl set in the functions map (or the cache ttl)
+        Arguments are resolved first so the key depends on their values (ie: the city in a variable), not on the expressions
+        """
+        def function_wrapper(self, args, f_type):
+            args = [self.core.resolve_arg(arg, f_type) for arg in args]
+            key = ExtensionsCache.get_key(self.core.bot_id, func.__name__, args)
+            fmap = self.core.bbot.get_functions_map().get(func.__name__)
+            return ExtensionsCache.call(self.core.cache, key, lambda: func(self, args, f_type), fmap, self.logger)
 
         return function_wrapper
 
@@ -295,6 +505,14 @@ class BBotCore(Plugin, metaclass=abc.ABCMeta):
 class ChatbotEngine(Plugin, metaclass=abc.ABCMeta):
     """Abstract base class for chatbot engines."""
 
+    # Volley data. It's stored per thread so cached bots can serve concurrent volleys
+    user_id = VolleyState('')
+    pub_id = VolleyState('')
+    channel_id = VolleyState('')
+    is_fallback = VolleyState(False)
+    request = VolleyState(dict)
+    response = VolleyState(lambda: {'output': []})
+
     @abc.abstractmethod
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
@@ -306,8 +524,9 @@ class ChatbotEngine(Plugin, metaclass=abc.ABCMeta):
 
         self.dotbot = dotbot
         self.config = config
-        self.channel_id = None
         self.logger = None        
+        self.logger_level = ''
+        self.bot_id = self.dotbot.bot_id
 
         self.reset()
         
@@ -332,12 +551,13 @@ class ChatbotEngine(Plugin, metaclass=abc.ABCMeta):
         self.bbot = core.bbot
     
     def reset(self):
+        """
+        Resets volley data
+        """
         self.user_id = ''
         self.pub_id = ''
         self.channel_id = ''
-        self.logger_level = ''
         self.is_fallback = False
-        self.bot_id = self.dotbot.bot_id
         self.request = {}  
         self.response = {
             'output': []           
@@ -405,21 +625,86 @@ class Cache(Plugin, metaclass=abc.ABCMeta):
         """
         super(Cache, self).__init__(config)
 
+        self.ttl = 300          # Default time to live in seconds. 0 means no expiration
+        self.max_size = 0       # Maximum number of entries. 0 means no limit
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     @abc.abstractmethod
-    def set(self) -> None:
+    def set(self, key: str, val, ttl: int=None) -> None:
         """
         Set cache value
+
+        :param key: Key
+        :param val: Value
+        :param ttl: Time to live in seconds. Default ttl is used if None
         """
         return ""
 
     @abc.abstractmethod
-    def get(self) ->str:
+    def get(self, key: str):
         """
         Get cached value
+
+        :param key: Key
+        :return: Value or None if not found or expired
         """
         return ""
 
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Delete cached value
+
+        :param key: Key
+        """
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Get many cached values
+
+        :param keys: List of keys
+        :return: Dictionary with found values by key
+        """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, values: dict, ttl: int=None) -> None:
+        """
+        Set many cache values
+
+        :param values: Dictionary with values by key
+        :param ttl: Time to live in seconds. Default ttl is used if None
+        """
+        for key, value in values.items():
+            self.set(key, value, ttl)
+
+    def get_ttl(self, ttl: int=None) -> int:
+        """
+        Returns ttl to use on a set
+
+        :param ttl: Time to live in seconds or None to use default
+        :return: Time to live in seconds
+        """
+        return self.ttl if ttl is None else ttl
+
+    def get_stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: Dictionary with hits, misses and evictions
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
 
 
 class BBotLoggerAdapter(logging.LoggerAdapter):
@@ -439,6 +724,7 @@ class BBotLoggerAdapter(logging.LoggerAdapter):
 
         self.bot = bot
         self.mod_name = mod_name
+        self.volley = threading.local()     # log context of the volley running on each thread
 
         if module.logger_level:            
             self.setLevel(module.logger_level)
@@ -452,46 +738,41 @@ class BBotLoggerAdapter(logging.LoggerAdapter):
 
     def process(self, msg, kwargs):
         """
+        Adds bot and user data to the log record. It only runs for messages above the logger level and the
+        message is formatted with its args later on by the handler, so calls below the level cost almost nothing.
+        Use lazy formatting: logger.debug('Response: %s', response) instead of 'Response: ' + str(response)
 
         :param msg:
         :param kwargs:
         :return:
         """        
         # We need to set extras here because we need bot object ref to get user_id when available (it's not available at extension's init)
+        kwargs["extra"] = self.get_context()
+        return msg, kwargs
 
-        bot_id = ''
-        try:
-            bot_id = self.bot.dotbot['id']
-        except (AttributeError, TypeError):        
-            pass
-
-        bot_name = ''
-        try:
-            bot_name = self.bot.dotbot['name']
-        except (AttributeError, TypeError):        
-            pass
-
-        user_id = ''
-        try:
-            user_id = self.bot.user_id
-        except (AttributeError, TypeError):        
-            pass
-
-        user_ip = ''
-        try:
-            user_ip = self.bot.user_ip
-        except (AttributeError, TypeError):        
-            pass
-
-        extra = {
-            'bot_id': bot_id,
-            'bot_name': bot_name,
-            'user_id': user_id,
-            'user_ip': user_ip
-        }
+    def get_context(self) -> dict:
+        """
+        Returns the context data of the running volley. It's built on the first message of the volley and reused
+        while the bot and user don't change
 
-        kwargs["extra"] = extra
-        return msg, kwargs
+        :return: Dictionary with bot id, bot name, user id and user ip
+        """
+        dotbot = getattr(self.bot, 'dotbot', None)
+        user_id = getattr(self.bot, 'user_id', '')
+        user_ip = getattr(self.bot, 'user_ip', '')
+        context = getattr(self.volley, 'context', None)
+        if context is None or self.volley.dotbot is not dotbot or context['user_id'] != user_id \
+                or context['user_ip'] != user_ip:
+            bot_id = bot_name = ''
+            try:
+                bot_id = dotbot['id']
+                bot_name = dotbot['name']
+            except (AttributeError, TypeError, KeyError):
+                pass
+            context = {'bot_id': bot_id, 'bot_name': bot_name, 'user_id': user_id, 'user_ip': user_ip}
+            self.volley.dotbot = dotbot
+            self.volley.context = context
+        return context
 
 
 class BBotFunctionsProxy:
@@ -503,40 +784,111 @@ class BBotFunctionsProxy:
     """    
     def __init__(self, core: BBotCore):
         self.core = core
+        self._functions_map = None          # bbot and bot engine functions map
+        self._functions_namespace = {}      # immutable function namespaces by scope
 
     def __getattr__(self, name):
-        def wrapper(*args, **kwargs):   
+        if name.startswith('__'):  # do not proxy python special attributes
+            raise AttributeError(name)
+
+        function = self.get_functions_namespace().get(name)
+        if function is not None:
+            return function
+
+        def wrapper(*args, **kwargs):
+            err_msg = 'Tried to run function "' + name + '" but it\'s not registered'
+            self.core.logger.debug(err_msg)            
+            raise BBotException(err_msg)
 
-            try:
-                f_type
-            except NameError:
-                f_type = 'R'
-                        
-            # define function map woth both bbot and bot engine functions
-            self.global_functions_map = self.core.functions_map
-            if hasattr(self.core.bot, 'functions_map'):
-                self.global_functions_map = {**self.global_functions_map, **self.core.bot.functions_map}
-            
-            if name in self.global_functions_map: # will throw exception if bot doesnt have functions map
-                return self.call_function(name, args, f_type)
-            else:
-                err_msg = 'Tried to run function "' + name + '" but it\'s not registered'
-                self.core.logger.debug(err_msg)            
-                raise BBotException(err_msg)
-        
         return wrapper
 
-    def call_function(self, func_name: str, args: list, f_type: str='R'):
+    def get_function(self, name: str, fmap: dict):
+        """
+        Returns a callable running the BBot function
+
+        :param name: Name of the function
+        :param fmap: Function map entry
+        :return: Callable
+        """
+        def wrapper(*args, **kwargs):
+            return self.call_function(name, args, kwargs.get('f_type', 'R'), fmap)
+
+        return wrapper
+
+    def get_functions_map(self) -> dict:
+        """
+        Returns functions map with both bbot and bot engine functions
+        """
+        functions_map = self._functions_map
+        if functions_map is None:
+            functions_map = self.core.functions_map
+            if hasattr(self.core.bot, 'functions_map'):
+                functions_map = {**functions_map, **self.core.bot.functions_map}
+            self._functions_map = functions_map
+        return functions_map
+
+    def get_functions_namespace(self, include_engine_functions: bool=True) -> types.MappingProxyType:
+        """
+        Returns an immutable namespace with a callable for each registered function.
+        It's built once and rebuilt only when the functions map changes
+
+        :param include_engine_functions: Include functions registered by the bot engine
+        :return: Mapping of function name to callable
+        """
+        namespace = self._functions_namespace.get(include_engine_functions)
+        if namespace is None:
+            functions_map = self.get_functions_map() if include_engine_functions else self.core.functions_map
+            namespace = types.MappingProxyType(
+                {name: self.get_function(name, fmap) for name, fmap in functions_map.items()})
+            self._functions_namespace = {**self._functions_namespace, include_engine_functions: namespace}
+        return namespace
+
+    def prefetch(self, calls: list) -> int:
+        """
+        Starts running calls to prefetchable functions in background so they run concurrently.
+        call_function will use their responses when the bot engine runs them
+
+        Payment handlers check each call with SIGNAL_PREFETCH_BBOT_FUNCTION before it starts, so paid calls only run
+        ahead when SIGNAL_CALL_BBOT_FUNCTION_BEFORE won't reject them
+
+        :param calls: List of (function name, args list, f_type). Calls to functions not prefetchable or not allowed are skipped
+        :return: Number of calls started
+        """
+        functions_map = self.get_functions_map()
+        prefetchable = []
+        for func_name, args, f_type in calls:
+            fmap = functions_map.get(func_name)
+            if fmap is None or not fmap.get('prefetchable') or 'object' not in fmap:
+                continue
+            data = {'name': func_name, 'args': args, 'register_enabled': fmap['register_enabled'], 'data': fmap, 'allowed': True}
+            self.core.emit(BBotCore.SIGNAL_PREFETCH_BBOT_FUNCTION, data)
+            if data['allowed']:
+                prefetchable.append((func_name, args, f_type, fmap))
+        started = FunctionPrefetcher(self.core.prefetch_workers).prefetch(prefetchable, self.core.prefetched_calls)
+        if started:
+            self.core.logger.debug('Prefetching %s function calls', started)
+        return started
+
+    def reset_functions_map(self):
+        """
+        Drops functions map and namespaces. Needs to be called each time a function is registered
+        """
+        self._functions_map = None
+        self._functions_namespace = {}
+
+    def call_function(self, func_name: str, args: list, f_type: str='R', fmap: dict=None):
         """
         Executes a BBot function or any bot engine function listed in functions_map attribute
 
         :param func_name: Name of the function
         :param args: List with arguments
         :param f_type: Function Type
+        :param fmap: Function map entry. It will be looked up by name if not provided
         :return:
         """        
-        self.core.logger.debug('Calling function "' + func_name + '" with args ' + str(args))
-        fmap = self.global_functions_map[func_name]
+        self.core.logger.debug('Calling function "%s" with args %s', func_name, args)
+        if fmap is None:
+            fmap = self.get_functions_map()[func_name]
 
         start = datetime.datetime.now()
         response = None
@@ -544,11 +896,17 @@ class BBotFunctionsProxy:
         error_message = ""
         cost = fmap['cost']
         exception = None
+        prefetched = None
+        if fmap.get('prefetchable') and self.core.prefetched_calls:
+            prefetched = self.core.prefetched_calls.pop(FunctionPrefetcher.get_key(func_name, args, f_type), None)
 
         try:
-            smokesignal.emit(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_BEFORE, {'name': func_name, 'args': args, 'register_enabled': fmap['register_enabled'], 'data': fmap}) 
+            self.core.emit(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_BEFORE, {'name': func_name, 'args': args, 'register_enabled': fmap['register_enabled'], 'data': fmap}) 
 
-            response = getattr(fmap['object'], fmap['method'])(args, f_type)            
+            if prefetched is not None:
+                response = prefetched.result()
+            else:
+                response = getattr(fmap['object'], fmap['method'])(args, f_type)
 
             # convert dict into box to gain dotted notation access
             if isinstance(response, dict):
@@ -561,17 +919,21 @@ class BBotFunctionsProxy:
             cost = 0
             response = '<error>' #@TODO customize and handle it by environment        
         end = datetime.datetime.now()
-        self.core.logger.debug('Function response: ' + str(response))
+        self.core.logger.debug('Function response: %s', response)
 
         # Adds debug information about the executed function
-        self.core.executed_functions.append({
+        executed_function = {
             'function': func_name,
             'args': args,
             'return': response,
             'responseTime': int((end - start).total_seconds() * 1000)
-        })
+        }
+        if prefetched is not None:  # response time is the time the function ran, not the time waited for it
+            executed_function['responseTime'] = int((prefetched.end - prefetched.start).total_seconds() * 1000)
+            executed_function['prefetched'] = True
+        self.core.executed_functions.append(executed_function)
                         
-        smokesignal.emit(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_AFTER, 
+        self.core.emit(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_AFTER, 
             {
                 'name': func_name,                 
                 'response_code': resp_code,                 
@@ -585,3 +947,7 @@ class BBotFunctionsProxy:
         else:            
             exception.args = (func_name  + ' function error', ) + exception.args
             raise exception # propagate it to stop all functions execution
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=lambda: BBotCore.bot_memory_repo.reset())
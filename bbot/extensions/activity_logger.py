@@ -1,12 +1,16 @@
 """Registers bot activity"""
 
+import os
+import atexit
+import queue
 import logging
+import threading
 import time
 import datetime
-import smokesignal
-from pymongo import MongoClient, DeleteMany
+from pymongo import DeleteMany
 from bson.objectid import ObjectId
 from bbot.core import BBotCore, ChatbotEngine, BBotException, BBotLoggerAdapter
+from bbot.mongo_registry import MongoRegistry
 
 class ActivityLogger():
     """Registers in a DB some bot activity"""
@@ -14,6 +18,9 @@ class ActivityLogger():
     ACTIVITY_TYPE_VOLLEY    = 1
     ACTIVITY_TYPE_FUNCTION  = 2
 
+    writers = {}        # activity writers by uri. All bots in the process share them
+    lock = threading.Lock()
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
         Initialize the plugin.
@@ -23,7 +30,14 @@ class ActivityLogger():
         
         self.logger_level = ''
 
+        self.batch_size = 500           # Max documents written by each insert_many
+        self.flush_interval = 1         # Max seconds an activity waits in memory before being written
+        self.max_queue_size = 10000     # Max activities waiting to be written
+        self.overflow_policy = ActivityWriter.OVERFLOW_DROP  # What to do when the queue is full: drop or block
+
+        self.mongo_registry = MongoRegistry.get_default()
         self.core = None
+        self.writer = None
         self.logger = None
 
         self.logger = BBotLoggerAdapter(logging.getLogger('core_ext.reg_act'), self, self.core, 'RegisterActivity')        
@@ -35,19 +49,31 @@ class ActivityLogger():
         """
         self.core = core
         
-        # Initialize the connection @TODO improve this
+        # Initialize the connection
         if 'mongodb_uri' not in self.config:
             raise RuntimeError("FATAL ERR: Missing config var uri")
         uri = self.config['mongodb_uri']
-        client = MongoClient(uri)
-        parts = uri.split("/")
-        last_part = parts.pop()
-        parts = last_part.split("?")
-        database_name = parts[0]
-        self.mongo = client[database_name]
+        with ActivityLogger.lock:
+            self.writer = ActivityLogger.writers.get(uri)
+            if self.writer is None:
+                self.writer = ActivityWriter(
+                    self.mongo_registry.get_database(uri).activity, self.batch_size, self.flush_interval, self.max_queue_size, self.overflow_policy)
+                self.writer.start()
+                ActivityLogger.writers[uri] = self.writer
+
+        self.core.on(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_AFTER, self.register_function_call)
+        self.core.on(BBotCore.SIGNAL_GET_RESPONSE_AFTER, self.register_volley)
 
-        smokesignal.on(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_AFTER, self.register_function_call)
-        smokesignal.on(BBotCore.SIGNAL_GET_RESPONSE_AFTER, self.register_volley)
+    @staticmethod
+    def reset():
+        """
+        Forgets all writers. It runs in forked children: writer threads are not copied by fork so their queues
+        would never be written. Activities queued in the parent are written by the parent
+        """
+        for writer in ActivityLogger.writers.values():
+            atexit.unregister(writer.close)
+        ActivityLogger.writers = {}
+        ActivityLogger.lock = threading.Lock()
 
     def register_volley(self, data):
         """
@@ -79,7 +105,7 @@ class ActivityLogger():
 
     def register_activity(self, data):
         """
-        Common register function
+        Common register function. The activity is written in background
         """                    
         doc = {
             "_id" : ObjectId(),
@@ -94,8 +120,134 @@ class ActivityLogger():
         #if data.get('data') is not None:
         #    doc = {**doc, **data['data']}
 
-        self.mongo.activity.insert(doc)
+        self.writer.write(doc)
+
+
+class ActivityWriter():
+    """
+    Writes activity documents in background with bulk inserts.
+    Documents are buffered in a bounded queue and written when there are batch_size of them or after flush_interval.
+    Pending documents are written on interpreter shutdown.
+    """
+
+    OVERFLOW_DROP = 'drop'     # discard new activities when the queue is full so volleys never wait for the db
+    OVERFLOW_BLOCK = 'block'   # wait up to block_timeout for room in the queue, then discard
+
+    def __init__(self, collection, batch_size: int=500, flush_interval: float=1, max_queue_size: int=10000,
+                 overflow_policy: str=OVERFLOW_DROP, block_timeout: float=1) -> None:
+        """
+        Initialize the writer.
+
+        :param collection: MongoDB collection
+        :param batch_size: Max documents written by each insert_many
+        :param flush_interval: Max seconds a document waits in memory before being written
+        :param max_queue_size: Max documents waiting to be written
+        :param overflow_policy: What to do when the queue is full: drop or block
+        :param block_timeout: Seconds to wait for room in the queue with block policy
+        """
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(max_queue_size)
+        self.stopped = threading.Event()
+        self.thread = None
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self.logger = logging.getLogger('core_ext.reg_act')
+
+    def start(self):
+        """
+        Starts the writer thread
+        """
+        self.thread = threading.Thread(target=self.run, name='activity-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, doc: dict):
+        """
+        Queues a document to be written
+
+        :param doc: Activity document
+        """
+        try:
+            if self.overflow_policy == ActivityWriter.OVERFLOW_BLOCK:
+                self.queue.put(doc, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(doc)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                self.logger.warning('Activity queue is full. ' + str(self.dropped) + ' activities dropped so far')
+
+    def run(self):
+        """
+        Writer thread loop
+        """
+        while not self.stopped.is_set() or not self.queue.empty():
+            batch = self.get_batch()
+            if batch:
+                self.insert(batch)
+
+    def get_batch(self) -> list:
+        """
+        Waits for documents until there are batch_size of them or flush_interval passed
+
+        :return: List of documents
+        """
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=min(timeout, 0.1)))  # short waits to notice stop requests
+            except queue.Empty:
+                if self.stopped.is_set():
+                    break
+        return batch
+
+    def insert(self, batch: list):
+        """
+        Writes documents with a single bulk insert
+
+        :param batch: List of documents
+        """
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            self.logger.error('Error writing ' + str(len(batch)) + ' activities: ' + str(e))
+
+    def close(self, timeout: float=10):
+        """
+        Writes pending documents and stops the writer thread
+
+        :param timeout: Max seconds to wait for pending documents to be written
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def get_stats(self) -> dict:
+        """
+        Returns writer counters
+
+        :return: Dictionary with queued, written, dropped and failed documents
+        """
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
+
 
-    
-    
-    
\ No newline at end of file
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ActivityLogger.reset)
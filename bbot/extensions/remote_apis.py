@@ -3,6 +3,7 @@ import requests
 import logging
 import sys, traceback, os
 from bbot.core import BBotCore, ChatbotEngine, BBotException, BBotLoggerAdapter, BBotExtensionException
+from bbot.http_client import HTTPClient
 
 class RemoteAPIs():
     """Calls remote API endpoints"""
@@ -18,6 +19,7 @@ class RemoteAPIs():
         self.logger_level = ''
         self.request_timeout = 1
         self.dotdb = None
+        self.http_client = HTTPClient.get_default()
 
         self.core = None
         
@@ -56,6 +58,7 @@ class RemoteAPIs():
                     'user': serv.get('user'),
                     'passwd': serv.get('passwd'),                     
                     'mapped_vars': serv['mapped_vars'],
+                    'prefetchable': serv.get('prefetchable', serv['method'] == 'get'),  # GET services must not have side effects
                 }}
                 
             core.register_function(serv['function_name'], fmap)
@@ -93,7 +96,7 @@ class RemoteAPIs():
                 try: 
                     
                     if r_api_data['request_method'] == 'get':                        
-                        r = requests.get(
+                        r = self.http_client.get(
                             url,  
                             params = params, 
                             headers = r_api_data['headers'], 
@@ -102,7 +105,7 @@ class RemoteAPIs():
                             allow_redirects=True,
                             )  
                     else:
-                        r = requests.post(
+                        r = self.http_client.post(
                             url, 
                             data = params, 
                             headers = r_api_data['headers'], 
@@ -9,6 +9,9 @@ from bbot.core import ChatbotEngine, BBotException, BBotLoggerAdapter
 class SendEmail():
     """Sends email"""
 
+    # Functions registered by the plugin. Read before it's loaded when it's lazy (see LazyPlugin)
+    FUNCTIONS = {'sendEmail': {'method': 'sendEmail', 'cost': 0.001, 'register_enabled': True}}
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
         Initialize the plugin.
@@ -29,7 +32,8 @@ class SendEmail():
         """
         self.core = core
         self.logger = BBotLoggerAdapter(logging.getLogger('core_ext.send_email'), self, self.core, '$sendEmail')        
-        core.register_function('sendEmail', {'object': self, 'method': 'sendEmail', 'cost': 0.001, 'register_enabled': True})
+        for function_name, fmap in SendEmail.FUNCTIONS.items():
+            core.register_function(function_name, {**fmap, 'object': self})
 
     def sendEmail(self, args, f_type):
         """
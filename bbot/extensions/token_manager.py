@@ -1,7 +1,9 @@
 """Token Manager"""
+import os
+import time
 import logging
 import codecs
-import smokesignal
+import threading
 import datetime
 import dateutil.relativedelta
 from bbot.core import BBotCore, BBotCoreHalt, ChatbotEngine, BBotException, BBotLoggerAdapter, BBotExtensionException
@@ -13,6 +15,12 @@ class TokenManager():
     SUBSCRIPTION_TYPE_PER_USE = 'perUse'
     SUBSCRIPTION_TYPE_MONTHLY = 'perMonth'
 
+    SUBSCRIPTION_PERIOD = datetime.timedelta(days=30)
+
+    payment_status = {}  # subscription id -> (paid, datetime until the status is valid)
+    payment_watcher = None
+    lock = threading.Lock()
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
         Initialize the plugin.
@@ -25,6 +33,10 @@ class TokenManager():
         self.core = None    
         self.token_manager = None
         self.greenhousedb = None
+        self.payment_ledger = None      # Optional. Settles per use payments in background instead of during the volley
+        self.unpaid_status_ttl = 60     # Seconds an unpaid subscription status is cached so new payments are noticed soon
+        self.watch_payments = True      # Invalidate cached payment status on new payments using MongoDB change streams
+        self.watch_max_backoff = 60     # Max seconds waited before opening the payments stream again after an error
 
     def init(self, core: BBotCore):
         """
@@ -34,9 +46,16 @@ class TokenManager():
         self.core = core
         self.logger = BBotLoggerAdapter(logging.getLogger('ext.token_mgnt'), self, self.core.bot, '$token')                
 
-        smokesignal.on(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_BEFORE, self.function_payment)
-        smokesignal.on(BBotCore.SIGNAL_GET_RESPONSE_AFTER, self.volley_payment)
-        smokesignal.on(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, self.payment_check)
+        if self.payment_ledger:
+            self.payment_ledger.start(self.token_manager)
+
+        if self.watch_payments and self.greenhousedb:
+            self.start_payment_watcher()
+
+        self.core.on(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_BEFORE, self.function_payment)
+        self.core.on(BBotCore.SIGNAL_PREFETCH_BBOT_FUNCTION, self.function_prefetch_check)
+        self.core.on(BBotCore.SIGNAL_GET_RESPONSE_AFTER, self.volley_payment)
+        self.core.on(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, self.payment_check)
 
     def payment_check(self, data):
         """
@@ -49,29 +68,100 @@ class TokenManager():
             if not paid:
                 self.logger.debug('Publisher last payment is more than a month ago.')
                 self.insufficient_funds()
-        """
-        Disabling this for now. We need to make tx async in order to stop wait for a response we dont need at the moment
-        elif self.core.get_publisher_subscription_type() == TokenManager.SUBSCRIPTION_TYPE_PER_USE and self.dotbot.per_use_cost > 0:
+        elif self.core.get_publisher_subscription_type() == TokenManager.SUBSCRIPTION_TYPE_PER_USE and self.payment_ledger \
+                and self.dotbot.per_use_cost:
+            # balance is served from the ledger cache so this doesn't wait for the wallet on each volley
             self.logger.debug('Per use suscription. Will check balance first')
-            if not self.previous_checkings():
+            if not self.previous_checkings(self.dotbot.owner_name, self.core.get_publisher_name()):
                 return
 
-            pbalance = self.token_manager.get_balance(self.core.get_publisher_name())
-            if pbalance < self.minimum_accepted_balance:
+            if not self.payment_ledger.has_funds(self.core.get_publisher_name(), self.minimum_accepted_balance):
                 self.logger.debug('Publisher balance is less than ' + str(self.minimum_accepted_balance))                
                 self.insufficient_funds()
-        """        
+
     def check_period_payment_status(self, subscription_id):
+        """
+        Returns True if the subscription was paid in the last 30 days.
+        Paid status is cached until the exact instant it expires (last payment + 30 days) so the database
+        is queried at most once per period. Unpaid status is cached unpaid_status_ttl seconds.
+
+        :param subscription_id: Subscription ID
+        :return: bool
+        """
+        now = datetime.datetime.now()
+        subscription_id = str(subscription_id)
+        cached = TokenManager.payment_status.get(subscription_id)
+        if cached is not None and now < cached[1]:
+            return cached[0]
+
         self.logger.debug('Checking payment of subscriptionId ' + str(subscription_id))
         lastPaymentDate = self.greenhousedb.get_last_payment_date_by_subscription_id(subscription_id)
         if not lastPaymentDate:
             self.logger.debug('There is no payments')
-            return False
-        delta = (datetime.datetime.now() - lastPaymentDate).days
-        self.logger.debug('Last payment date is ' + str(lastPaymentDate) + ' - days ago: ' + str(delta))
-        if delta >= 30:
-            return False
-        return True
+            paid = False
+        else:
+            self.logger.debug('Last payment date is ' + str(lastPaymentDate) + ' - days ago: ' + str((now - lastPaymentDate).days))
+            paid = now < lastPaymentDate + TokenManager.SUBSCRIPTION_PERIOD
+
+        if paid:
+            TokenManager.payment_status[subscription_id] = (True, lastPaymentDate + TokenManager.SUBSCRIPTION_PERIOD)
+        else:
+            TokenManager.payment_status[subscription_id] = (False, now + datetime.timedelta(seconds=self.unpaid_status_ttl))
+        return paid
+
+    @staticmethod
+    def invalidate_payment_status(subscription_id=None):
+        """
+        Removes cached payment status. Call it when a subscription payment is stored
+
+        :param subscription_id: Subscription ID. All subscriptions if None
+        """
+        if subscription_id is None:
+            TokenManager.payment_status.clear()
+        else:
+            TokenManager.payment_status.pop(str(subscription_id), None)
+
+    def start_payment_watcher(self):
+        """
+        Starts watching subscription payments in background if it's not running yet in this process
+        """
+        with TokenManager.lock:
+            if TokenManager.payment_watcher is not None:
+                return
+            TokenManager.payment_watcher = threading.Thread(target=self.watch_subscription_payments, name='payment-watcher', daemon=True)
+        TokenManager.payment_watcher.start()
+
+    def watch_subscription_payments(self):
+        """
+        Invalidates cached payment status of subscriptions with new payments.
+        The stream is opened again after errors. Payments stored meanwhile are not seen so all cached status are dropped then
+        """
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace']}}}]
+        errors = 0
+        while True:
+            try:
+                with self.greenhousedb.mongo.subscription_payments.watch(pipeline, full_document='updateLookup') as stream:
+                    if errors:
+                        self.logger.info('Watching subscription payments again')
+                        TokenManager.invalidate_payment_status()
+                        errors = 0
+                    for change in stream:
+                        TokenManager.invalidate_payment_status((change.get('fullDocument') or {}).get('subscriptionId'))
+            except Exception as e:
+                if not errors:
+                    self.logger.warning('Can\'t watch subscription payments. Unpaid status will be cached ' + str(self.unpaid_status_ttl) + ' seconds until it\'s watched again. Error: ' + str(e))
+                errors += 1
+                time.sleep(min(2 ** errors, self.watch_max_backoff))
+
+    @staticmethod
+    def reset():
+        """
+        Forgets payment status and the watcher. It runs in forked children: the watcher thread is not copied by fork
+        so it's started again by the next bot loaded
+        """
+        TokenManager.payment_status = {}
+        TokenManager.payment_watcher = None
+        TokenManager.lock = threading.Lock()
         
     def volley_payment(self, data):
         """
@@ -101,10 +191,7 @@ class TokenManager():
 
             if volley_cost is not None: # register bot volleys only if it has declared volley cost (can be 0)
                 self.logger.debug('Paying volley activity')            
-                try:
-                    self.token_manager.transfer(self.core.get_publisher_name(), self.dotbot.owner_name, volley_cost)
-                except TokenManagerInsufficientFundsException as e:
-                    self.insufficient_funds()
+                self.transfer(self.core.get_publisher_name(), self.dotbot.owner_name, volley_cost)
 
     def function_payment(self, data):
         """
@@ -134,10 +221,41 @@ class TokenManager():
                     return
                 
             if data['data'].get('subscription_type') == TokenManager.SUBSCRIPTION_TYPE_PER_USE:                
-                try:
-                    self.token_manager.transfer(self.dotbot.owner_name, service_owner_name, data['data']['cost'])
-                except TokenManagerInsufficientFundsException as e:
-                    self.insufficient_funds()
+                self.transfer(self.dotbot.owner_name, service_owner_name, data['data']['cost'])
+
+    def function_prefetch_check(self, data):
+        """
+        Allows running a function ahead of the bot engine only if its payment won't be rejected when the engine calls it.
+        Monthly subscriptions must be paid. Per use payments need the payment ledger to check funds without waiting for the wallet
+        """
+        fmap = data['data']
+        if data['register_enabled'] is not True or fmap.get('owner_name') == self.dotbot.owner_name:
+            return
+
+        if fmap.get('subscription_type') == TokenManager.SUBSCRIPTION_TYPE_MONTHLY:
+            data['allowed'] = data['allowed'] and self.check_period_payment_status(fmap['subscription_id'])
+        elif fmap.get('subscription_type') == TokenManager.SUBSCRIPTION_TYPE_PER_USE:
+            data['allowed'] = data['allowed'] and self.payment_ledger is not None \
+                and self.payment_ledger.has_funds(self.dotbot.owner_name, fmap['cost'])
+
+    def transfer(self, payer: str, payee: str, amount: float):
+        """
+        Pays tokens. With a payment ledger only funds are checked (against cached balance) and the transfer is settled later
+
+        :param payer: Username paying
+        :param payee: Username receiving the payment
+        :param amount: Amount of tokens
+        """
+        if self.payment_ledger:
+            if not self.payment_ledger.has_funds(payer, amount):
+                self.insufficient_funds()
+            self.payment_ledger.enqueue(payer, payee, amount)
+            return
+
+        try:
+            self.token_manager.transfer(payer, payee, amount)
+        except TokenManagerInsufficientFundsException as e:
+            self.insufficient_funds()
             
     def previous_checkings(self, owner_name, publisher_name):
         """
@@ -164,3 +282,7 @@ class TokenManager():
             
 class TokenManagerInsufficientFundsException(Exception):
     """ """
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=TokenManager.reset)
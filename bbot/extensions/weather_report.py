@@ -1,12 +1,15 @@
 """"""
-import requests
+from bbot.http_client import HTTPClient
 import logging
-import smokesignal
 from bbot.core import BBotCore, ChatbotEngine, BBotException, BBotLoggerAdapter, BBotExtensionException
 
 class WeatherReport():
     """Returns Weather Report"""
 
+    # Functions registered by the plugin. Read before it's loaded when it's lazy (see LazyPlugin)
+    FUNCTIONS = {'weather': {'method': 'weather', 'cost': 0.1, 'register_enabled': True,
+                             'cache_ttl': 1800, 'cache_negative_ttl': 60, 'prefetchable': True}}
+
 
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
@@ -18,6 +21,7 @@ class WeatherReport():
         # vars set from plugins
         self.accuweather_api_key = ''
         self.logger_level = ''
+        self.http_client = HTTPClient.get_default()
 
         self.core = None
         self.logger = None
@@ -35,9 +39,10 @@ class WeatherReport():
         self.accuweather_text = 'Weather forecast provided by'
         self.accuweather_image_url = 'https://static.seedtoken.io/AW_RGB.png'
         
-        core.register_function('weather', {'object': self, 'method': self.method_name, 'cost': 0.1, 'register_enabled': True})
+        for function_name, fmap in WeatherReport.FUNCTIONS.items():
+            core.register_function(function_name, {**fmap, 'object': self})
         # we register this to add accuweather text even when result is cached from extensions_cache decorator
-        smokesignal.on(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_AFTER, self.add_accuweather_text)
+        self.core.on(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_AFTER, self.add_accuweather_text)
         
 
     @BBotCore.extensions_cache
@@ -77,7 +82,7 @@ class WeatherReport():
         canonical_location = st[0]['LocalizedName'] + ', ' + st[0]['Country']['LocalizedName']
         self.logger.debug('Canonical location: ' + canonical_location)
         self.logger.debug('Requesting Accuweather current conditions...')
-        r = requests.get(
+        r = self.http_client.get(
             f'http://dataservice.accuweather.com/currentconditions/v1/{location_key}?apikey={self.accuweather_api_key}&details=false')
         self.logger.debug('Accuweather response: ' + str(r.json())[0:300])
         if r.status_code == 200:
@@ -100,7 +105,7 @@ class WeatherReport():
     def search_text(self, location):
         # get locationkey based on provided location
         self.logger.info(f'Requesting Accuweather location key...')
-        r = requests.get(
+        r = self.http_client.get(
             f'http://dataservice.accuweather.com/locations/v1/search?apikey={self.accuweather_api_key}&q={location}&details=false')
         self.logger.debug('Accuweather response: ' + str(r.json())[0:300])
         if r.status_code == 200:
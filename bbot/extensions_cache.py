@@ -0,0 +1,119 @@
+"""Cache for extension function results."""
+import json
+import hashlib
+import threading
+
+
+class SingleFlight():
+    """
+    Coalesces concurrent calls with the same key so only one of them runs and the others wait for its result.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the coalescer.
+        """
+        self.lock = threading.Lock()
+        self.calls = {}  # key -> SingleFlightCall
+
+    def do(self, key: str, function):
+        """
+        Runs the function or waits for the running call with the same key
+
+        :param key: Call key
+        :param function: Callable with no arguments
+        :return: Function result
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = SingleFlightCall()
+                self.calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+class SingleFlightCall():
+    """Running call shared by coalesced callers."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class ExtensionsCache():
+    """
+    Caches extension function results.
+    Keys are built from a canonical hash of all the arguments, so dict and list arguments get their own entries.
+    Empty results (None) are cached for a short time so failing lookups don't hit remote services on every call.
+    TTLs are configured per function in the functions map with 'cache_ttl' and 'cache_negative_ttl'.
+    """
+
+    NONE_VALUE = {'__bbot_cached_none__': True}   # stored instead of None, which means a cache miss
+    DEFAULT_NEGATIVE_TTL = 30
+
+    single_flight = SingleFlight()
+
+    @staticmethod
+    def get_key(bot_id: str, func_name: str, args: list) -> str:
+        """
+        Returns cache key for a function call
+
+        :param bot_id: Bot ID
+        :param func_name: Function name
+        :param args: Function arguments
+        :return: Cache key
+        """
+        canonical_args = json.dumps(args, sort_keys=True, separators=(',', ':'), default=str)
+        return bot_id + '_' + func_name + '_' + hashlib.sha1(canonical_args.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def call(cache, key: str, function, fmap: dict=None, logger=None):
+        """
+        Returns cached function result or runs the function and caches its result.
+        Concurrent calls with the same key run the function only once
+
+        :param cache: Cache plugin
+        :param key: Cache key
+        :param function: Callable with no arguments
+        :param fmap: Function map entry with optional 'cache_ttl' and 'cache_negative_ttl'
+        :param logger: Logger
+        :return: Function result
+        """
+        cached = cache.get(key)
+        if cached is not None:
+            if logger:
+                logger.debug('Found cached value!')
+            return None if cached == ExtensionsCache.NONE_VALUE else cached
+
+        fmap = fmap or {}
+
+        def run():
+            cached = cache.get(key)  # it might be cached while waiting for the lock
+            if cached is not None:
+                return None if cached == ExtensionsCache.NONE_VALUE else cached
+            value = function()
+            if value is None:
+                cache.set(key, ExtensionsCache.NONE_VALUE, fmap.get('cache_negative_ttl', ExtensionsCache.DEFAULT_NEGATIVE_TTL))
+            else:
+                cache.set(key, value, fmap.get('cache_ttl'))
+            return value
+
+        return ExtensionsCache.single_flight.do(key, run)
@@ -0,0 +1,134 @@
+"""Concurrent execution of independent BBot function calls."""
+import os
+import json
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FunctionPrefetcher():
+    """
+    Runs calls to side-effect-free functions in a thread pool before the bot engine reaches them,
+    so independent remote calls of a volley run concurrently and volley latency is the slowest call instead of their sum.
+    Functions are prefetchable when their function map entry has 'prefetchable': True and no SIGNAL_PREFETCH_BBOT_FUNCTION
+    handler disallows the call (ie: its payment would be rejected): SIGNAL_CALL_BBOT_FUNCTION_BEFORE handlers run when
+    the engine reaches the call, after it started. Results are consumed by BBotFunctionsProxy.call_function, which still emits signals and registers
+    executed functions in the volley thread. Calls not consumed (ie: after a $goto) are cancelled at the end of the volley.
+    """
+
+    executors = {}  # thread pools by size. All bots in the process share them
+    lock = threading.Lock()
+
+    def __init__(self, max_workers: int) -> None:
+        """
+        Initialize the prefetcher.
+
+        :param max_workers: Thread pool size. 0 disables prefetching
+        """
+        self.max_workers = max_workers
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """
+        Returns the shared thread pool
+
+        :return: ThreadPoolExecutor
+        """
+        executor = FunctionPrefetcher.executors.get(self.max_workers)
+        if executor is None:
+            with FunctionPrefetcher.lock:
+                executor = FunctionPrefetcher.executors.get(self.max_workers)
+                if executor is None:
+                    executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='bbot-prefetch')
+                    FunctionPrefetcher.executors[self.max_workers] = executor
+        return executor
+
+    @staticmethod
+    def reset():
+        """
+        Forgets all thread pools. It runs in forked children: pool threads are not copied by fork
+        so calls submitted to inherited pools would never run
+        """
+        FunctionPrefetcher.executors = {}
+        FunctionPrefetcher.lock = threading.Lock()
+
+    def prefetch(self, calls: list, prefetched: dict) -> int:
+        """
+        Starts running the calls in background. There must be at least two calls, one call alone won't run faster
+
+        :param calls: List of (function name, args list, f_type, function map entry)
+        :param prefetched: Volley prefetched calls. Started calls are added here by key
+        :return: Number of calls started
+        """
+        pending = {}
+        for func_name, args, f_type, fmap in calls:
+            key = FunctionPrefetcher.get_key(func_name, args, f_type)
+            if key not in prefetched and key not in pending:
+                pending[key] = (args, f_type, fmap)
+        if not self.max_workers or len(pending) < 2:
+            return 0
+
+        executor = self.get_executor()
+        for key, (args, f_type, fmap) in pending.items():
+            call = PrefetchedCall()
+            call.future = executor.submit(call.run, getattr(fmap['object'], fmap['method']), list(args), f_type)
+            prefetched[key] = call
+        return len(pending)
+
+    @staticmethod
+    def cancel(prefetched: dict) -> None:
+        """
+        Cancels calls not consumed. Calls already running can't be stopped, their results are discarded
+
+        :param prefetched: Volley prefetched calls
+        """
+        for call in prefetched.values():
+            call.future.cancel()
+        prefetched.clear()
+
+    @staticmethod
+    def get_key(func_name: str, args, f_type: str) -> str:
+        """
+        Returns key of a function call. Args from DotFlow2 objects (list) and templates (tuple) get the same key
+
+        :param func_name: Function name
+        :param args: Function arguments
+        :param f_type: Function type
+        :return: Key
+        """
+        return func_name + '_' + f_type + '_' + json.dumps(list(args), sort_keys=True, separators=(',', ':'), default=str)
+
+
+class PrefetchedCall():
+    """Function call running in background."""
+
+    def __init__(self) -> None:
+        self.future = None
+        self.start = None
+        self.end = None
+
+    def run(self, method, args: list, f_type: str):
+        """
+        Runs the function recording its execution time
+
+        :param method: Bound method of the function
+        :param args: Function arguments
+        :param f_type: Function type
+        :return: Function response
+        """
+        self.start = datetime.datetime.now()
+        try:
+            return method(args, f_type)
+        finally:
+            self.end = datetime.datetime.now()
+
+    def result(self):
+        """
+        Waits for the function response. Exceptions raised by the function are raised here
+
+        :return: Function response
+        """
+        return self.future.result()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=FunctionPrefetcher.reset)
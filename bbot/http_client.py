@@ -0,0 +1,164 @@
+"""Shared HTTP client."""
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bbot.core import BBotLoggerAdapter
+
+
+class HTTPClient():
+    """
+    HTTP client with a keep-alive connection pool per host, default timeouts, retries and a limit of concurrent requests per host.
+    Pools are shared by all plugins using the same settings so outbound calls reuse warm connections.
+    Retries apply to idempotent methods and connection errors only.
+    """
+
+    pools = {}              # settings -> HTTPClientPool
+    lock = threading.Lock()
+    default_client = None
+
+    def __init__(self, config: dict, dotbot: dict=None) -> None:
+        """
+        Initialize the plugin.
+
+        :param config: Configuration values for the instance.
+        """
+        self.config = config
+        self.logger_level = ''
+
+        self.connect_timeout = 3.05     # Seconds to establish a connection
+        self.read_timeout = 10          # Seconds to wait for the server response
+        self.retries = 2                # Retries on connection errors and 502, 503, 504 responses
+        self.backoff_factor = 0.3       # Seconds between retries: backoff_factor * 2 ^ (retry - 1)
+        self.pool_maxsize = 20          # Keep-alive connections kept per host
+        self.max_concurrency_per_host = 20  # Max requests in flight per host. 0 means no limit
+
+        self.pool = None
+
+    def init(self, parent=None):
+        """
+        Initialize the connection pool
+        """
+        self.logger = BBotLoggerAdapter(logging.getLogger('http_client'), self, parent, 'http_client')
+
+    def get_pool(self):
+        """
+        Returns the connection pools for the client settings
+
+        :return: HTTPClientPool
+        """
+        if self.pool is None:
+            settings = (self.connect_timeout, self.read_timeout, self.retries, self.backoff_factor,
+                        self.pool_maxsize, self.max_concurrency_per_host)
+            with HTTPClient.lock:
+                pool = HTTPClient.pools.get(settings)
+                if pool is None:
+                    pool = HTTPClientPool(self.retries, self.backoff_factor, self.pool_maxsize, self.max_concurrency_per_host)
+                    HTTPClient.pools[settings] = pool
+            self.pool = pool
+        return self.pool
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request. It accepts same arguments as requests.request
+
+        :param method: HTTP method
+        :param url: URL
+        :return: Response
+        """
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        return self.get_pool().request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a GET request
+
+        :param url: URL
+        :return: Response
+        """
+        return self.request('get', url, **kwargs)
+
+    def post(self, url: str, data=None, json=None, **kwargs) -> requests.Response:
+        """
+        Sends a POST request
+
+        :param url: URL
+        :param data: Body
+        :param json: JSON body
+        :return: Response
+        """
+        return self.request('post', url, data=data, json=json, **kwargs)
+
+    @staticmethod
+    def get_default():
+        """
+        Returns a client with default settings. Used by plugins with no http_client configured
+
+        :return: HTTPClient
+        """
+        if HTTPClient.default_client is None:
+            client = HTTPClient({})
+            client.init()
+            HTTPClient.default_client = client
+        return HTTPClient.default_client
+
+
+class HTTPClientPool():
+    """Sessions and concurrency limits by host."""
+
+    def __init__(self, retries: int, backoff_factor: float, pool_maxsize: int, max_concurrency_per_host: int) -> None:
+        """
+        Initialize the pools.
+
+        :param retries: Retries on connection errors and 502, 503, 504 responses
+        :param backoff_factor: Retries backoff factor
+        :param pool_maxsize: Keep-alive connections kept per host
+        :param max_concurrency_per_host: Max requests in flight per host. 0 means no limit
+        """
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_maxsize = pool_maxsize
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.sessions = {}      # host -> requests session
+        self.semaphores = {}    # host -> semaphore
+        self.lock = threading.Lock()
+
+    def get_session(self, host: str):
+        """
+        Returns the session of a host and its concurrency semaphore
+
+        :param host: Scheme and host
+        :return: Tuple with session and semaphore (None if there is no limit)
+        """
+        session = self.sessions.get(host)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(host)
+                if session is None:
+                    retry = Retry(total=self.retries, backoff_factor=self.backoff_factor, status_forcelist=(502, 503, 504),
+                                  raise_on_status=False)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=retry)
+                    session = requests.Session()
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    if self.max_concurrency_per_host:
+                        self.semaphores[host] = threading.BoundedSemaphore(self.max_concurrency_per_host)
+                    self.sessions[host] = session
+        return session, self.semaphores.get(host)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request through the host session
+
+        :param method: HTTP method
+        :param url: URL
+        :return: Response
+        """
+        parts = urlsplit(url)
+        session, semaphore = self.get_session(parts.scheme + '://' + parts.netloc)
+        if semaphore is None:
+            return session.request(method, url, **kwargs)
+        with semaphore:
+            return session.request(method, url, **kwargs)
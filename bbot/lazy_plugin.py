@@ -0,0 +1,90 @@
+"""Plugins loaded on first use."""
+import logging
+import threading
+
+
+class LazyPlugin():
+    """
+    Stands in for a plugin until it's used. The plugin is instantiated and initialized on the first access to any of
+    its attributes (ie: the first call to one of its functions).
+    Plugins declaring their functions in a FUNCTIONS class attribute ({function name: function map} registered with
+    REGISTER_METHOD of the parent, register_function by default) get them registered from there so the functions map
+    is complete from the start. The real plugin registration completes those entries in place.
+    Plugins subscribing to signals in their init can't be lazy unless the signals only matter after their functions run.
+    """
+
+    logger = logging.getLogger('lazy_plugin')
+
+    def __init__(self, plugin_settings: dict, dotbot: dict=None) -> None:
+        """
+        Initialize the plugin stand-in.
+
+        :param plugin_settings: Settings of the real plugin
+        :param dotbot: DotBot
+        """
+        self._settings = {**plugin_settings, 'lazy': False}
+        self._dotbot = dotbot
+        self._parent = None
+        self._plugin = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_lazy(plugin_settings: dict) -> bool:
+        """
+        Returns True if the plugin should be loaded on first use.
+        Plugins declaring FUNCTIONS are lazy unless their settings have lazy: false. Any other plugin can set lazy: true
+
+        :param plugin_settings: Plugin settings
+        :return: bool
+        """
+        if 'lazy' in plugin_settings:
+            return bool(plugin_settings['lazy'])
+        return bool(LazyPlugin.get_functions(plugin_settings['plugin_class'])[1])
+
+    @staticmethod
+    def get_functions(plugin_class: str) -> tuple:
+        """
+        Returns the functions declared by a plugin class
+
+        :param plugin_class: Fully qualified class name
+        :return: Tuple with the registration method on the parent and a dictionary of function maps by function name
+        """
+        from bbot.core import Plugin  # bbot.core uses this module
+        dynamic_class = Plugin.get_class_from_fullyqualified(plugin_class)
+        return getattr(dynamic_class, 'REGISTER_METHOD', 'register_function'), getattr(dynamic_class, 'FUNCTIONS', {})
+
+    def init(self, parent) -> None:
+        """
+        Registers the plugin functions on its parent
+
+        :param parent: Parent plugin
+        """
+        self._parent = parent
+        register_method, functions = LazyPlugin.get_functions(self._settings['plugin_class'])
+        for function_name, fmap in functions.items():
+            getattr(parent, register_method)(function_name, {**fmap, 'object': self, 'lazy': True})
+
+    def get_plugin(self):
+        """
+        Returns the real plugin. It's loaded on first call
+
+        :return: Plugin instance
+        """
+        if self._plugin is None:
+            with self._lock:
+                if self._plugin is None:
+                    from bbot.core import Plugin  # bbot.core uses this module
+                    LazyPlugin.logger.debug('Loading lazy plugin ' + self._settings['plugin_class'])
+                    self._plugin = Plugin.load_plugin(self._settings, self._dotbot, self._parent)
+        return self._plugin
+
+    def __getattr__(self, name):
+        if name.startswith('__'):  # do not proxy python special attributes
+            raise AttributeError(name)
+        return getattr(self.get_plugin(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.get_plugin(), name, value)
@@ -0,0 +1,233 @@
+"""Shared MongoDB clients."""
+import os
+import time
+import logging
+import threading
+from pymongo import MongoClient, monitoring
+from bbot.core import Plugin, BBotLoggerAdapter
+from bbot.config import load_configuration
+
+
+class MongoRegistry():
+    """
+    Process-wide registry of MongoDB clients. All plugins get their client from it so there is a single connection
+    pool (and set of monitor threads) per URI no matter how many bots are built.
+    The pool settings of the first registry asking for a URI are the ones used for it in the whole process. Registries asking
+    later for the URI with different settings get the existing client and a warning.
+    Clients are dropped in forked children (pre-forking servers) as they can't be shared between processes.
+    """
+
+    clients = {}            # uri -> MongoClient
+    metrics = {}            # uri -> MongoPoolMetrics
+    options = {}            # uri -> pool settings the client was created with
+    lock = threading.Lock()
+    default_registry = None
+
+    def __init__(self, config: dict, dotbot: dict=None) -> None:
+        """
+        Initialize the plugin.
+
+        :param config: Configuration values for the instance.
+        """
+        self.config = config
+        self.logger_level = ''
+
+        self.max_pool_size = 100                    # Max connections per server
+        self.min_pool_size = 0                      # Connections kept open even when idle
+        self.max_idle_time_ms = 0                   # Idle connections are closed after this. 0 means never
+        self.wait_queue_timeout_ms = 0              # Max time waiting for a free connection. 0 means no limit
+        self.server_selection_timeout_ms = 5000     # Max time waiting for an available server
+        self.connect_timeout_ms = 20000             # Max time establishing a connection
+
+    def init(self, parent=None):
+        """
+        Initialize the plugin
+        """
+        self.logger = BBotLoggerAdapter(logging.getLogger('mongo_registry'), self, parent, 'mongo_registry')
+        self.warned_uris = set()
+
+    def get_client(self, uri: str) -> MongoClient:
+        """
+        Returns the client of the URI. It's created on first use
+
+        :param uri: MongoDB URI
+        :return: MongoClient
+        """
+        options = self.get_pool_options()
+        with MongoRegistry.lock:
+            client = MongoRegistry.clients.get(uri)
+            if client is None:
+                self.logger.debug('Creating MongoDB client with pool size ' + str(self.max_pool_size))
+                metrics = MongoPoolMetrics()
+                client = MongoClient(uri, event_listeners=[metrics], **options)
+                MongoRegistry.clients[uri] = client
+                MongoRegistry.metrics[uri] = metrics
+                MongoRegistry.options[uri] = options
+            elif options != MongoRegistry.options.get(uri, options) and uri not in self.warned_uris:
+                self.warned_uris.add(uri)
+                self.logger.warning('MongoDB client already created with pool settings ' + str(MongoRegistry.options[uri])
+                                    + '. Requested settings ' + str(options) + ' are ignored')
+        return client
+
+    def get_pool_options(self) -> dict:
+        """
+        Returns the MongoClient pool options of the registry settings
+
+        :return: Dictionary with MongoClient options
+        """
+        options = {
+            'maxPoolSize': self.max_pool_size,
+            'minPoolSize': self.min_pool_size,
+            'serverSelectionTimeoutMS': self.server_selection_timeout_ms,
+            'connectTimeoutMS': self.connect_timeout_ms,
+        }
+        if self.max_idle_time_ms:
+            options['maxIdleTimeMS'] = self.max_idle_time_ms
+        if self.wait_queue_timeout_ms:
+            options['waitQueueTimeoutMS'] = self.wait_queue_timeout_ms
+        return options
+
+    def get_database(self, uri: str):
+        """
+        Returns the database set in the URI
+
+        :param uri: MongoDB URI with database name
+        :return: Database
+        """
+        return self.get_client(uri).get_default_database()
+
+    @staticmethod
+    def get_stats() -> dict:
+        """
+        Returns the pool metrics of each client
+
+        :return: Dictionary with metrics by URI (without credentials)
+        """
+        stats = {}
+        for uri, metrics in list(MongoRegistry.metrics.items()):
+            scheme, _, address = uri.partition('://')
+            stats[scheme + '://' + address.split('@')[-1]] = metrics.get_stats()
+        return stats
+
+    @staticmethod
+    def reset():
+        """
+        Forgets all clients. It runs in forked children: clients inherited from the parent must not be used
+        """
+        MongoRegistry.clients = {}
+        MongoRegistry.metrics = {}
+        MongoRegistry.options = {}
+        MongoRegistry.lock = threading.Lock()
+
+    @staticmethod
+    def get_default():
+        """
+        Returns the registry used by plugins without their own mongo_registry settings.
+        Its pool settings are the mongo_registry block at the top level of the configuration
+
+        :return: MongoRegistry
+        """
+        if MongoRegistry.default_registry is None:
+            settings = {**MongoRegistry.get_process_settings(), 'plugin_class': 'bbot.mongo_registry.MongoRegistry'}
+            MongoRegistry.default_registry = Plugin.load_plugin(settings)
+        return MongoRegistry.default_registry
+
+    @staticmethod
+    def get_process_settings() -> dict:
+        """
+        Returns the mongo_registry settings of the loaded configuration
+
+        :return: Dictionary with pool settings. Empty if there is no configuration loaded or it has none
+        """
+        config_path = os.environ.get('BBOT_CONFIG_PATH')
+        if not config_path or not os.environ.get('BBOT_ENV'):
+            return {}
+        try:
+            return load_configuration(config_path, 'BBOT_ENV').get('mongo_registry') or {}
+        except OSError:  # configuration moved or removed. Defaults are used
+            return {}
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener counting connections and the time waited to get them.
+    Check outs run in the thread asking for the connection so the wait is measured from a thread local start time.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.open = 0               # Connections open
+        self.checked_out = 0        # Connections in use
+        self.max_checked_out = 0
+        self.check_outs = 0
+        self.check_out_failures = 0 # ie: wait queue timeout
+        self.wait_time = 0.0        # Seconds waited for connections
+        self.max_wait_time = 0.0
+        self.pool_clears = 0
+
+    def get_stats(self) -> dict:
+        """
+        Returns the metrics
+
+        :return: Dictionary with metrics
+        """
+        with self.lock:
+            return {
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'check_outs': self.check_outs,
+                'check_out_failures': self.check_out_failures,
+                'avg_wait_ms': round(self.wait_time * 1000 / self.check_outs, 3) if self.check_outs else 0,
+                'max_wait_ms': round(self.max_wait_time * 1000, 3),
+                'pool_clears': self.pool_clears,
+            }
+
+    def connection_check_out_started(self, event):
+        self.local.start = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(self.local, 'start', time.perf_counter())
+        with self.lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.check_outs += 1
+            self.wait_time += wait
+            self.max_wait_time = max(self.max_wait_time, wait)
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.check_out_failures += 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=MongoRegistry.reset)
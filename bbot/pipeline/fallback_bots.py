@@ -43,7 +43,7 @@ class FallbackBots():
             # try import bots
             fbbs = self.core.dotbot.get('fallbackBots', [])
             for bot_name in fbbs:
-                self.logger.debug(f'Trying with bot {bot_name}')
+                self.logger.debug('Trying with bot %s', bot_name)
                 bot_dotbot_container = self.core.dotdb.find_dotbot_by_idname(bot_name)
                 if not bot_dotbot_container:
                     raise Exception(f'Fallback bot not found {bot_name}')
@@ -3,6 +3,7 @@ import logging
 import re
 from web.template import *
 from bbot.core import BBotCore, ChatbotEngine, BBotLoggerAdapter, BBotException
+from bbot.template_cache import templator_cache
 
 class TemplateEngineTemplator():
     """."""
@@ -15,6 +16,7 @@ class TemplateEngineTemplator():
         self.dotbot = dotbot
 
         self.logger_level = ''
+        self.cache_max_size = 0     # Size of compiled templates cache. 0 to use default size
 
         self.core = None
         self.logger = None
@@ -27,18 +29,16 @@ class TemplateEngineTemplator():
         """
         self.core = core        
         self.logger = BBotLoggerAdapter(logging.getLogger('pipeline.templator'), self, self.core, 'Templetor')
+        if self.cache_max_size:
+            templator_cache.set_max_size(self.cache_max_size)
                                 
     def get_functions(self):
         """
-        Adds custom functions to template @TODO this should be initialized just once at runtime, not at every render!!
+        Returns template custom functions from extensions. The namespace is built once by the core
 
         :return:
         """
-        c_functions = {}
-        for f_name in self.core.functions_map:  # register template functions from extensions
-            self.logger.debug('Adding template custom function "' + f_name + '"')
-            c_functions[f_name] = getattr(self.core.bbot, f_name)            
-        return c_functions
+        return self.core.bbot.get_functions_namespace(False)
 
     def render(self, string: str) -> str:
         """
@@ -67,10 +67,9 @@ class TemplateEngineTemplator():
         c_functions = self.get_functions()        
         t_globals = {**t_globals, **c_functions}
 
-        self.logger.debug('Rendering template: "' + str(string) + '"')
-        templator_obj = Template(string, globals=t_globals)
+        self.logger.debug('Rendering template: "%s"', string)
         try:
-            response = str(templator_obj())
+            response = templator_cache.render(string, t_globals)
         except NameError as e:
             err_msg = 'Template error: ' + str(e)
             self.core.logger.debug(err_msg)            
@@ -79,7 +78,7 @@ class TemplateEngineTemplator():
         if response[-1:] == '\n':       # Templator seems to add a trailing \n, remove it
             response = response[:-1]
 
-        self.logger.debug('Template response: "' + response + '"')
+        self.logger.debug('Template response: "%s"', response)
 
         if response.find('<function BBotFunctionsProxy') is not -1:
             self.logger.error('Templator returned an invalid response. Botdev forgot to escape $?')
@@ -104,7 +103,7 @@ class TemplateEngineTemplator():
                     elif isinstance(v, bool):
                         pass
                     else:
-                        self.logger.error('Found an unexpected data type in output: type:' + str(type(v)) + ' - value: ' + str(v))
+                        self.logger.error('Found an unexpected data type in output: type:%s - value: %s', type(v), v)
             recursion(r)
                                 
                         
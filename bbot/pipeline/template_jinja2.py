@@ -42,7 +42,7 @@ class PluginTemplateEngine():
     def render(self, template: str) -> str:
         """
         """
-        self.logger.debug('Rendering template: "' + template + '"')
+        self.logger.debug('Rendering template: "%s"', template)
 
         df2_vars = self.bot.session.get_var(self.bot.user_id)
 
@@ -52,5 +52,5 @@ class PluginTemplateEngine():
         self.add_functions(template)
 
         response = template.render(df2_vars)  # return rendered text output
-        self.logger.debug('Template response: "' + response + '"')
+        self.logger.debug('Template response: "%s"', response)
         return response
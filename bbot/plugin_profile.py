@@ -0,0 +1,73 @@
+"""
+Startup cost of the configured plugins.
+Imports each plugin class in the configuration and reports the time it took and if it's loaded lazily.
+Modules shared by many plugins are charged to the first one importing them.
+
+Run it with: python -m bbot.plugin_profile [environment]
+"""
+import os
+import sys
+import time
+from bbot.config import load_configuration
+from bbot.core import Plugin
+from bbot.lazy_plugin import LazyPlugin
+
+
+def get_plugin_settings(config, found: list=None) -> list:
+    """
+    Returns the settings of each plugin in the configuration
+
+    :param config: Configuration or part of it
+    :param found: List where settings are added
+    :return: List of plugin settings
+    """
+    found = [] if found is None else found
+    if isinstance(config, dict):
+        if 'plugin_class' in config:
+            found.append(config)
+        for value in config.values():
+            get_plugin_settings(value, found)
+    elif isinstance(config, (list, tuple)):
+        for value in config:
+            get_plugin_settings(value, found)
+    return found
+
+
+def profile_imports(plugin_settings: list) -> list:
+    """
+    Imports the plugin classes measuring the time spent
+
+    :param plugin_settings: List of plugin settings
+    :return: List of dicts with plugin_class, import seconds, new modules, lazy flag and error, most expensive first
+    """
+    profile = {}
+    for settings in plugin_settings:
+        plugin_class = settings['plugin_class'].strip()
+        if plugin_class in profile:
+            continue
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        error = ''
+        try:
+            Plugin.get_class_from_fullyqualified(plugin_class)
+        except Exception as e:  # missing optional dependencies are reported, not fatal
+            error = type(e).__name__ + ': ' + str(e)
+        profile[plugin_class] = {'plugin_class': plugin_class, 'import': time.perf_counter() - start,
+                                 'modules': len(sys.modules) - modules, 'lazy': LazyPlugin.is_lazy(settings),
+                                 'error': error}
+    return sorted(profile.values(), key=lambda p: p['import'], reverse=True)
+
+
+def main():
+    config_path = os.path.abspath(os.path.dirname(__file__) + "/../instance")
+    config = load_configuration(config_path, "BBOT_ENV", sys.argv[1] if len(sys.argv) > 1 else None)
+    profile = profile_imports(get_plugin_settings(config))
+    print('{:>10} {:>8} {:>5}  {}'.format('import ms', 'modules', 'lazy', 'plugin class'))
+    for p in profile:
+        print('{:>10.1f} {:>8} {:>5}  {} {}'.format(
+            p['import'] * 1000, p['modules'], 'yes' if p['lazy'] else 'no', p['plugin_class'], p['error']))
+    print('{:>10.1f} ms total'.format(sum(p['import'] for p in profile) * 1000))
+
+
+if __name__ == '__main__':
+    main()
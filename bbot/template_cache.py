@@ -0,0 +1,98 @@
+"""Compiled Templetor templates cache."""
+import threading
+from collections import OrderedDict
+from web.template import Template, BaseTemplate, TEMPLATE_BUILTINS
+
+
+class TemplatorCache():
+    """
+    Bounded LRU cache of compiled Templetor templates keyed by source string.
+    Templates are compiled without globals so they can be shared. Globals are injected on each render.
+    """
+
+    def __init__(self, max_size: int=1024) -> None:
+        """
+        Initialize the cache.
+
+        :param max_size: Maximum number of compiled templates kept in memory
+        """
+        self.max_size = max_size
+        self.templates = OrderedDict()  # source -> compiled code
+        self.lock = threading.Lock()
+        self.compiler = Template('')    # Used only to compile templates with Templetor parser and safety checks
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_code(self, source: str):
+        """
+        Returns compiled template code. It compiles and caches it if it's not in the cache
+
+        :param source: Template source
+        :return: Compiled code
+        """
+        with self.lock:
+            code = self.templates.get(source)
+            if code is not None:
+                self.templates.move_to_end(source)
+                self.hits += 1
+                return code
+            self.misses += 1
+
+        code = self.compiler.compile_template(Template.normalize_text(source), '<template>')
+
+        with self.lock:
+            self.templates[source] = code
+            self.templates.move_to_end(source)
+            while len(self.templates) > self.max_size:
+                self.templates.popitem(last=False)
+                self.evictions += 1
+        return code
+
+    def render(self, source: str, t_globals: dict) -> str:
+        """
+        Renders a template
+
+        :param source: Template source
+        :param t_globals: Globals available in the template
+        :return: Rendered template
+        """
+        template = BaseTemplate(self.get_code(source), '<template>', None, t_globals, TEMPLATE_BUILTINS)
+        return str(template())
+
+    def set_max_size(self, max_size: int):
+        """
+        Changes cache size evicting older templates if needed
+
+        :param max_size: Maximum number of compiled templates kept in memory
+        """
+        with self.lock:
+            self.max_size = max_size
+            while len(self.templates) > self.max_size:
+                self.templates.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all compiled templates
+        """
+        with self.lock:
+            self.templates.clear()
+
+    def get_stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: Dictionary with size, hits, misses and evictions
+        """
+        return {
+            'size': len(self.templates),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+templator_cache = TemplatorCache()  # process-wide cache shared by all Templetor template engines
@@ -6,11 +6,12 @@ import os
 import cgi
 import traceback
 import datetime
-import requests
+from bbot.http_client import HTTPClient
 from urllib.parse import urlparse
 
 from bbot.core import BBotCore, ChatbotEngine, BBotException, BBotLoggerAdapter
 from bbot.config import load_configuration
+from channels.publisher_cache import PublisherBotCache
 
 class BotFramework:
     
@@ -22,39 +23,35 @@ class BotFramework:
         self.dotdb = None #        
         self.logger_level = ''
         self.access_token = None
+        self.publisher_cache_ttl = 30   # Seconds publisher tokens resolution is cached before checking if it's outdated
+        self.http_client = HTTPClient.get_default()
         self.dotbot = None
 
     def init(self, core):
         self.core = core
         self.logger = BBotLoggerAdapter(logging.getLogger('channel_botframerwork'), self, self.core, 'ChannelBotFramework')        
 
-        self.logger.debug("Listening BotFramework from path: " + self.get_webhook_path())
+        self.logger.debug("Listening BotFramework from path: %s", self.get_webhook_path())
 
     def endpoint(self, request=dict, publisherbot_token=str):
-        print('------------------------------------------------------------------------------------------------------------------------')
-        self.logger.debug('Received request: ' + str(request.data))
-        self.logger.debug(f'Received a BotFramework webhook request for publisher token {publisherbot_token}')        
+        self.logger.debug('Received request: %s', request.data)
+        self.logger.debug('Received a BotFramework webhook request for publisher token %s', publisherbot_token)        
 
         try:
             params = request.get_json(force=True)
             org_id = 1
 
             # get publisher user id from token
-            pub_bot = self.dotdb.find_publisherbot_by_publisher_token(publisherbot_token)
+            pub_bot, dotbot = PublisherBotCache.resolve(self.dotdb, publisherbot_token, self.publisher_cache_ttl)
             if not pub_bot:
                 raise Exception('Publisher not found')
-            self.logger.debug('Found publisher: ' + pub_bot.publisher_name + ' - for bot id: ' + pub_bot.bot_id)
+            self.logger.debug('Found publisher: %s - for bot id: %s', pub_bot.publisher_name, pub_bot.bot_id)
             pub_id = pub_bot.publisher_name
                     
-            dotbot = self.dotdb.find_dotbot_by_bot_id(pub_bot.bot_id)                    
             self.dotbot = dotbot
             if not dotbot:
                 raise Exception('Bot not found')
             bot_id = dotbot.bot_id
-            # build extended dotbot 
-            dotbot.services = pub_bot.services
-            dotbot.channels = pub_bot.channels
-            dotbot.botsubscription = pub_bot
 
             if 'botframework' not in dotbot.channels.keys():
                 raise BBotException("Botframework chanel in not enabled")
@@ -84,12 +81,12 @@ class BotFramework:
 
             channel_id = params['channelId']
             
+            # authenticate. It's done before getting the bot: bots are handed out in use until get_response() ends
+            self.authenticate()
+
             config = load_configuration(os.path.abspath(os.path.dirname(__file__) + "../../../instance"), "BBOT_ENV")
             bbot = BBotCore.create_bot(config['bbot_core'], dotbot)
-            self.logger.debug('User id: ' + user_id)
-
-            # authenticate
-            self.authenticate()
+            self.logger.debug('User id: %s', user_id)
 
             req = bbot.create_request(bbot_request, user_id, bot_id, org_id, pub_id, channel_id)                           
             bbot_response = bbot.get_response(req)
@@ -99,7 +96,7 @@ class BotFramework:
             if isinstance(e, BBotException): # BBotException means the issue is in bot userland, not rhizome
                 http_code = 200                                                
             else:
-                self.logger.critical(str(e) + "\n" + str(traceback.format_exc()))            
+                self.logger.critical('%s\n%s', e, traceback.format_exc())            
                 http_code = 500            
                 
             if os.environ['BBOT_ENV'] == 'development':                
@@ -112,7 +109,7 @@ class BotFramework:
                 # @TODO this should be configured in dotbot
                 # @TODO let bot engine decide what to do?
             
-        self.logger.debug("Response from restful channel: " + str(bbot_response))
+        self.logger.debug("Response from restful channel: %s", bbot_response)
         self.to_botframework(bbot_response)
 
     def get_webhook_url(self) -> str:
@@ -130,10 +127,10 @@ class BotFramework:
             
             r = {**response_payload, **br}
 
-            self.logger.debug("Response sent back to BotFramework: " + str(r))        
+            self.logger.debug("Response sent back to BotFramework: %s", r)        
             url = self.service_url + 'v3/conversations/' + r['conversation']['id'] + '/activities/' + r['id']
-            self.logger.debug("To url: " + url)
-            response = requests.post(url, headers=self.directline_get_headers(), json=r)
+            self.logger.debug("To url: %s", url)
+            response = self.http_client.post(url, headers=self.directline_get_headers(), json=r)
             msg = "BotFramework response: http code: " + str(response.status_code) + " message: " + str(response.text)
             if response.status_code != 200:
                 raise BBotException(msg)
@@ -156,7 +153,7 @@ class BotFramework:
             if  expire_date >= datetime.datetime.utcnow():
                 # got valid token
                 self.access_token = stored_token['access_token']                
-                self.logger.debug('Got valid token from db. Will expire in ' + str(stored_token['expire_date']))
+                self.logger.debug('Got valid token from db. Will expire in %s', stored_token['expire_date'])
                 return
             else:
                 self.logger.debug('Got expired token. Will request new one')
@@ -170,8 +167,8 @@ class BotFramework:
             "client_secret": self.app_password,
             "scope": "https://api.botframework.com/.default"
         }
-        self.logger.debug("Sending request to Microsoft OAuth with payload: " + str(payload))
-        response = requests.post(url, data=payload)    
+        self.logger.debug("Sending request to Microsoft OAuth with payload: %s", payload)
+        response = self.http_client.post(url, data=payload)    
         msg = "Response from Microsoft OAuth: http code: " + str(response.status_code) + " message: " + str(response.text)
         if response.status_code != 200:
             raise BBotException(msg)
@@ -0,0 +1,157 @@
+"""Publisher token resolution cache shared by all channels."""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+class PublisherBotCache():
+    """
+    Maps publisher tokens to their publisher bot and extended dotbot (with services, channels and subscription).
+    Entries are trusted for ttl seconds. After that they are revalidated comparing updatedAt of both documents,
+    and reloaded only if any of them changed. Misses are loaded with a single query joining both collections
+    when the repository supports it.
+    Up to max_entries tokens are kept. Least recently used ones (ie: rotated tokens or unpublished bots) are evicted.
+    """
+
+    entries = OrderedDict()     # publisher token -> PublisherBotCacheEntry
+    max_entries = 10000
+    lock = threading.Lock()
+    hits = 0
+    misses = 0
+    revalidations = 0
+    evictions = 0
+
+    @staticmethod
+    def resolve(dotdb, pub_token: str, ttl: int=30) -> tuple:
+        """
+        Returns publisher bot and extended dotbot of a publisher token
+
+        :param dotdb: DotBot repository
+        :param pub_token: Publisher token
+        :param ttl: Seconds the entry is used before checking if it's outdated. 0 disables the cache
+        :return: Tuple with PublisherBot and DotBot. Any of them is None if not found
+        """
+        now = time.monotonic()
+        entry = PublisherBotCache.entries.get(pub_token)
+        if entry is not None:
+            if entry.expires_at > now:
+                PublisherBotCache.hits += 1
+                PublisherBotCache.touch(pub_token)
+                return entry.pub_bot, entry.dotbot
+            if PublisherBotCache.is_current(dotdb, entry):
+                PublisherBotCache.revalidations += 1
+                entry.expires_at = now + ttl
+                PublisherBotCache.touch(pub_token)
+                return entry.pub_bot, entry.dotbot
+
+        PublisherBotCache.misses += 1
+        pub_bot, dotbot = PublisherBotCache.load(dotdb, pub_token)
+        if pub_bot is None or dotbot is None:  # not found is not cached. Bot might be published right now
+            PublisherBotCache.invalidate(pub_token)
+            return pub_bot, dotbot
+
+        # build extended dotbot
+        dotbot.services = pub_bot.services
+        dotbot.channels = pub_bot.channels
+        dotbot.botsubscription = pub_bot
+        if ttl:
+            with PublisherBotCache.lock:
+                PublisherBotCache.entries[pub_token] = PublisherBotCacheEntry(pub_bot, dotbot, now + ttl)
+                PublisherBotCache.entries.move_to_end(pub_token)
+                while len(PublisherBotCache.entries) > PublisherBotCache.max_entries:
+                    PublisherBotCache.entries.popitem(last=False)
+                    PublisherBotCache.evictions += 1
+        return pub_bot, dotbot
+
+    @staticmethod
+    def touch(pub_token: str):
+        """
+        Marks a token as the most recently used
+
+        :param pub_token: Publisher token
+        """
+        with PublisherBotCache.lock:
+            if pub_token in PublisherBotCache.entries:
+                PublisherBotCache.entries.move_to_end(pub_token)
+
+    @staticmethod
+    def load(dotdb, pub_token: str) -> tuple:
+        """
+        Loads publisher bot and dotbot from the repository
+
+        :param dotdb: DotBot repository
+        :param pub_token: Publisher token
+        :return: Tuple with PublisherBot and DotBot
+        """
+        if hasattr(dotdb, 'find_publisherbot_and_dotbot_by_publisher_token'):
+            return dotdb.find_publisherbot_and_dotbot_by_publisher_token(pub_token)
+        pub_bot = dotdb.find_publisherbot_by_publisher_token(pub_token)
+        if not pub_bot:
+            return None, None
+        return pub_bot, dotdb.find_dotbot_by_bot_id(pub_bot.bot_id)
+
+    @staticmethod
+    def is_current(dotdb, entry) -> bool:
+        """
+        Returns True if publisher bot and dotbot didn't change since they were cached
+
+        :param dotdb: DotBot repository
+        :param entry: Cache entry
+        :return: bool
+        """
+        sub_versions = dotdb.find_publisherbot_versions([entry.pub_bot.id])
+        if sub_versions.get(entry.pub_bot.id) != entry.pub_bot.updated_at:
+            return False
+        bot_versions = dotdb.find_dotbot_versions([entry.dotbot.bot_id])
+        return bot_versions.get(entry.dotbot.bot_id) == entry.dotbot.updated_at
+
+    @staticmethod
+    def invalidate(pub_token: str=None):
+        """
+        Removes a publisher token from the cache
+
+        :param pub_token: Publisher token. All entries are removed if None
+        """
+        with PublisherBotCache.lock:
+            if pub_token is None:
+                PublisherBotCache.entries.clear()
+            else:
+                PublisherBotCache.entries.pop(pub_token, None)
+
+    @staticmethod
+    def reset():
+        """
+        Drops all entries. It runs in forked children: cached documents are not shared with the parent
+        and the lock might have been held by a parent thread when it forked
+        """
+        PublisherBotCache.entries = OrderedDict()
+        PublisherBotCache.lock = threading.Lock()
+
+    @staticmethod
+    def get_stats() -> dict:
+        """
+        Returns cache counters
+
+        :return: Dictionary with entries, hits, misses, revalidations and evictions
+        """
+        return {
+            'entries': len(PublisherBotCache.entries),
+            'hits': PublisherBotCache.hits,
+            'misses': PublisherBotCache.misses,
+            'revalidations': PublisherBotCache.revalidations,
+            'evictions': PublisherBotCache.evictions,
+        }
+
+
+class PublisherBotCacheEntry():
+    """Cached publisher token resolution."""
+
+    def __init__(self, pub_bot, dotbot, expires_at: float) -> None:
+        self.pub_bot = pub_bot
+        self.dotbot = dotbot
+        self.expires_at = expires_at
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=PublisherBotCache.reset)
@@ -1,55 +1,88 @@
-"""RESTful channel"""
+"""RESTful channel
+
+Run with: BBOT_ENV=development gunicorn "channels.restful.app:create_app()" -b localhost:5000
+"""
 
 import os
 import logging
+import logging.config
 from flask_cors import CORS, cross_origin
 from flask import Flask, request, render_template, Response, jsonify
-from collections import defaultdict
 
 from bbot.core import Plugin
-from bbot.config import load_configuration
+from bbot.config import load_configuration, install_reload_signal
 
-"""Create and configure an instance of the application."""
-app = Flask(__name__)
-CORS(app)
+CHANNELS = ['restful', 'telegram', 'botframework']  # channels this app can serve
 
-config = load_configuration(os.path.abspath(os.path.dirname(__file__) + "../../../instance"), "BBOT_ENV")
-app.config.from_mapping(config)
-logging.config.dictConfig(config['logging'])
 
-restful = Plugin.load_plugin(config['channel_restful'])
-print("Listening RESTful from path: " + restful.get_endpoint_path())
-telegram = Plugin.load_plugin(config['channel_telegram'])
-botframework = Plugin.load_plugin(config['channel_botframework'])
+def get_enabled_channels(config: dict) -> list:
+    """
+    Returns the channels to load. They are set in enabled_channels setting or, if not set, all channels configured
 
-@app.route(restful.get_endpoint_path(), methods=['POST'])
-@cross_origin(origins=restful.config['cors_origin'])
-def restful_endpoint(): # pylint: disable=W0612    
-    response = restful.endpoint(request)
-    return Response(response['response'], status=response['status'], mimetype=response['mimetype'])
+    :param config: Configuration
+    :return: List of channel names
+    """
+    channels = config.get('enabled_channels') or CHANNELS
+    return [channel for channel in channels if channel in CHANNELS and 'channel_' + channel in config]
 
-@app.route('/TestWebChatBot')
-def test(): # pylint: disable=W0612
-    return render_template('test.html')
 
-@app.route(telegram.get_webhook_path(), methods=['POST'])
-def telegram_endpoint(publisherbot_token):  # pylint: disable=W0612
+def create_app(config: dict=None) -> Flask:
     """
-    Telegram webhook endpoint.
+    Create and configure an instance of the application.
+    Only the enabled channels are loaded, so their SDKs and clients aren't loaded at startup otherwise
+
+    :param config: Configuration. It's loaded from the instance folder for BBOT_ENV environment if not set
+    :return: Flask app
     """
-    telegram.endpoint(request, publisherbot_token)
-    # be sure to respond 200 code. telegram will keep sending it if doesnt get it
-    return jsonify(success=True)
+    if config is None:
+        config = load_configuration(os.path.abspath(os.path.dirname(__file__) + "../../../instance"), "BBOT_ENV")
+    if 'logging' in config:
+        logging.config.dictConfig(config['logging'])
+    if config.get('reload_on_sighup'):
+        install_reload_signal()
+
+    app = Flask(__name__)
+    CORS(app)
+    app.config.from_mapping(config)
+
+    channels = get_enabled_channels(config)
+
+    if 'restful' in channels:
+        restful = Plugin.load_plugin(config['channel_restful'])
+        logging.getLogger('channel_restful').info('Listening RESTful from path: %s', restful.get_endpoint_path())
+
+        @app.route(restful.get_endpoint_path(), methods=['POST'])
+        @cross_origin(origins=restful.config['cors_origin'])
+        def restful_endpoint(): # pylint: disable=W0612
+            response = restful.endpoint(request)
+            return Response(response['response'], status=response['status'], mimetype=response['mimetype'])
+
+        @app.route('/TestWebChatBot')
+        def test(): # pylint: disable=W0612
+            return render_template('test.html')
+
+    if 'telegram' in channels:
+        telegram = Plugin.load_plugin(config['channel_telegram'])
 
-@app.route(botframework.get_webhook_path(), methods=['POST'])
-def botframework_endpoint(publisherbot_token): # pylint: disable=W0612    
-    response = botframework.endpoint(request, publisherbot_token)
-    return jsonify(success=True)
+        @app.route(telegram.get_webhook_path(), methods=['POST'])
+        def telegram_endpoint(publisherbot_token):  # pylint: disable=W0612
+            """
+            Telegram webhook endpoint.
+            """
+            telegram.endpoint(request, publisherbot_token)
+            # be sure to respond 200 code. telegram will keep sending it if doesnt get it
+            return jsonify(success=True)
 
-@app.route('/ping')
-def ping(): # pylint: disable=W0612
-    print('Received ping request')    
-    return "[BBOT RESTFUL SERVER] pong!\n" + str(request)
+    if 'botframework' in channels:
+        botframework = Plugin.load_plugin(config['channel_botframework'])
 
+        @app.route(botframework.get_webhook_path(), methods=['POST'])
+        def botframework_endpoint(publisherbot_token): # pylint: disable=W0612
+            response = botframework.endpoint(request, publisherbot_token)
+            return jsonify(success=True)
 
+    @app.route('/ping')
+    def ping(): # pylint: disable=W0612
+        return "[BBOT RESTFUL SERVER] pong!\n" + str(request)
 
+    return app
@@ -0,0 +1,159 @@
+"""RESTful channel async server.
+
+Run with any ASGI server. ie:
+BBOT_ENV=development uvicorn "channels.restful.asgi:create_app" --factory --host localhost --port 5000
+"""
+import os
+import json
+import asyncio
+import logging
+import logging.config
+from concurrent.futures import ThreadPoolExecutor
+
+from bbot.core import Plugin, BBotLoggerAdapter
+from bbot.config import load_configuration, install_reload_signal
+
+
+class RestfulASGIApp():
+    """
+    ASGI application serving the RESTful channel with the same /restful contract as the Flask app.
+    Requests are handled in the event loop so thousands of conversations can be in flight per process.
+    Blocking work (Mongo lookups, bot engines, remote calls, TTS) runs in a bounded thread pool and requests over
+    async_max_pending get a 503 response instead of piling up.
+    """
+
+    def __init__(self, restful) -> None:
+        """
+        Initialize the app.
+
+        :param restful: Restful channel plugin
+        """
+        self.restful = restful
+        self.executor = ThreadPoolExecutor(restful.async_workers, thread_name_prefix='restful')
+        self.pending = 0
+        self.logger = BBotLoggerAdapter(logging.getLogger('channel_restful_asgi'), restful, None, 'ChannelRestfulASGI')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        path = scope['path']
+        method = scope['method']
+        cors_headers = self.get_cors_headers(scope)
+        if path == self.restful.get_endpoint_path():
+            if method == 'OPTIONS':
+                await self.send_response(send, 204, b'', 'text/plain', cors_headers + [
+                    (b'access-control-allow-methods', b'POST'),
+                    (b'access-control-allow-headers', b'content-type')])
+            elif method == 'POST':
+                body = await self.read_body(receive)
+                response = await self.restful_endpoint(body)
+                await self.send_response(send, response['status'], response['response'].encode('utf-8'), response['mimetype'], cors_headers)
+            else:
+                await self.send_response(send, 405, b'Method not allowed', 'text/plain')
+        elif path == '/ping':
+            await self.send_response(send, 200, b'[BBOT RESTFUL ASGI SERVER] pong!', 'text/plain')
+        else:
+            await self.send_response(send, 404, b'Not found', 'text/plain')
+
+    async def restful_endpoint(self, body: bytes) -> dict:
+        """
+        Runs the bot in the thread pool
+
+        :param body: Request body
+        :return: Dictionary with response body, status and mimetype
+        """
+        if self.pending >= self.restful.async_max_pending:
+            self.logger.warning('Too many pending requests. Rejecting request')
+            return {'response': json.dumps({'error': 'Server busy. Please try again later.'}), 'status': 503, 'mimetype': 'application/json'}
+
+        self.pending += 1
+        try:
+            try:
+                params = json.loads(body)
+            except ValueError as e:
+                return self.restful.get_error_response(e)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.restful.get_response, params)
+        finally:
+            self.pending -= 1
+
+    async def lifespan(self, receive, send):
+        """
+        Handles ASGI server startup and shutdown
+        """
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # waits for running volleys in another thread so the loop keeps serving them until they end
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown, True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_cors_headers(self, scope) -> list:
+        """
+        Returns CORS headers allowing the request origin if it's configured in cors_origin
+
+        :param scope: ASGI scope
+        :return: List of headers
+        """
+        allowed = self.restful.config.get('cors_origin', '*')
+        if allowed == '*':
+            return [(b'access-control-allow-origin', b'*')]
+        origin = dict(scope.get('headers', [])).get(b'origin', b'').decode('latin-1')
+        if origin and (origin == allowed or (isinstance(allowed, (list, tuple)) and origin in allowed)):
+            return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+        return []
+
+    @staticmethod
+    async def read_body(receive) -> bytes:
+        """
+        Reads the whole request body
+
+        :param receive: ASGI receive callable
+        :return: Body
+        """
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        return body
+
+    @staticmethod
+    async def send_response(send, status: int, body: bytes, mimetype: str, headers: list=None):
+        """
+        Sends the response
+
+        :param send: ASGI send callable
+        :param status: HTTP status code
+        :param body: Response body
+        :param mimetype: Response content type
+        :param headers: Extra headers
+        """
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', mimetype.encode('latin-1')), (b'content-length', str(len(body)).encode('latin-1'))] + (headers or [])
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_app() -> RestfulASGIApp:
+    """
+    Create and configure an instance of the application.
+    """
+    config = load_configuration(os.path.abspath(os.path.dirname(__file__) + "../../../instance"), "BBOT_ENV")
+    logging.config.dictConfig(config['logging'])
+    if config.get('reload_on_sighup'):
+        install_reload_signal()
+
+    restful = Plugin.load_plugin(config['channel_restful'])
+    restful.logger.info("Listening RESTful from path: " + restful.get_endpoint_path())
+    return RestfulASGIApp(restful)
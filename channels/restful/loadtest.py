@@ -0,0 +1,130 @@
+"""RESTful channel load test.
+
+Sends concurrent conversations to one or more RESTful servers and compares their throughput and latency. ie:
+python -m channels.restful.loadtest --pub-token <token> --concurrency 500 --requests 10000 \
+    http://localhost:5000/restful http://localhost:5001/restful
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+
+async def send_request(host: str, port: int, path: str, body: bytes, timeout: float) -> int:
+    """
+    Sends a POST request on a new connection
+
+    :param host: Server host
+    :param port: Server port
+    :param path: Endpoint path
+    :param body: Request body
+    :param timeout: Seconds to wait for the response
+    :return: HTTP status code
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(
+            b'POST ' + path.encode() + b' HTTP/1.1\r\n'
+            b'Host: ' + host.encode() + b'\r\n'
+            b'Content-Type: application/json\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+            b'Connection: close\r\n\r\n' + body)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run_load(url: str, args) -> dict:
+    """
+    Runs the load test against a server
+
+    :param url: Endpoint url
+    :param args: Command line arguments
+    :return: Dictionary with results
+    """
+    parts = urlsplit(url)
+    host = parts.hostname
+    port = parts.port or 80
+    path = parts.path or '/'
+    latencies = []
+    statuses = {}
+    errors = 0
+    remaining = args.requests
+
+    async def conversation(user_number: int):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            body = json.dumps({
+                'userId': 'loadtest' + str(user_number),
+                'pubToken': args.pub_token,
+                'input': {'text': args.text}
+            }).encode()
+            start = time.monotonic()
+            try:
+                status = await send_request(host, port, path, body, args.timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errors += 1
+                continue
+            latencies.append(time.monotonic() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.monotonic()
+    await asyncio.gather(*[conversation(i) for i in range(args.concurrency)])
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    return {
+        'url': url,
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': statuses,
+        'seconds': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+    }
+
+
+def percentile(values: list, p: int) -> float:
+    """
+    Returns the percentile of sorted values
+
+    :param values: Sorted values
+    :param p: Percentile
+    :return: Value
+    """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main(argv: list=None):
+    parser = argparse.ArgumentParser(description='RESTful channel load test')
+    parser.add_argument('urls', nargs='+', help='RESTful endpoint urls to compare. ie: Flask and ASGI servers')
+    parser.add_argument('--pub-token', required=True, help='Publisher token of the bot')
+    parser.add_argument('--text', default='hello', help='Input text sent on each request')
+    parser.add_argument('--concurrency', type=int, default=100, help='Concurrent conversations')
+    parser.add_argument('--requests', type=int, default=1000, help='Total requests sent to each server')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for each response')
+    args = parser.parse_args(argv)
+
+    results = [asyncio.run(run_load(url, args)) for url in args.urls]
+
+    print('{:<40} {:>8} {:>7} {:>9} {:>8} {:>8} {:>8}  {}'.format('url', 'requests', 'errors', 'req/s', 'p50', 'p95', 'p99', 'statuses'))
+    for r in results:
+        print('{:<40} {:>8} {:>7} {:>9.1f} {:>8.3f} {:>8.3f} {:>8.3f}  {}'.format(
+            r['url'], r['requests'], r['errors'], r['rps'], r['p50'], r['p95'], r['p99'], r['statuses']))
+    if len(results) > 1 and results[0]['rps']:
+        for r in results[1:]:
+            print(r['url'] + ' throughput is ' + '{:.2f}'.format(r['rps'] / results[0]['rps']) + 'x ' + results[0]['url'])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,11 +5,18 @@ import json
 import os
 import cgi
 
-from bbot.core import BBotCore, ChatbotEngine, BBotException, BBotLoggerAdapter
+from bbot.core import BBotCore, ChatbotEngine, BBotException, BBotLoggerAdapter, VolleyState
 from bbot.config import load_configuration
+from channels.publisher_cache import PublisherBotCache
 
 class Restful:
     """"""
+
+    # Request data. It's stored per thread so concurrent requests don't share it
+    params = VolleyState(dict)
+    dotbot = VolleyState(None)
+    core = VolleyState(None)
+
     def __init__(self, config: dict, dotbot: dict=None) -> None:
         """
 
@@ -20,18 +27,31 @@ class Restful:
         self.tts = None
         self.actr = None
         self.logger_level = ''
-        
-        self.params = {}        
+        self.publisher_cache_ttl = 30   # Seconds publisher tokens resolution is cached before checking if it's outdated
+        self.async_workers = 64         # Threads running bots in the async server
+        self.async_max_pending = 2000   # Requests the async server accepts at once. Requests over this get a 503 response
 
     def init(self, core):
         self.core = core
         self.logger = BBotLoggerAdapter(logging.getLogger('channel_restful'), self, self.core, 'ChannelRestful')        
 
     def endpoint(self, request=dict):
+        try:
+            params = request.get_json(force=True)
+        except Exception as e:
+            return self.get_error_response(e)
+        return self.get_response(params)
+
+    def get_response(self, params: dict) -> dict:
+        """
+        Runs the bot with the request params. It doesn't depend on the web framework so it's used by both sync and async servers
+
+        :param params: Request body
+        :return: Dictionary with response body, status and mimetype
+        """
         try:            
-            print('--------------------------------------------------------------------------------------------------------------------------------')
-            self.params = request.get_json(force=True)
-            self.logger.debug("Received request " + str(self.params))
+            self.params = params
+            self.logger.debug("Received request %s", self.params)
             
             user_id = self.params.get('userId')
             bot_id = self.params.get('botId')
@@ -43,31 +63,21 @@ class Restful:
             input_params['channelPlatform'] = 'bbot_restful_channel'
             
             # get publisher user id from token
-            pub_bot = self.dotdb.find_publisherbot_by_publisher_token(pub_token)
+            pub_bot, dotbot = PublisherBotCache.resolve(self.dotdb, pub_token, self.publisher_cache_ttl)
             if not pub_bot:
                 raise Exception('Publisher not found')
-            self.logger.debug('Found subscription id: ' + str(pub_bot.id) + ' - publisher name: ' + pub_bot.publisher_name + ' - for bot name: ' + pub_bot.bot_name + ' - bot id:' + pub_bot.bot_id)
+            self.logger.debug('Found subscription id: %s - publisher name: %s - for bot name: %s - bot id:%s', pub_bot.id, pub_bot.publisher_name, pub_bot.bot_name, pub_bot.bot_id)
             
             pub_id = pub_bot.publisher_name
-
-            print("1")
             
             # if 'runBot' in params:
             #    run_bot = self.params['runBot']
         
-            dotbot = self.dotdb.find_dotbot_by_bot_id(pub_bot.bot_id)                    
-            print("2")
             if not dotbot:
                 raise Exception('Bot not found')
             bot_id = dotbot.bot_id
-            # build extended dotbot 
-            dotbot.services = pub_bot.services
-            dotbot.channels = pub_bot.channels
-            dotbot.botsubscription = pub_bot
-            print("3")
             self.dotbot = dotbot # needed for methods below
             config = load_configuration(os.path.abspath(os.path.dirname(__file__) + "../../../instance"), "BBOT_ENV")            
-            print("4")
 
             bot = BBotCore.create_bot(config['bbot_core'], dotbot)
             self.core = bot
@@ -120,23 +130,35 @@ class Restful:
             http_code = 200
 
         except Exception as e:          
-            if isinstance(e, BBotException): # BBotException means the issue is in bot userland, not rhizome
-                http_code = 200                                                
-            else:
-                self.logger.critical(str(e) + "\n" + str(traceback.format_exc()))            
-                http_code = 500            
-                
-            if os.environ['BBOT_ENV'] == 'development':                
-                bbot_response = {                    
-                    'output': [{'type': 'message', 'text': cgi.escape(str(e))}], #@TODO use bbot.text() 
-                    'error': {'traceback': str(traceback.format_exc())}
-                    }
-            else:
-                bbot_response = {'output': [{'type': 'message', 'text': 'An error happened. Please try again later.'}]}
-                # @TODO this should be configured in dotbot
-                # @TODO let bot engine decide what to do?
+            return self.get_error_response(e)
+            
+        self.logger.debug("Response from restful channel: %s", bbot_response)
+        return {'response': json.dumps(bbot_response), 'status': http_code, 'mimetype': 'application/json'}
+
+    def get_error_response(self, e: Exception) -> dict:
+        """
+        Returns the response for an error handling the request
+
+        :param e: Exception
+        :return: Dictionary with response body, status and mimetype
+        """
+        if isinstance(e, BBotException): # BBotException means the issue is in bot userland, not rhizome
+            http_code = 200                                                
+        else:
+            self.logger.critical('%s\n%s', e, traceback.format_exc())            
+            http_code = 500            
+            
+        if os.environ['BBOT_ENV'] == 'development':                
+            bbot_response = {                    
+                'output': [{'type': 'message', 'text': cgi.escape(str(e))}], #@TODO use bbot.text() 
+                'error': {'traceback': str(traceback.format_exc())}
+                }
+        else:
+            bbot_response = {'output': [{'type': 'message', 'text': 'An error happened. Please try again later.'}]}
+            # @TODO this should be configured in dotbot
+            # @TODO let bot engine decide what to do?
             
-        self.logger.debug("Response from restful channel: " + str(bbot_response))
+        self.logger.debug("Response from restful channel: %s", bbot_response)
         return {'response': json.dumps(bbot_response), 'status': http_code, 'mimetype': 'application/json'}
 
     def get_endpoint_path(self) -> str:
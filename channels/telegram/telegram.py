@@ -1,5 +1,4 @@
 """Telegram Channel. LOAD channels.restful.app TO ANSWER TELEGRAM WEBHOOK"""
-import telepot
 import logging
 from urllib.parse import urlparse
 import time
@@ -8,10 +7,10 @@ import traceback
 import json
 import os
 import cgi
-from telepot.namedtuple import InlineKeyboardMarkup, InlineKeyboardButton
 
 from bbot.core import BBotCore, ChatbotEngine, BBotException, BBotLoggerAdapter
 from bbot.config import load_configuration
+from channels.publisher_cache import PublisherBotCache
 
 class Telegram:
     """Translates telegram request/response to flow"""
@@ -24,6 +23,7 @@ class Telegram:
         self.dotdb = None #
         self.api = None
         self.logger_level = ''
+        self.publisher_cache_ttl = 30   # Seconds publisher tokens resolution is cached before checking if it's outdated
         
         self.default_text_encoding = 'HTML' #@TODO move this to dotbot
 
@@ -38,11 +38,10 @@ class Telegram:
         self.core = core
         self.logger = BBotLoggerAdapter(logging.getLogger('channel_telegram'), self, self.core, 'ChannelTelegram')        
 
-        self.logger.debug("Listening Telegram from path: " + self.get_webhook_path())
+        self.logger.debug("Listening Telegram from path: %s", self.get_webhook_path())
 
     def endpoint(self, request=dict, publisherbot_token=str):
-        print('------------------------------------------------------------------------------------------------------------------------')
-        self.logger.debug(f'Received a Telegram webhook request for publisher token {publisherbot_token}')
+        self.logger.debug('Received a Telegram webhook request for publisher token %s', publisherbot_token)
 
         enabled = self.webhook_check(publisherbot_token)
         if enabled:
@@ -54,45 +53,40 @@ class Telegram:
                 # if not, it delete the webhook and throw an exception
                 
                 # get publisher user id from token
-                pub_bot = self.dotdb.find_publisherbot_by_publisher_token(publisherbot_token)
+                pub_bot, dotbot = PublisherBotCache.resolve(self.dotdb, publisherbot_token, self.publisher_cache_ttl)
                 if not pub_bot:
                     raise Exception('Publisher not found')
-                self.logger.debug('Found publisher: ' + pub_bot.publisher_name + ' - for bot id: ' + pub_bot.bot_id)
+                self.logger.debug('Found publisher: %s - for bot id: %s', pub_bot.publisher_name, pub_bot.bot_id)
                 pub_id = pub_bot.publisher_name
                 
                 # if 'runBot' in params:
                 #    run_bot = self.params['runBot']
             
-                dotbot = self.dotdb.find_dotbot_by_bot_id(pub_bot.bot_id)                    
                 if not dotbot:
                     raise Exception('Bot not found')
                 bot_id = dotbot.bot_id
-                # build extended dotbot 
-                dotbot.services = pub_bot.services
-                dotbot.channels = pub_bot.channels
-                dotbot.botsubscription = pub_bot
                 
                 token = pub_bot.channels['telegram']['token']
                 self.set_api_token(token)
 
                 user_id = self.get_user_id(params)
                 telegram_recv = self.get_message(params)
-                self.logger.debug('POST data from Telegram: ' + str(params))
+                self.logger.debug('POST data from Telegram: %s', params)
                 bbot_request = self.to_bbot_request(telegram_recv)
 
                 channel_id = 'telegram'
                                 
                 config = load_configuration(os.path.abspath(os.path.dirname(__file__) + "../../../instance"), "BBOT_ENV")
                 bbot = BBotCore.create_bot(config['bbot_core'], dotbot)
-                self.logger.debug('User id: ' + user_id)
+                self.logger.debug('User id: %s', user_id)
                 req = bbot.create_request(bbot_request, user_id, bot_id, org_id, pub_id, channel_id)                    
                 bbot_response = bbot.get_response(req)
                                 
                 self.send_response(bbot_response)
-                self.logger.debug("Response from telegram channel: " + str(bbot_response))
+                self.logger.debug("Response from telegram channel: %s", bbot_response)
 
             except Exception as e:           
-                self.logger.critical(str(e) + "\n" + str(traceback.format_exc()))            
+                self.logger.critical('%s\n%s', e, traceback.format_exc())            
                 if os.environ['BBOT_ENV'] == 'development':
                     bbot_response = {                        
                         'output': [{'type': 'message', 'text': cgi.escape(str(e))}],
@@ -103,18 +97,18 @@ class Telegram:
                     # @TODO this should be configured in dotbot
                     # @TODO let bot engine decide what to do?
                 
-                self.logger.debug("Response from telegram channel: " + str(bbot_response))
+                self.logger.debug("Response from telegram channel: %s", bbot_response)
                 self.send_response(bbot_response)
 
             
     def webhook_check(self, publisherbot_token):
 
-        pb = self.dotdb.find_publisherbot_by_publisher_token(publisherbot_token)
+        pb, _ = PublisherBotCache.resolve(self.dotdb, publisherbot_token, self.publisher_cache_ttl)
 
         if pb.channels.get('telegram'):
             return True
 
-        self.logger.warning(f'Deleting invalid Telegram webhook for publisher bot token: {publisherbot_token} - publisher id: ' + pb.publisher_name)
+        self.logger.warning('Deleting invalid Telegram webhook for publisher bot token: %s - publisher id: %s', publisherbot_token, pb.publisher_name)
         self.set_api_token(pb.channels['telegram']['token'])
         delete_ret = self.api.deleteWebhook()
         if delete_ret:
@@ -127,6 +121,7 @@ class Telegram:
             raise Exception(error)
 
     def set_api_token(self, token: str):
+        import telepot  # telegram SDK is loaded when the channel is used
         self.api = telepot.Bot(token)
 
     def to_bbot_request(self, request: str) -> str:
@@ -168,6 +163,7 @@ class Telegram:
 
 
     def _get_keyboard(self, buttons: list):
+        from telepot.namedtuple import InlineKeyboardMarkup, InlineKeyboardButton
         if not buttons or len(buttons) == 0:
             return None
         telegram_buttons = []
@@ -197,7 +193,7 @@ class Telegram:
             url = card['images'][0]['url']            
         caption = self._common_media_caption(card)
         keyboard = self._get_keyboard(buttons)
-        self.logger.debug('Sending image to Telegram: url: ' + url)
+        self.logger.debug('Sending image to Telegram: url: %s', url)
         self.api.sendPhoto(self.user_id, url, caption=caption, parse_mode=self.default_text_encoding, disable_notification=None, 
             reply_to_message_id=None, reply_markup=keyboard)
 
@@ -205,7 +201,7 @@ class Telegram:
         url = card['media'][0]['url']
         caption = self._common_media_caption(card)
         keyboard = self._get_keyboard(buttons)
-        self.logger.debug('Sending audio to Telegram: url: ' + url)
+        self.logger.debug('Sending audio to Telegram: url: %s', url)
         self.api.sendAudio(self.user_id, url, caption=caption, parse_mode=self.default_text_encoding, duration=None, performer=None,
            title=None, disable_notification=None, reply_to_message_id=None, reply_markup=keyboard)
 
@@ -213,7 +209,7 @@ class Telegram:
         url = card['media'][0]['url']
         caption = self._common_media_caption(card)
         keyboard = self._get_keyboard(buttons)
-        self.logger.debug('Sending video to Telegram: url: ' + url)
+        self.logger.debug('Sending video to Telegram: url: %s', url)
         self.api.sendVideo(self.user_id, url, duration=None, width=None, height=None, caption=caption, parse_mode=self.default_text_encoding, 
             supports_streaming=None, disable_notification=None, reply_to_message_id=None, reply_markup=keyboard)
 
@@ -262,6 +258,7 @@ class Telegram:
         This will check and start all webhooks for telegram enabled bots
         """
 
+        import telepot
         sleep_time = 3 # 20 requests per minute is ok?
 
         # get all telegram enabled bots
@@ -277,8 +274,8 @@ class Telegram:
         for tpb in telegram_pubbots:                    
             if tpb.channels['telegram']['token']:
                 self.logger.debug('---------------------------------------------------------------------------------------------------------------')
-                self.logger.debug('Checking Telegram webhook for publisher name ' + tpb.publisher_name + ' publisher token: ' + tpb.token + ' - bot id: ' + tpb.bot_id + '...')
-                self.logger.debug('Setting token: ' + tpb.channels['telegram']['token'])
+                self.logger.debug('Checking Telegram webhook for publisher name %s publisher token: %s - bot id: %s...', tpb.publisher_name, tpb.token, tpb.bot_id)
+                self.logger.debug('Setting token: %s', tpb.channels['telegram']['token'])
                 
                 try:
                     self.set_api_token(tpb.channels['telegram']['token'])
@@ -288,10 +285,10 @@ class Telegram:
 
                     # check webhook current status (faster than overriding webhook)
                     webhook_info = self.api.getWebhookInfo()
-                    self.logger.debug('WebHookInfo: ' + str(webhook_info))
+                    self.logger.debug('WebHookInfo: %s', webhook_info)
                     webhook_notset = webhook_info['url'] == ''
                     if webhook_info['url'] != url and not webhook_notset: # webhook url is set and wrong
-                        self.logger.warning('Telegram webhook set is invalid (' + webhook_info['url'] + '). Deleting webhook...')
+                        self.logger.warning('Telegram webhook set is invalid (%s). Deleting webhook...', webhook_info['url'])
                         delete_ret = self.api.deleteWebhook()
                         if delete_ret:
                             self.logger.warning("Successfully deleted.")
@@ -301,9 +298,9 @@ class Telegram:
                             raise Exception(error)
                         webhook_notset = True
                     if webhook_notset: # webhook is not set
-                        self.logger.info(f'Setting webhook for bot id ' + tpb.bot_id + f' with webhook url {url}')
+                        self.logger.info('Setting webhook for bot id %s with webhook url %s', tpb.bot_id, url)
                         set_ret = self.api.setWebhook(url=url, certificate=cert_file)
-                        self.logger.debug("setWebHook response: " + str(set_ret))
+                        self.logger.debug("setWebHook response: %s", set_ret)
                         if set_ret:
                             self.logger.info("Successfully set.")
                         else:
@@ -1,107 +1,203 @@
 """Models."""
 import datetime
 
-class Organization():
-    """Represent an organization."""
+
+class Model():
+    """
+    Base class for models.
+    Fields are declared once in FIELDS as (attribute, document key, default, required). Instances use __slots__ built
+    from them, so they don't carry a __dict__, and they are marshalled from documents by a function generated from it.
+    Callable defaults (ie: dict) are called to get a new value for each instance.
+    Fields without document key are not stored in the database.
+    projection is the mongodb projection of the document keys, the only ones needed to marshall the model.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+    projection = {}
 
     def __init__(self) -> None:
         """Initialize values."""
-        self.id = ''
-        self.name = '' # Unique organization name
+        for attr, _, default, _ in self.FIELDS:
+            setattr(self, attr, default() if callable(default) else default)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._marshaller = Model.build_marshaller(cls.FIELDS)
+        cls.projection = {key: 1 for _, key, _, _ in cls.FIELDS if key is not None}
+
+    @classmethod
+    def from_document(cls, document: dict):
+        """
+        Marshall a model from a mongodb document.
+
+        :param document: A mongodb document
+        :raises KeyError if a required field is missing
+        :return: Model instance
+        """
+        return cls._marshaller(cls, document)
+
+    @staticmethod
+    def build_marshaller(fields: tuple):
+        """
+        Generates the marshalling function of a fields table (as dataclasses do for __init__).
+        It assigns each slot directly, which is much faster than a generic loop over the table
+
+        :param fields: Fields table
+        :return: Function receiving the model class and the document
+        """
+        namespace = {}
+        lines = ['def marshaller(cls, document):', '    obj = cls.__new__(cls)']
+        for i, (attr, key, default, required) in enumerate(fields):
+            namespace['default_' + str(i)] = default
+            default_value = 'default_' + str(i) + ('()' if callable(default) else '')
+            if required:
+                lines.append('    obj.' + attr + ' = document[' + repr(key) + ']')
+            elif key is not None:
+                lines.append('    obj.' + attr + ' = document[' + repr(key) + '] if ' + repr(key) + ' in document else ' + default_value)
+            else:
+                lines.append('    obj.' + attr + ' = ' + default_value)
+        lines.append('    return obj')
+        exec('\n'.join(lines), namespace)  # pylint: disable=exec-used
+        return namespace['marshaller']
+
+    def __repr__(self) -> str:
+        return type(self).__name__ + '(' + ', '.join(f[0] + '=' + repr(getattr(self, f[0], None)) for f in self.FIELDS) + ')'
+
+
+class Organization(Model):
+    """Represent an organization."""
+
+    FIELDS = (
+        ('id', None, '', False),
+        ('name', 'name', '', True),     # Unique organization name
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
 
 
-class User():
+class User(Model):
     """Represent a user."""
 
-    def __init__(self) -> None:
-        """Initialize values."""
-        self.id = ''
-        self.username = ''        # Unique username
-        self.hashed_password = '' # Password in plain text that won't be stored.
-        self.organization = Organization()  # Organization
-        self.is_admin = 0         # 1: Admin, 0: Regular user
-        self.token = ''           # Authentication token
-        self.created_at = datetime.datetime.utcnow()
-        self.updated_at = datetime.datetime.utcnow()
+    FIELDS = (
+        ('id', None, '', False),
+        ('username', 'username', '', True),                 # Unique username
+        ('hashed_password', 'hashed_password', '', True),   # Password in plain text that won't be stored.
+        ('organization', None, Organization, False),        # Organization
+        ('is_admin', 'is_admin', 0, False),                 # 1: Admin, 0: Regular user
+        ('token', 'token', '', False),                      # Authentication token
+        ('created_at', 'created_at', datetime.datetime.utcnow, False),
+        ('updated_at', 'updated_at', datetime.datetime.utcnow, False),
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
 
 
-class Token():
+class Token(Model):
     """Represent an authentication token."""
 
-    def __init__(self) -> None:
-        """Initialize values."""
-        self.status = ''
-        self.token = ''
+    FIELDS = (
+        ('status', None, '', False),
+        ('token', None, '', False),
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
 
 class AuthenticationError(Exception):
     """Authentication error."""
 
 
-class DotBotContainer():
+class DotBotContainer(Model):
     """Represent a DotBotContainer object."""
 
-    def __init__(self) -> None:
-        """Initialize values."""
-        self.dotbot = {}  # Actual dotbot data
-        self.organization = Organization()  # Organization
-        self.deleted = 0          # 1: Deleted, 0: Not deleted
-        self.createdAt = datetime.datetime.utcnow()
-        self.updatedAt = datetime.datetime.utcnow()
+    FIELDS = (
+        ('dotbot', 'dotbot', dict, True),                   # Actual dotbot data
+        ('organization', None, Organization, False),        # Organization
+        ('deleted', 'deleted', 0, True),                    # 1: Deleted, 0: Not deleted
+        ('createdAt', 'createdAt', datetime.datetime.utcnow, True),
+        ('updatedAt', 'updatedAt', datetime.datetime.utcnow, True),
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
 
-class DotBot():
+class DotBot(Model):
     """Represent a DotBot container object."""
 
-    def __init__(self) -> None:
-        """Initialize values."""
-        self.ownerName = ''
-        self.bot_id = ''
-        self.name = ''
-        self.title = ''
-        self.chatbot_engine = {}
-        self.per_use_cost = 0
-        self.per_month_cost = 0
-        self.updated_at = None        
-        self.tts = {}
-        
-class PublisherBot():
+    FIELDS = (
+        ('owner_name', 'ownerName', '', True),
+        ('bot_id', 'botId', '', True),
+        ('name', 'name', '', True),
+        ('title', 'title', '', True),
+        ('chatbot_engine', 'chatbotEngine', dict, True),
+        ('per_use_cost', 'perUseCost', 0, True),
+        ('per_month_cost', 'perMonthCost', 0, True),
+        ('updated_at', 'updatedAt', None, True),
+        ('tts', 'tts', dict, False),
+        # extended dotbot. Set by channels from the publisher bot
+        ('services', None, list, False),
+        ('channels', None, dict, False),
+        ('botsubscription', None, None, False),
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
+
+class PublisherBot(Model):
     """Represent a PublisherBot container object."""
 
-    def __init__(self) -> None:
-        """Initialize values."""
-        self.id = ''
-        self.token = ''
-        self.publisher_name = ''
-        self.bot_id = ''
-        self.bot_name = ''
-        self.subscription_type = ''
-        self.updated_at = None
-        self.channels = {}
-        self.services = []
-        self.predefined_vars = {}
-
-class DotFlowContainer():
+    FIELDS = (
+        ('id', 'subscriptionId', '', True),
+        ('token', 'token', '', True),
+        ('publisher_name', 'publisherName', '', True),
+        ('bot_id', 'botId', '', True),
+        ('bot_name', 'botName', '', True),
+        ('subscription_type', 'subscriptionType', '', True),
+        ('updated_at', 'updatedAt', None, True),
+        ('channels', 'channels', dict, True),
+        ('services', 'services', list, True),
+        ('predefined_vars', 'predefined_vars', dict, False),
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
+
+class DotFlowContainer(Model):
     """Represent a DotFlow container object."""
 
-    def __init__(self) -> None:
-        """Initialize values."""
-        self.dotflow = {}  # Actual DotFlow data
-        self.dotbot = DotBotContainer()  # DotBot
-        self.createdAt = datetime.datetime.utcnow()
-        self.updatedAt = datetime.datetime.utcnow()
-
-class RemoteAPI():
+    FIELDS = (
+        ('dotflow', 'dotflow', dict, False),                # Actual DotFlow data
+        ('dotbotId', 'dotbotId', '', False),                # DotBot id
+        ('_dotbot', None, None, False),                     # DotBotContainer joined by the repository
+        ('dotbot_loader', None, None, False),               # Function loading the DotBotContainer by id when it's not joined
+        ('createdAt', 'createdAt', datetime.datetime.utcnow, False),
+        ('updatedAt', 'updatedAt', datetime.datetime.utcnow, False),
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
+
+    @property
+    def dotbot(self) -> DotBotContainer:
+        """
+        DotBot container. Lazy references are loaded on first access
+
+        :return: DotBotContainer instance or None if not found
+        """
+        if self.dotbot_loader is not None:
+            self._dotbot = self.dotbot_loader(self.dotbotId)
+            self.dotbot_loader = None
+        return self._dotbot
+
+    @dotbot.setter
+    def dotbot(self, dotbot: DotBotContainer) -> None:
+        self._dotbot = dotbot
+        self.dotbot_loader = None
+
+class RemoteAPI(Model):
     """Represent a RemoteAPI object."""
 
-    def __init__(self) -> None:
-        """Initialize values."""        
-        self.name = ''
-        self.category = None
-        self.function_name = ''
-        self.url = ''
-        self.method = ''
-        self.headers = []
-        self.timeout = 0,
-        self.user = '',
-        self.passwd = '',        
-        self.predefined_vars = []
-        self.mapped_vars = []
+    FIELDS = (
+        ('name', 'name', '', True),
+        ('category', 'category', None, True),
+        ('function_name', 'function_name', '', True),
+        ('url', 'url', '', True),
+        ('method', 'method', '', True),
+        ('headers', 'headers', dict, False),
+        ('timeout', None, 0, False),
+        ('user', None, '', False),
+        ('passwd', None, '', False),
+        ('predefined_vars', 'predefined_vars', dict, False),
+        ('mapped_vars', 'mapped_vars', list, False),
+        ('cost', 'cost', 0, True),
+    )
+    __slots__ = tuple(f[0] for f in FIELDS)
@@ -4,16 +4,69 @@ import datetime
 import bcrypt
 import logging
 import pymongo
-from pymongo import MongoClient, ASCENDING
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
 from bson.objectid import ObjectId
 
+from bbot.mongo_registry import MongoRegistry
 from .models import User, Organization, DotBotContainer, DotBot, PublisherBot, Token, DotFlowContainer, AuthenticationError, RemoteAPI
 from bbot.core import BBotLoggerAdapter, BBotCore
 
 class DotRepository():
     """MongoDB client."""
 
-    mongo_clients = {} # mongo clients cache
+    checked_uris = set()  # databases whose indexes were checked by this process
+
+    # Indexes needed by the repository queries (and the ones other plugins run on the same database)
+    # as {collection: [(keys, options)]}
+    INDEXES = {
+        'organizations': [([('name', ASCENDING)], {'unique': True})],
+        'users': [([('username', ASCENDING)], {'unique': True}),
+                  ([('token', ASCENDING)], {'unique': True})],
+        'dotbot': [([('dotbot.id', ASCENDING)], {}),
+                   ([('dotbot.name', ASCENDING)], {})],
+        'dotflow': [([('dotbotId', ASCENDING), ('dotflow.nodes.id', ASCENDING)], {}),
+                    ([('dotbotId', ASCENDING), ('dotflow.nodes.context', ASCENDING)], {}),
+                    ([('dotflow.id', ASCENDING)], {}),
+                    ([('dotflow.name', ASCENDING)], {})],
+        'greenhouse_dotbots': [([('botId', ASCENDING)], {})],
+        'greenhouse_publisher_bots': [([('token', ASCENDING)], {}),
+                                      ([('subscriptionId', ASCENDING)], {})],
+        'remote_apis': [],  # queried by _id only
+        'user_data': [([('userId', ASCENDING)], {})],   # dotflow2 sessions
+        'userData': [([('userId', ASCENDING)], {})],    # flow sessions
+        'activity': [([('botId', ASCENDING), ('datetime', DESCENDING)], {}),
+                     ([('pubId', ASCENDING), ('datetime', DESCENDING)], {})],
+        'watson_assistant_bot_data': [([('user_id', ASCENDING), ('bot_id', ASCENDING)], {})],
+        'directline_bot_data': [([('user_id', ASCENDING), ('bot_id', ASCENDING)], {})],
+        'pandorabots_bot_data': [([('bot_id', ASCENDING), ('user_id', ASCENDING)], {})],
+        'azure_ad_access_token': [([('bot_id', ASCENDING)], {})],
+        'subscription_payments': [([('subscriptionId', ASCENDING)], {})],
+    }
+
+    # Sample of each query the repository runs, used to check their plans. (collection, filters)
+    QUERIES = [
+        ('organizations', {'name': ''}),
+        ('users', {'username': ''}),
+        ('users', {'token': ''}),
+        ('dotbot', {'$or': [{'dotbot.id': ''}, {'dotbot.name': ''}]}),
+        ('dotflow', {'$or': [{'dotflow.id': ''}, {'dotflow.name': ''}]}),
+        ('dotflow', {'dotbotId': ''}),
+        ('dotflow', {'$and': [{'dotbotId': ''}, {'dotflow.nodes.id': ''}]}),
+        ('dotflow', {'dotbotId': '', 'dotflow.nodes.id': ''}),
+        ('dotflow', {'dotbotId': '', 'dotflow.nodes.context': ''}),
+        ('greenhouse_dotbots', {'botId': ''}),
+        ('greenhouse_dotbots', {'botId': {'$in': ['']}}),
+        ('greenhouse_publisher_bots', {'token': ''}),
+        ('greenhouse_publisher_bots', {'subscriptionId': {'$in': ['']}}),
+        ('user_data', {'userId': ''}),
+        ('activity', {'botId': ''}),
+        ('watson_assistant_bot_data', {'user_id': '', 'bot_id': ''}),
+        ('directline_bot_data', {'user_id': '', 'bot_id': ''}),
+        ('pandorabots_bot_data', {'bot_id': '', 'user_id': ''}),
+        ('azure_ad_access_token', {'bot_id': ''}),
+        ('subscription_payments', {'subscriptionId': ''}),
+    ]
 
     def __init__(self, config: dict, dotbot: dict=None) -> None:
         """Initialize the connection."""
@@ -22,11 +75,34 @@ class DotRepository():
 
         self.logger_level = ''
 
-        self.connection_timeout = 5000
+        self.mongo_registry = MongoRegistry.get_default()
+        self.database_name = None
+        self._mongo = None
+        self.mongo_pid = None                  # process the database handle belongs to
+
+        self.ensure_indexes_on_init = True     # Create missing indexes the first time the database is used
+        self.explain_queries_on_init = False   # Diagnostic mode. Logs the repository queries running collection scans
         
         if 'uri' not in config:
             raise RuntimeError("FATAL ERR: Missing config var uri")
             
+    @property
+    def mongo(self):
+        """
+        Repository database. Forked children (pre-forking servers) get it again from their own client
+
+        :return: Database
+        """
+        if self.mongo_pid != os.getpid() and self.database_name:
+            self._mongo = self.mongo_registry.get_client(self.config['uri'])[self.database_name]
+            self.mongo_pid = os.getpid()
+        return self._mongo
+
+    @mongo.setter
+    def mongo(self, database) -> None:
+        self._mongo = database
+        self.mongo_pid = os.getpid()
+
     def init(self, core: BBotCore):
         """
         :param bot:
@@ -40,16 +116,19 @@ class DotRepository():
         database_name = uri_parts['database']
                        
         self.logger.debug("Initializing mongodb with URI " + uri.replace(str(uri_parts['password']), '********'))        
-        if uri in DotRepository.mongo_clients.keys(): # look in cache
-            self.logger.debug("Found mongo client already active in memory")
-            self.mongo = DotRepository.mongo_clients[uri]
+        self.database_name = database_name
+        self.mongo = self.mongo_registry.get_client(uri)[database_name]
+        if uri in DotRepository.checked_uris:
             return
-        
-        client = MongoClient(uri, serverSelectionTimeoutMS=self.connection_timeout)
-        
-        self.mongo = client[database_name]
+        DotRepository.checked_uris.add(uri)
 
-        DotRepository.mongo_clients[uri] = client[database_name]
+        try:
+            if self.ensure_indexes_on_init:
+                self.ensure_indexes()
+            if self.explain_queries_on_init:
+                self.explain_queries()
+        except PyMongoError as e:
+            self.logger.warning("Couldn't check database indexes: " + str(e))
 
     def restart_from_scratch(self):
         """Drop and recreate each collection in database."""
@@ -59,11 +138,7 @@ class DotRepository():
             if collection_name in collections_in_db:
                 self.mongo.drop_collection(collection_name)
             self.mongo.create_collection(collection_name)
-        # Unique organization name
-        self.mongo.organizations.create_index('name', unique=True)
-        # Unique username and token
-        self.mongo.users.create_index('username', unique=True)
-        self.mongo.users.create_index('token', unique=True)
+        self.ensure_indexes()
         # Unique dotbot name
         #self.mongo.dotbot.create_index('dotbot.name', unique=True)
         # Unique dotflow name by dotbot
@@ -71,6 +146,58 @@ class DotRepository():
         #                                 ('dotbot_id', ASCENDING)],
         #                               unique=True)
 
+    def ensure_indexes(self) -> list:
+        """
+        Create the indexes declared in INDEXES. Existing indexes are left as they are so it can run on each startup.
+
+        :return: List of index names
+        """
+        names = []
+        for collection_name, indexes in DotRepository.INDEXES.items():
+            for keys, options in indexes:
+                try:
+                    names.append(self.mongo[collection_name].create_index(keys, **options))
+                except PyMongoError as e:  # ie: an index with the same keys and different options
+                    self.logger.warning('Couldn\'t create index ' + str(keys) + ' on ' + collection_name + ': ' + str(e))
+        self.logger.debug('Indexes checked: ' + str(len(names)))
+        return names
+
+    def explain_queries(self, queries: list=None) -> list:
+        """
+        Get the plan of the repository queries and log the ones scanning whole collections.
+
+        :param queries: List of (collection, filters). Defaults to QUERIES
+        :return: List of dicts with collection, filters, stages and collscan flag by query
+        """
+        plans = []
+        for collection_name, filters in queries or DotRepository.QUERIES:
+            explain = self.mongo[collection_name].find(filters).explain()
+            stages = DotRepository.get_plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+            plan = {'collection': collection_name, 'filters': filters, 'stages': stages, 'collscan': 'COLLSCAN' in stages}
+            if plan['collscan']:
+                self.logger.warning('Query on ' + collection_name + ' runs a collection scan: ' + str(filters))
+            plans.append(plan)
+        return plans
+
+    @staticmethod
+    def get_plan_stages(plan) -> list:
+        """
+        Returns the stages of a query plan, from the top one
+
+        :param plan: Winning plan of an explain() result
+        :return: List of stage names
+        """
+        stages = []
+        if isinstance(plan, dict):
+            if 'stage' in plan:
+                stages.append(plan['stage'])
+            for value in plan.values():
+                stages += DotRepository.get_plan_stages(value)
+        elif isinstance(plan, list):
+            for value in plan:
+                stages += DotRepository.get_plan_stages(value)
+        return stages
+
     @staticmethod
     def get_projection_from_fields(fields: list=[]):
         """Returns a mongodb projection based on a list of fieldnames in dot notation (note _id will be included always)"""
@@ -91,9 +218,8 @@ class DotRepository():
         }
         organization_id = self.mongo.organizations.insert_one(params).inserted_id
         result = self.mongo.organizations.find_one({"_id": ObjectId(str(organization_id))})
-        organization = Organization()
+        organization = Organization.from_document(result)
         organization.id = str(organization_id)
-        organization.name = result['name']
         return organization
 
     def find_one_organization(self, filters: dict) -> Organization:
@@ -106,11 +232,27 @@ class DotRepository():
         result = self.mongo.organizations.find_one(filters)
         if not result:
             return None
-        organization = Organization()
+        organization = Organization.from_document(result)
         organization.id = str(result['_id'])
-        organization.name = result['name']
         return organization
 
+    def find_organizations_by_ids(self, organization_ids: list) -> dict:
+        """
+        Retrieve organizations by their ids in a single query.
+
+        :param organization_ids: List of organization ids
+        :return: Dictionary of Organization instances by id
+        """
+        organizations = {}
+        if not organization_ids:
+            return organizations
+        object_ids = list({ObjectId(str(oid)) for oid in organization_ids})
+        for result in self.mongo.organizations.find({'_id': {'$in': object_ids}}):
+            organization = Organization.from_document(result)
+            organization.id = str(result['_id'])
+            organizations[organization.id] = organization
+        return organizations
+
 ### USERS/AUTH (deprecated?)
 
     def find_one_user(self, filters: dict) -> User:
@@ -123,10 +265,8 @@ class DotRepository():
         result = self.mongo.users.find_one(filters)
         if not result:
             return None
-        user = User()
+        user = User.from_document(result)
         user.id = str(result['_id'])
-        user.username = result['username']
-        user.hashed_password = result['hashed_password']
         organization_id = ObjectId(str(result['organization_id']))
         user.organization = self.find_one_organization({'_id': organization_id})
         return user
@@ -202,33 +342,48 @@ class DotRepository():
 
 ### DOTBOTCONTAINER
 
-    def marshall_dotbot_container(self, result) -> DotBotContainer:
+    def marshall_dotbot_container(self, result, organizations: dict=None) -> DotBotContainer:
         """
         Marshall a dotbotcontainer.
 
         :param result: A mongodb document representing a dotbot.
+        :param organizations: Organizations already loaded by id. If None the organization is queried
         :return: DotBotContainer instance
         """
-        dotbot_container = DotBotContainer()
-        dotbot_container.dotbot = result['dotbot']
-        dotbot_container.organization = self.find_one_organization({'_id': ObjectId(str(result['organizationId']))})
-        dotbot_container.deleted = result['deleted']
-        dotbot_container.createdAt = result['createdAt']
-        dotbot_container.updatedAt = result['updatedAt']
+        dotbot_container = DotBotContainer.from_document(result)
+        if organizations is None:
+            dotbot_container.organization = self.find_one_organization({'_id': ObjectId(str(result['organizationId']))})
+        else:
+            dotbot_container.organization = organizations.get(str(result['organizationId']))
         return dotbot_container
 
     def find_dotbot_containers(self, filters: dict) -> list:
         """
         Retrieve a list of dotbots.
+        Organizations are loaded in a single query for all the dotbots.
 
         :param filters: Dictionary with matching conditions.
         :return: List of dotbots
         """
-        results = self.mongo.dotbot.find(filters)
-        dotbots = []
-        for result in results:
-            dotbots.append(self.marshall_dotbot_container(result))
-        return dotbots
+        results = list(self.mongo.dotbot.find(filters))
+        organizations = self.find_organizations_by_ids([r['organizationId'] for r in results])
+        return [self.marshall_dotbot_container(result, organizations) for result in results]
+
+    def find_dotbot_containers_by_idnames(self, dotbot_idnames: list) -> dict:
+        """
+        Retrieve dotbots by their ids or names in a single query.
+
+        :param dotbot_idnames: List of dotbot ids or names
+        :return: Dictionary of DotBotContainer instances by the id or name requested
+        """
+        dotbot_idnames = list(set(dotbot_idnames))
+        if not dotbot_idnames:
+            return {}
+        dotbots = self.find_dotbot_containers(
+            {'$or': [{'dotbot.id': {'$in': dotbot_idnames}}, {'dotbot.name': {'$in': dotbot_idnames}}]})
+        by_name = {dbc.dotbot.get('name'): dbc for dbc in dotbots}
+        by_id = {dbc.dotbot.get('id'): dbc for dbc in dotbots}
+        return {idname: by_id.get(idname) or by_name.get(idname) for idname in dotbot_idnames}
 
     def find_one_dotbot_container(self, filters: dict) -> DotBotContainer:
         """
@@ -353,41 +508,30 @@ class DotRepository():
         :param result: A mongodb document representing a dotbot.
         :return: DotBot instance
         """
-        dotbot = DotBot()
-        dotbot.owner_name = result['ownerName']
-        dotbot.name = result['name']
-        dotbot.bot_id = result['botId']
-        dotbot.title = result['title']        
-        dotbot.chatbot_engine = result['chatbotEngine']
-        dotbot.per_use_cost = result['perUseCost']
-        dotbot.per_month_cost = result['perMonthCost']
-        dotbot.updated_at = result['updatedAt']
-        try:
-            dotbot.tts = result['tts']
-        except KeyError:
-            dotbot.tts = {}
-        return dotbot
+        return DotBot.from_document(result)
 
-    def find_one_dotbot(self, filters: dict) -> DotBot:
+    def find_one_dotbot(self, filters: dict, projection: dict=None) -> DotBot:
         """
         Retrieve a dotbot by filters.
 
         :param filters: Dictionary with matching conditions.
+        :param projection: Dictionary with projection setting. Defaults to the DotBot fields
         :return: DotBot instance or None if not found.
         """       
-        result = self.mongo.greenhouse_dotbots.find_one(filters)        
+        result = self.mongo.greenhouse_dotbots.find_one(filters, projection or DotBot.projection)
         if not result:
             return None
         return self.marshall_dotbot(result)
 
-    def find_dotbots(self, filters: dict) -> list:
+    def find_dotbots(self, filters: dict, projection: dict=None) -> list:
         """
         Retrieve a list of dotbots.
 
         :param filters: Dictionary with matching conditions.
+        :param projection: Dictionary with projection setting. Defaults to the DotBot fields
         :return: List of dotbots
         """
-        results = self.mongo.greenhouse_dotbots.find(filters)
+        results = self.mongo.greenhouse_dotbots.find(filters, projection or DotBot.projection)
         dotbots = []
         for result in results:
             dotbots.append(self.marshall_dotbot(result))
@@ -396,93 +540,125 @@ class DotRepository():
     def find_dotbot_by_bot_id(self, bot_id: str) -> DotBot:
         return self.find_one_dotbot({'botId': bot_id})
 
+    def find_dotbot_versions(self, bot_ids: list) -> dict:
+        """
+        Retrieve the version of many dotbots in a single query
+
+        :param bot_ids: List of DotBot IDs
+        :return: Dictionary with updatedAt by bot id
+        """
+        results = self.mongo.greenhouse_dotbots.find({'botId': {'$in': bot_ids}}, {'botId': 1, 'updatedAt': 1})
+        return {r['botId']: r['updatedAt'] for r in results}
+
     ### publisher_bot
 
     def find_publisherbot_by_publisher_token(self, pub_token: str):
         return self.find_one_publisherbot({'token': pub_token})
 
+    def find_publisherbot_and_dotbot_by_publisher_token(self, pub_token: str) -> tuple:
+        """
+        Retrieve a publisherbot and its dotbot in a single query
+
+        :param pub_token: Publisher token
+        :return: Tuple with PublisherBot and DotBot. Any of them is None if not found
+        """
+        results = list(self.mongo.greenhouse_publisher_bots.aggregate([
+            {'$match': {'token': pub_token}},
+            {'$limit': 1},
+            {'$lookup': {'from': 'greenhouse_dotbots', 'localField': 'botId', 'foreignField': 'botId', 'as': 'dotbot'}},
+            {'$project': {**PublisherBot.projection, **{'dotbot.' + key: 1 for key in DotBot.projection}}}
+        ]))
+        if not results:
+            return None, None
+        dotbots = results[0].pop('dotbot')
+        return self.marshall_publisherbot(results[0]), self.marshall_dotbot(dotbots[0]) if dotbots else None
+
     def find_publisherbots_by_channel(self, channel: str) -> list:    
         field = 'channels.' + channel
         return self.find_publisherbots({field: {'$exists': True}})
 
-    def find_one_publisherbot(self, filters: dict) -> PublisherBot:
+    def find_one_publisherbot(self, filters: dict, projection: dict=None) -> PublisherBot:
         """
         Retrieve a publisherbot by filters.
 
         :param filters: Dictionary with matching conditions.
+        :param projection: Dictionary with projection setting. Defaults to the PublisherBot fields
         :return: PublisherBot instance or None if not found.
         """    
-        result = self.mongo.greenhouse_publisher_bots.find_one(filters)        
+        result = self.mongo.greenhouse_publisher_bots.find_one(filters, projection or PublisherBot.projection)
         if not result:
             return None
         return self.marshall_publisherbot(result)
 
-    def find_publisherbots(self, filters: dict) -> list:                
-        results = self.mongo.greenhouse_publisher_bots.find(filters)
+    def find_publisherbots(self, filters: dict, projection: dict=None) -> list:
+        results = self.mongo.greenhouse_publisher_bots.find(filters, projection or PublisherBot.projection)
         publisherbots = []
         for result in results:
             publisherbots.append(self.marshall_publisherbot(result))
         return publisherbots
 
+    def find_publisherbot_versions(self, subscription_ids: list) -> dict:
+        """
+        Retrieve the version of many publisher bots in a single query
+
+        :param subscription_ids: List of subscription IDs
+        :return: Dictionary with updatedAt by subscription id
+        """
+        results = self.mongo.greenhouse_publisher_bots.find(
+            {'subscriptionId': {'$in': subscription_ids}}, {'subscriptionId': 1, 'updatedAt': 1})
+        return {r['subscriptionId']: r['updatedAt'] for r in results}
+
     def marshall_publisherbot(self, result) -> PublisherBot:
-        pub_bot = PublisherBot()
-        pub_bot.id = result['subscriptionId']
-        pub_bot.token = result['token']
-        pub_bot.publisher_name = result['publisherName']
-        pub_bot.bot_id = result['botId']
-        pub_bot.bot_name = result['botName']
-        pub_bot.subscription_type = result['subscriptionType']
-        pub_bot.updated_at = result['updatedAt']
-        pub_bot.channels = result['channels']
-        pub_bot.services = result['services']
-        try:
-            pub_bot.predefined_vars = result['predefined_vars']
-        except KeyError:
-            pub_bot.predefined_vars = {}
-        return pub_bot
+        return PublisherBot.from_document(result)
 
     ### DOTFLOWS
 
-    def marshall_dotflow(self, result) -> DotFlowContainer:
+    def marshall_dotflow(self, result, dotbots: dict=None) -> DotFlowContainer:
         """
         Marshall a DotFlowContainer.
 
         :param result: A mongodb document representing a DotFlow.
+        :param dotbots: DotBot containers already loaded by id. If None the dotbot is a lazy reference
         :return: DotFlow instance
         """
-        dotflow_container = DotFlowContainer()
-        if result.get('dotflow'): dotflow_container.dotflow = result['dotflow']
-        if result.get('dotbotId'): dotflow_container.dotbot = self.find_dotbot_container_by_idname(result['dotbotId'])
-        if result.get('createdAt'): dotflow_container.createdAt = result['createdAt']
-        if result.get('updatedAt'): dotflow_container.updatedAt = result['updatedAt']
+        dotflow_container = DotFlowContainer.from_document(result)
+        if dotbots is not None:
+            dotflow_container.dotbot = dotbots.get(dotflow_container.dotbotId)
+        elif dotflow_container.dotbotId:
+            dotflow_container.dotbot_loader = self.find_dotbot_container_by_idname
         return dotflow_container
 
-    def find_dotflows(self, filters: dict, projection: dict=None) -> list:
+    def find_dotflows(self, filters: dict, projection: dict=None, lazy: bool=False) -> list:
         """
         Retrieve a list of DotFlows.
+        DotBots are loaded in a single query for all the dotflows.
 
         :param filters: Dictionary with matching conditions.
         :param projection: Dictionary with projection setting.
+        :param lazy: If True dotbots are loaded on first access to DotFlowContainer.dotbot
         :return: List of dotflows.
         """
+        results = list(self.mongo.dotflow.find(filters, projection))
+        dotbots = None
+        if not lazy:
+            dotbots = self.find_dotbot_containers_by_idnames([r['dotbotId'] for r in results if r.get('dotbotId')])
+        return [self.marshall_dotflow(result, dotbots) for result in results]
 
-        results = self.mongo.dotflow.find(filters, projection)
-        dotflows = []
-        for result in results:
-            dotflows.append(self.marshall_dotflow(result))
-        return dotflows
-
-    def find_one_dotflow(self, filters: dict) -> DotFlowContainer:
+    def find_one_dotflow(self, filters: dict, lazy: bool=False) -> DotFlowContainer:
         """
         Retrieve a DotFlow by filters.
 
         :param filters: Dictionary with matching conditions.
+        :param lazy: If True the dotbot is loaded on first access to DotFlowContainer.dotbot
         :return: DotFlow instance or None if not found.
         """
         result = self.mongo.dotflow.find_one(filters)
         if not result:
             return None
-        return self.marshall_dotflow(result)
+        dotflow_container = self.marshall_dotflow(result)
+        if not lazy:
+            _ = dotflow_container.dotbot
+        return dotflow_container
 
     def find_dotflow_by_container_id(self, container_id) -> DotFlowContainer:
         """
@@ -502,15 +678,16 @@ class DotRepository():
         """
         return self.find_one_dotflow({'$or': [{'dotflow.id': dotflow_idname}, {'dotflow.name': dotflow_idname}]})
 
-    def find_dotflow_by_node_id(self, dotbot_id: str, node_id: str) -> DotFlowContainer:
+    def find_dotflow_by_node_id(self, dotbot_id: str, node_id: str, lazy: bool=False) -> DotFlowContainer:
         """
         Retrieve a DotFlowContainer object containing the specified node id
 
         :param dotbot_id: DotBot ID
         :param node_id: Node ID
+        :param lazy: If True the dotbot is loaded on first access
         :return: DotFlowContainer instance or None if not found.
         """
-        return self.find_one_dotflow({'$and': [{'dotbotId': dotbot_id}, {'dotflow.nodes.id': node_id}]})
+        return self.find_one_dotflow({'$and': [{'dotbotId': dotbot_id}, {'dotflow.nodes.id': node_id}]}, lazy)
 
     def find_node_by_id(self, dotbot_id: str, node_id: str) -> dict:
         """
@@ -518,15 +695,14 @@ class DotRepository():
 
         :param dotbot_id: DotBot ID.
         :param node_id: Node ID.
-        :return:
+        :return: Node or None if not found
         """
-        dfc = self.find_dotflow_by_node_id(dotbot_id, node_id)
-        if not dfc:
+        # positional projection: only the first node matching the query is returned
+        result = self.mongo.dotflow.find_one({'dotbotId': dotbot_id, 'dotflow.nodes.id': node_id},
+                                             {'_id': 0, 'dotflow.nodes.$': 1})
+        if not result:
             return None
-
-        for n in dfc.dotflow['nodes']:
-            if n['id'] == node_id:
-                return n
+        return result['dotflow']['nodes'][0]
 
     def find_dotflows_by_dotbot_idname(self, dotbot_idname: str, fields: list=[]) -> list:
         """
@@ -541,7 +717,10 @@ class DotRepository():
 
         query = {'dotbotId': dotbot_container.dotbot['id']}
         projection = DotRepository.get_projection_from_fields(fields)
-        return self.find_dotflows(query, projection)
+        dotflows = self.find_dotflows(query, projection, lazy=True)
+        for df in dotflows:  # all of them belong to the dotbot we already have
+            df.dotbot = dotbot_container
+        return dotflows
 
     def find_dotflows_by_context(self, dotbot_id: str, context: str) -> list:
         """
@@ -551,20 +730,34 @@ class DotRepository():
         :param context: Context
         :return: List of DotFlow2 objects
         """
-        # Get flows with nodes with the wanted context
-        query = {"$and": [{"dotbotId": dotbot_id}, {"dotflow.nodes": {"$elemMatch": {"context": context}}}]}
-        projection = {"dotflow.nodes": 1}
-        dotflows = self.find_dotflows(query, projection)
+        # Get flows with nodes with the wanted context and filter their nodes in the server
+        node_context = {'$ifNull': ['$$node.context', []]}
+        results = self.mongo.dotflow.aggregate([
+            {'$match': {'dotbotId': dotbot_id, 'dotflow.nodes.context': context}},
+            {'$project': {'_id': 0, 'nodes': {'$filter': {
+                'input': '$dotflow.nodes', 'as': 'node',
+                'cond': {'$in': [context, {'$cond': [{'$isArray': node_context}, node_context, [node_context]]}]}}}}}
+        ])
 
-        # Get nodes with the context
         context_nodes = []
-        for df in dotflows:
-            for n in df.dotflow['nodes']:
-                if context in n.get('context', []):
-                    context_nodes.append(n)
-
+        for result in results:
+            context_nodes += result['nodes']
         return context_nodes
 
+    def find_nodes_by_dotbot_id(self, dotbot_id: str) -> list:
+        """
+        Retrieve all the nodes of a DotBot in a single query
+
+        :param dotbot_id: DotBot ID
+        :return: List of nodes in the same order they are stored
+        """
+        query = {"dotbotId": dotbot_id}
+        projection = {"dotflow.nodes": 1}
+        nodes = []
+        for df in self.find_dotflows(query, projection, lazy=True):
+            nodes += df.dotflow.get('nodes', [])
+        return nodes
+
     def create_dotflow(self, dotflow: dict, dotbot: dict) -> DotFlowContainer:
         """
         Create a new dotflow.
@@ -679,17 +872,7 @@ class DotRepository():
         :param result: A mongodb document representing a dotbot.
         :return: DotBot instance
         """
-        rapi = RemoteAPI()
-        rapi.name = result['name']
-        rapi.category = result['category']
-        rapi.function_name = result['function_name']
-        rapi.url = result['url']
-        rapi.method = result['method']
-        rapi.headers = result.get('headers', {})
-        rapi.predefined_vars = result.get('predefined_vars', {})
-        rapi.mapped_vars = result.get('mapped_vars', [])
-        rapi.cost = result['cost']
-        return rapi
+        return RemoteAPI.from_document(result)
 
 
     def find_remote_api_by_id(self, remote_api_id) -> dict:
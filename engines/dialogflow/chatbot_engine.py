@@ -1,17 +1,15 @@
 """BBot engine that calls dialogflow."""
 import logging
 import json
-from bbot.core import BBotCore, ChatbotEngine, ChatbotEngineError, BBotLoggerAdapter
-
-import dialogflow
-from google.oauth2.service_account import Credentials
-from google.protobuf.json_format import MessageToDict
+from bbot.core import BBotCore, ChatbotEngine, ChatbotEngineError, BBotLoggerAdapter, VolleyState
 
 class DialogFlow(ChatbotEngine):
     """
     BBot engine that calls external program.
     """
 
+    platform = VolleyState(None)  # Dialogflow platform of the volley channel
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
         Initialize the plugin.
@@ -29,7 +27,6 @@ class DialogFlow(ChatbotEngine):
         self.logger = BBotLoggerAdapter(logging.getLogger('dialogfl_cbe'), self, self.core)
         
         self.service_account = json.loads(self.dotbot.chatbot_engine['serviceAccount'])
-        self.platform = None
 
         self.available_platforms = {
             'google_assistant': 'ACTIONS_ON_GOOGLE',
@@ -39,6 +36,9 @@ class DialogFlow(ChatbotEngine):
             'skype': 'SKYPE'
         }
         
+        # SDKs are imported here so they are loaded only by the processes running dialogflow bots
+        import dialogflow
+        from google.oauth2.service_account import Credentials
         credentials = Credentials.from_service_account_info(self.service_account)
         self.session_client = dialogflow.SessionsClient(credentials=credentials)
         
@@ -51,6 +51,8 @@ class DialogFlow(ChatbotEngine):
         """
         
         super().get_response(request)
+        import dialogflow
+        from google.protobuf.json_format import MessageToDict
 
         self.platform = self.get_platform()
 
@@ -1,12 +1,16 @@
 """BBot engine based on DirectLine API."""
 import logging
 import copy
-import requests
+from bbot.http_client import HTTPClient
 import json
-from bbot.core import BBotCore, ChatbotEngine, ChatbotEngineError, BBotLoggerAdapter, BBotException
+from bbot.core import BBotCore, ChatbotEngine, ChatbotEngineError, BBotLoggerAdapter, BBotException, VolleyState
 
 
 class DirectLine(ChatbotEngine):
+
+    # DirectLine session of the volley user
+    conversation_id = VolleyState(None)
+    watermark = VolleyState(None)
     
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
@@ -17,9 +21,8 @@ class DirectLine(ChatbotEngine):
         super().__init__(config, dotbot)
 
         self.dotdb = None
+        self.http_client = HTTPClient.get_default()
 
-        self.conversation_id = None
-        self.watermark = None
         self.direct_line_secret = self.dotbot.chatbot_engine['secret']
         self.base_url = self.dotbot.chatbot_engine.get('url') or 'https://directline.botframework.com/v3/directline'
 
@@ -40,6 +43,8 @@ class DirectLine(ChatbotEngine):
         """
         super().get_response(request)
 
+        self.conversation_id = None
+        self.watermark = None
         self.init_session()
         self.directline_send_message(request['input']['text'])
         response = self.directline_get_message()
@@ -81,7 +86,7 @@ class DirectLine(ChatbotEngine):
     def directline_get_new_conversation_id(self):        
         url = self.base_url + '/conversations'
         self.logger.debug('DirectLine requesting new conversation id')
-        response = requests.post(url, headers=self.directline_get_headers())        
+        response = self.http_client.post(url, headers=self.directline_get_headers())        
         self.logger.debug('DirectLine response: ' + response.text)
         if response.status_code == 201 or response.status_code == 200:
             jsonresponse = response.json()
@@ -99,7 +104,7 @@ class DirectLine(ChatbotEngine):
         }        
         self.logger.debug('DirectLine sending message with payload: ' +  str(payload))
         self.logger.debug('url: ' + url)
-        response = requests.post(url, headers=self.directline_get_headers(), data=json.dumps(payload))
+        response = self.http_client.post(url, headers=self.directline_get_headers(), data=json.dumps(payload))
         self.logger.debug('DirectLine response: ' + response.text)
         if response.status_code == 200:            
             return response.json()
@@ -112,7 +117,7 @@ class DirectLine(ChatbotEngine):
         payload = {'conversationId': self.conversation_id}
         self.logger.debug('DirectLine getting message with payload: ' + str(payload))
         self.logger.debug('url: ' + url)
-        response = requests.get(url, headers=self.directline_get_headers(), json=payload)
+        response = self.http_client.get(url, headers=self.directline_get_headers(), json=payload)
         self.logger.debug('DirectLine response: ' + response.text)
         if response.status_code == 200:
             # store watermark
@@ -0,0 +1,95 @@
+"""In-memory index of DotFlow2 nodes."""
+import threading
+from collections import OrderedDict
+
+
+class DotFlow2BotIndex():
+    """
+    Compiled index of all the nodes of a bot.
+    It's built once per bot version and kept in process memory so node lookups don't need database round trips.
+    Up to max_indexes bots are kept. Least recently used ones are evicted and compiled again on next use.
+    """
+
+    indexes = OrderedDict()  # compiled indexes cache by bot id
+    max_indexes = 1000
+    lock = threading.Lock()
+    evictions = 0
+
+    def __init__(self, bot_id: str, version, nodes: list) -> None:
+        """
+        Compiles the index.
+
+        :param bot_id: DotBot ID
+        :param version: Bot version (updatedAt from greenhouse_dotbots)
+        :param nodes: List of all bot nodes in the same order they are stored in the repository
+        """
+        self.bot_id = bot_id
+        self.version = version
+        self.nodes_by_id = {}       # node id -> node
+        self.nodes = nodes          # all nodes
+        self.nodes_by_context = {}  # context -> ordered node list
+
+        for n in nodes:
+            self.nodes_by_id.setdefault(n.get('id'), n)  # first one wins, same as the repository lookup
+
+            contexts = n.get('context') or []
+            if isinstance(contexts, str):
+                contexts = [contexts]
+            for c in contexts:
+                self.nodes_by_context.setdefault(c, []).append(n)
+
+    def get_node_by_id(self, node_id: str) -> dict:
+        """
+        Returns a node by its id.
+
+        :param node_id: Node ID
+        :return: Node or None if not found
+        """
+        return self.nodes_by_id.get(node_id)
+
+    def get_nodes_by_context(self, context: str) -> list:
+        """
+        Returns all nodes tagged with the context
+
+        :param context: Context
+        :return: Nodes list
+        """
+        return self.nodes_by_context.get(context, [])
+
+    @staticmethod
+    def get_index(dotdb, bot_id: str, version):
+        """
+        Returns the compiled index of the bot. It's rebuilt only when the bot version changes.
+
+        :param dotdb: DotBot repository
+        :param bot_id: DotBot ID
+        :param version: Bot version (updatedAt from greenhouse_dotbots)
+        :return: DotFlow2BotIndex instance
+        """
+        index = DotFlow2BotIndex.indexes.get(bot_id)
+        if index is not None and index.version == version:
+            with DotFlow2BotIndex.lock:
+                if bot_id in DotFlow2BotIndex.indexes:
+                    DotFlow2BotIndex.indexes.move_to_end(bot_id)
+            return index
+
+        with DotFlow2BotIndex.lock:
+            index = DotFlow2BotIndex.indexes.get(bot_id)
+            if index is None or index.version != version:
+                index = DotFlow2BotIndex(bot_id, version, dotdb.find_nodes_by_dotbot_id(bot_id))
+                DotFlow2BotIndex.indexes[bot_id] = index
+            DotFlow2BotIndex.indexes.move_to_end(bot_id)
+            while len(DotFlow2BotIndex.indexes) > DotFlow2BotIndex.max_indexes:
+                DotFlow2BotIndex.indexes.popitem(last=False)
+                DotFlow2BotIndex.evictions += 1
+        return index
+
+    @staticmethod
+    def invalidate(bot_id: str):
+        """
+        Removes the compiled index of the bot from memory
+
+        :param bot_id: DotBot ID
+        """
+        with DotFlow2BotIndex.lock:
+            DotFlow2BotIndex.indexes.pop(bot_id, None)
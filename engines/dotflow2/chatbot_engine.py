@@ -3,7 +3,10 @@ import logging
 import datetime
 import re
 import smokesignal
-from bbot.core import BBotCore, ChatbotEngine, BBotLoggerAdapter,BBotExtensionException
+from bbot.core import BBotCore, BBotCoreHalt, ChatbotEngine, BBotLoggerAdapter,BBotExtensionException, VolleyState
+from bbot.extensions_cache import ExtensionsCache
+from engines.dotflow2.bot_index import DotFlow2BotIndex
+from engines.dotflow2.compiler import DotFlow2Compiler
 
 
 class DotFlow2(ChatbotEngine):
@@ -11,6 +14,12 @@ class DotFlow2(ChatbotEngine):
 
     DOTFLOW2_FUNCTION_PREFIX = '_'  # This should be $, but mongodb does not allow us to use it even using server 4.0
 
+    # Volley data from the DotFlow2 VM
+    debug = VolleyState(dict)
+    nested_level_exec = VolleyState(0)
+    detected_entities = VolleyState(dict)
+    executed_functions = VolleyState(list)
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
         Initialize the plugin.
@@ -32,14 +41,9 @@ class DotFlow2(ChatbotEngine):
         self.logger_level = ''          # Logging level for the module
 
         self.functions_map = {}    # Registered df2 functions        
+        self.compiler = DotFlow2Compiler(self)  # Compiled conditions and responses
+        self.bot_index = None                   # Bot index the compiled objects belong to
 
-        #
-        
-        self.debug = {}  # This holds debug data from the DotFlow2 VM
-        self.nested_level_exec = 0
-        self.detected_entities = {}
-        self.executed_functions = []
-        
 
     def init(self, core: BBotCore):
         """
@@ -71,7 +75,22 @@ class DotFlow2(ChatbotEngine):
         :param callback: callable array class/method of plugin method
         """
         #self.logger_df2.debug('Registering dotflow2 function ' + function_name)
+        fmap = self.functions_map.get(function_name)
+        if fmap is not None and fmap.get('lazy'):  # lazy plugin loaded. Entry is updated in place as it's already bound
+            fmap.update(callback)
+            fmap['lazy'] = False
+            return
         self.functions_map[function_name] = callback
+        self.reset_compiled()
+
+    def reset_compiled(self):
+        """
+        Drops compiled conditions and responses. They will be compiled again on next volley.
+        """
+        self.compiler.reset()
+        self.bot_index = None
+        if self.core:
+            self.core.bbot.reset_functions_map()
     
     def get_response(self, request: dict) -> dict:
         """
@@ -91,13 +110,44 @@ class DotFlow2(ChatbotEngine):
             'request': self.request
         }
 
+        # user session changes are stored at once at the end of the volley
+        self.session.begin(self.user_id)
+        try:
+            self.run_volley(request)
+        except BBotCoreHalt:  # soft halt. keep changes made until now
+            self.session.commit()
+            raise
+        except Exception:     # failed volley shouldn't leave user session half updated
+            self.session.rollback()
+            raise
+        self.session.commit()
+
+        # Add more debug not from the engine butnot from the flow
+        self.response['detectedEntities'] = self.detected_entities
+        self.response['debug']['executedFunctions'] = self.executed_functions
+
+        # look for time consming functions
+        #executed_functions_response_time_sort = sorted(self.executed_functions, key=lambda x: x['responseTime'], reverse=True)
+        #executed_functions_expensive = list(filter(lambda x: x['responseTime'] > 0, executed_functions_response_time_sort))
+
+        # returning response
+        self.logger.debug("DotFlow2 response: %s", self.response)
+
+        return self.response
+
+    def run_volley(self, request: dict):
+        """
+        Runs the bot flow for the request. It runs engine commands or looks for a matching path and runs its responses
+
+        :param request: A dictionary with input data.
+        """
         # first check if it's a command
         if self.is_command(request.get('input', {}).get('text')):
             self.response['output'].append({'text': self.execute_command(request['input']['text'])})
         else:
             # get current contexts
             n_curr_context = self.get_current_contexts()
-            self.logger.info('Current contexts: ' + str(n_curr_context))
+            self.logger.info('Current contexts: %s', n_curr_context)
 
             # looks for matching paths for the current contexts
             m_path = self.get_matching_paths(n_curr_context)  # @TODO will be more flexible if it accepts node list instead context list (but it will force to load all nodes even if there is no match on the first ones)
@@ -122,19 +172,6 @@ class DotFlow2(ChatbotEngine):
             self.response['contexts'] = n_curr_context
             self.response['matchingPathName'] = m_path['name'] if type(m_path) is dict else None
 
-        # Add more debug not from the engine butnot from the flow
-        self.response['detectedEntities'] = self.detected_entities
-        self.response['debug']['executedFunctions'] = self.executed_functions
-
-        # look for time consming functions
-        #executed_functions_response_time_sort = sorted(self.executed_functions, key=lambda x: x['responseTime'], reverse=True)
-        #executed_functions_expensive = list(filter(lambda x: x['responseTime'] > 0, executed_functions_response_time_sort))
-
-        # returning response
-        self.logger.debug("DotFlow2 response: " + str(self.response))
-
-        return self.response
-
     def get_nodes_by_context(self, context: str) -> list:
         """
         @TODO we should separate fu context from custom context so we dont need to query for both each time when we know what kind of context we are looking for
@@ -142,22 +179,37 @@ class DotFlow2(ChatbotEngine):
 
         :return: Nodes list
         """
-        self.logger.info('Looking for nodes with context "' + context + '"')
+        self.logger.info('Looking for nodes with context "%s"', context)
 
-        fu_context_node = self.dotdb.find_node_by_id(self.dotbot['id'], context)  # Follow-up context are referred by node id
+        bot_index = self.get_bot_index()
+
+        fu_context_node = bot_index.get_node_by_id(context)  # Follow-up context are referred by node id
         if fu_context_node:
             fu_context_node = [fu_context_node]
         else:
             fu_context_node = []
 
-        self.logger.info('Got ' + str(len(fu_context_node)) + ' follow-up context node')
+        self.logger.info('Got %s follow-up context node', len(fu_context_node))
 
-        custom_contexts_nodes = self.dotdb.find_dotflows_by_context(self.bot_id, context)
-        self.logger.info('Got ' + str(len(custom_contexts_nodes)) + ' custom context nodes')
+        custom_contexts_nodes = bot_index.get_nodes_by_context(context)
+        self.logger.info('Got %s custom context nodes', len(custom_contexts_nodes))
 
         contexts_nodes = fu_context_node + custom_contexts_nodes
         return contexts_nodes
 
+    def get_bot_index(self) -> DotFlow2BotIndex:
+        """
+        Returns the in-memory index of the bot nodes. It's compiled once per bot version.
+
+        :return: DotFlow2BotIndex instance
+        """
+        bot_index = DotFlow2BotIndex.get_index(self.dotdb, self.bot_id, getattr(self.dotbot, 'updated_at', None))
+        if bot_index is not self.bot_index:  # new bot version. compile all conditions and responses again
+            self.compiler.reset()
+            self.compiler.compile_nodes(bot_index.nodes)
+            self.bot_index = bot_index
+        return bot_index
+
     def get_current_contexts(self) -> list:
         """
         Returns current contexts.
@@ -197,7 +249,7 @@ class DotFlow2(ChatbotEngine):
         :param context:
         :return:
         """
-        self.logger.info('Setting follow-up context to "' + context + '"')
+        self.logger.info('Setting follow-up context to "%s"', context)
         self.session.set(self.user_id, 'context_current_followup', context)  # @TODO followup context should expire?
 
     def get_followup_context(self) -> str:
@@ -225,17 +277,17 @@ class DotFlow2(ChatbotEngine):
         matching_path = None
         matching_node = None
         for c in contexts:
-            self.logger.info('Looking for context "' + c + '"')
+            self.logger.info('Looking for context "%s"', c)
             nodes = self.get_nodes_by_context(c)
             for n in nodes:
-                self.logger.info('Loading context node "' + n['id'] + '"')
+                self.logger.info('Loading context node "%s"', n['id'])
                 for p in n['paths']:
-                    self.logger.info('Loading node path "' + p['id'] + '"')
+                    self.logger.info('Loading node path "%s"', p['id'])
                     result = self.resolve_conditions(p.get('conditions'))
 
-                    self.logger.info('CONDITIONS RESULT: ' + str(result))
+                    self.logger.info('CONDITIONS RESULT: %s', result)
                     if result is True:
-                        self.logger.info('>>>>>>> Found a matching path: ' + p['id'] + ' from node: ' + n['id'])
+                        self.logger.info('>>>>>>> Found a matching path: %s from node: %s', p['id'], n['id'])
                         matching_node = n
                         return p  # @TODO this stops when match is found. We will change thi when implementing ML matching instruction based on confidence score
 
@@ -253,9 +305,9 @@ class DotFlow2(ChatbotEngine):
             result = True
         else:
             self.logger.info(
-                '@@@@@@@@@@@@@@ Trying to execute conditions object: ' + str(conditions_expression) + ' @@@@@@@@@@@@@')
+                '@@@@@@@@@@@@@@ Trying to execute conditions object: %s @@@@@@@@@@@@@', conditions_expression)
             result = self.execute_function(conditions_expression, 'C')
-            self.logger.debug('Response object: ' + str(result))
+            self.logger.debug('Response object: %s', result)
 
         return result
 
@@ -265,15 +317,17 @@ class DotFlow2(ChatbotEngine):
 
         :param path: Path
         """
-        self.logger.info('########## Trying to execute response path "' + path['name'] + '" ##############')
+        self.logger.info('########## Trying to execute response path "%s" ##############', path['name'])
 
         # Get current follow-up context to check if it changed during the responses execution
         old_fu_context = self.get_followup_context()
 
         responses = path.get('responses')
         if responses:
+            # independent calls to remote services run concurrently
+            self.core.bbot.prefetch(self.compiler.get_calls(responses))
             for r in responses:
-                self.logger.info('Trying to execute response object: ' + str(r))
+                self.logger.info('Trying to execute response object: %s', r)
                 self.execute_function(r, 'R')  # output functions will send content to the output directly
 
         curr_fu_context = self.get_followup_context()
@@ -292,17 +346,14 @@ class DotFlow2(ChatbotEngine):
         :param dotflow2_obj:
         :return:
         """
-        self.nested_level_exec += 1
-        self.logger.debug('Trying to execute object: ' + str(dotflow2_obj))
+        self.logger.debug('Trying to execute object: %s', dotflow2_obj)
 
-        func_name = self.get_func_name_from_dotflow2_obj(dotflow2_obj)
-        args = self.get_args_from_dotflow2_obj(dotflow2_obj)
-        if type(args) is not list:
-            args = [args]
-        response = self.call_dotflow2_function(func_name, args, f_type)
-        self.logger.debug('Object response: ' + str(response))
+        function = self.compiler.get(dotflow2_obj)
+        if function is None:  # not part of the bot nodes. compile it without caching
+            function = self.compiler.compile(dotflow2_obj, False)
+        response = function(f_type)
+        self.logger.debug('Object response: %s', response)
 
-        self.nested_level_exec -= 1
         return response
 
     def call_dotflow2_function(self, func_name, args, f_type):
@@ -316,16 +367,10 @@ class DotFlow2(ChatbotEngine):
         :param value:
         :return:
         """
-        try:
-            if type(value) is dict:  # function should be defined in a dict
-                obj_keys = list(value.keys())
-                if len(obj_keys) == 1:  # function should be the only attr of the object
-                    if len(obj_keys[0]) >= 2:  # function should have at least one more char plus sign $
-                        if obj_keys[0][:1] == self.DOTFLOW2_FUNCTION_PREFIX:  # function should start with a sign $
-                            return True
-            return False
-        except Exception as e:
-            return False
+        if type(value) is dict and len(value) == 1:  # function should be defined in a dict and be the only attr of the object
+            key = next(iter(value))
+            # function should start with a sign $ and have at least one more char
+            return type(key) is str and len(key) >= 2 and key[0] == self.DOTFLOW2_FUNCTION_PREFIX
         return False
 
     def get_func_name_from_dotflow2_obj(self, bbot_obj: dict) -> str:
@@ -336,7 +381,7 @@ class DotFlow2(ChatbotEngine):
         :return: DotFlow2 function name
         """
 
-        return list(bbot_obj.keys())[0][1:]
+        return next(iter(bbot_obj))[1:]
 
     def get_args_from_dotflow2_obj(self, bbot_obj: dict):
         """
@@ -344,7 +389,7 @@ class DotFlow2(ChatbotEngine):
         :param bbot_obj:
         :return:
         """
-        return bbot_obj[self.DOTFLOW2_FUNCTION_PREFIX + self.get_func_name_from_dotflow2_obj(bbot_obj)]
+        return next(iter(bbot_obj.values()))
 
     
     def resolve_arg(self, arg, f_type, render: bool=False):
@@ -353,9 +398,14 @@ class DotFlow2(ChatbotEngine):
         :param arg:
         :return:
         """
-        self.logger.debug('Will try to resolve arg: ' + str(arg))
+        self.logger.debug('Will try to resolve arg: %s', arg)
 
-        if self.is_dotflow2_function(arg):
+        function = self.compiler.get(arg)
+        if function is not None:
+            self.logger.debug('The object is a compiled DotFlow2 function. Will try to execute it.')
+            resolved_arg = function(f_type)
+
+        elif self.is_dotflow2_function(arg):
             self.logger.debug('The object is DotFlow2 function. Will try to execute it.')
             resolved_arg = self.execute_function(arg, f_type, render)
 
@@ -363,12 +413,12 @@ class DotFlow2(ChatbotEngine):
             self.logger.debug('The object is a value')
             resolved_arg = arg
 
-        self.logger.debug('Got resolved arg (no rendered): ' + str(resolved_arg))
+        self.logger.debug('Got resolved arg (no rendered): %s', resolved_arg)
 
         if render is True and type(resolved_arg) is str:
             self.logger.debug('The running instruction asked to render this value')                        
             resolved_arg = self.template_engine.render(resolved_arg)
-            self.logger.debug('Got resolved arg (rendered): ' + str(resolved_arg))
+            self.logger.debug('Got resolved arg (rendered): %s', resolved_arg)
 
         return resolved_arg
 
@@ -391,7 +441,7 @@ class DotFlow2(ChatbotEngine):
         #@TODO refactor all this code
         command = command[1:]  # get rid of colon prefix
         response = 'Unknown command. Try :help'
-        self.logger.info(f"Executing command {command}")
+        self.logger.info("Executing command %s", command)
 
         # :df2 dotflow2function(arg1,arg2,arg3...)
         if command.startswith('df2 '):
@@ -418,23 +468,14 @@ class DotFlow2(ChatbotEngine):
 
     def extensions_cache(func):
         """
-        Decorator to apply cache to extensions
-        @TODO add ttl 5min
+        Decorator to apply cache to extensions. Values expire after the function cache_ttl set in the functions map (or the cache ttl)
+        Arguments are resolved first so the key depends on their values (ie: the city in a variable), not on the expressions
         """
         def function_wrapper(self, args, f_type):
-            # key = botid_methodname_arg0_arg1_arg2
-            # adds args only if they are string, integer or boolean (avoiding nonhashagle values [even in nested values])
-            key = self.bot.bot_id + "_" + func.__name__
-            for arg in args:
-                if isinstance(arg, (str, int, bool)):
-                    key += "_" + str(arg)
-            cached = self.bot.cache.get(key)
-            if cached is None:
-                value = func(self, args, f_type)
-                self.bot.cache.set(key, value)
-                return value
-            else:
-                return cached
+            args = [self.bot.resolve_arg(arg, f_type) for arg in args]
+            key = ExtensionsCache.get_key(self.bot.bot_id, func.__name__, args)
+            fmap = self.bot.core.bbot.get_functions_map().get(func.__name__)
+            return ExtensionsCache.call(self.bot.cache, key, lambda: func(self, args, f_type), fmap)
 
         return function_wrapper
 
@@ -449,13 +490,8 @@ class DotFlow2LoggerAdapter(BBotLoggerAdapter):
         msg, kwargs = super().process(msg, kwargs)
 
         # get prefix based on nesting level of Dotflow2 functions
-        prefix = ''
-        try:
-            prefix = '====' * self.bot.nested_level_exec
-            if self.bot.nested_level_exec:
-                prefix = prefix + ' '
-        except:
-            pass
+        nested_level_exec = getattr(self.bot, 'nested_level_exec', 0)
+        prefix = '====' * nested_level_exec + ' ' if nested_level_exec else ''
 
         if self.mod_name:
             prefix = prefix + ' ' + self.mod_name + ': '
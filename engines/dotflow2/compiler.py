@@ -0,0 +1,174 @@
+"""DotFlow2 conditions and responses compiler."""
+import re
+import ast
+from bbot.core import BBotException
+
+
+class DotFlow2Compiler():
+    """
+    Compiles DotFlow2 objects into closures with the function name, arguments and function map entry pre-resolved.
+    Compiled objects are cached by object identity so the engine only walks closures while running a bot.
+    """
+
+    TEMPLATE_CALL_RE = re.compile(r'\$(\w+)\(([^()$]*)\)')  # function calls in templates. ie: $weather('Paris')
+
+    def __init__(self, bot) -> None:
+        """
+        Initialize the compiler.
+
+        :param bot: DotFlow2 engine
+        """
+        self.bot = bot
+        self.compiled = {}  # id(dotflow2 obj) -> (dotflow2 obj, compiled function)
+        self.calls = {}     # id(responses) -> (responses, function calls with constant args)
+
+    def reset(self):
+        """
+        Drops all compiled objects (needed when the bot nodes or the functions map change)
+        """
+        self.compiled = {}
+        self.calls = {}
+
+    def get(self, dotflow2_obj):
+        """
+        Returns the compiled function of a DotFlow2 object if it was already compiled
+
+        :param dotflow2_obj: DotFlow2 object
+        :return: Compiled function or None
+        """
+        entry = self.compiled.get(id(dotflow2_obj))
+        if entry is not None and entry[0] is dotflow2_obj:
+            return entry[1]
+        return None
+
+    def compile_nodes(self, nodes: list):
+        """
+        Compiles conditions and responses of all paths in the nodes
+
+        :param nodes: Nodes list
+        """
+        for n in nodes:
+            for p in n.get('paths', []):
+                conditions = p.get('conditions')
+                if self.bot.is_dotflow2_function(conditions):
+                    self.compile(conditions)
+                for r in p.get('responses') or []:
+                    if self.bot.is_dotflow2_function(r):
+                        self.compile(r)
+
+    def compile(self, dotflow2_obj: dict, store: bool=True):
+        """
+        Compiles a DotFlow2 function object and all DotFlow2 functions found in its arguments
+
+        :param dotflow2_obj: DotFlow2 function object
+        :param store: Keep the compiled function in the cache. Objects which are not part of the bot should not be stored
+        :return: Compiled function. Call it with the function type to run it
+        """
+        function = self.get(dotflow2_obj)
+        if function is not None:
+            return function
+
+        func_name = self.bot.get_func_name_from_dotflow2_obj(dotflow2_obj)
+        args = self.bot.get_args_from_dotflow2_obj(dotflow2_obj)
+        if type(args) is not list:
+            args = [args]
+
+        for arg in args:  # nested functions are resolved lazily by the called function through resolve_arg
+            if self.bot.is_dotflow2_function(arg):
+                self.compile(arg, store)
+
+        function = self._build_function(func_name, args)
+        if store:
+            self.compiled[id(dotflow2_obj)] = (dotflow2_obj, function)
+        return function
+
+    def _build_function(self, func_name: str, args: list):
+        """
+        Returns the closure running the DotFlow2 function
+
+        :param func_name: DotFlow2 function name
+        :param args: Function arguments
+        :return: Closure
+        """
+        bot = self.bot
+        functions_proxy = bot.core.bbot
+        fmap = functions_proxy.get_functions_map().get(func_name)
+
+        if fmap is None:
+            def function(f_type: str):
+                err_msg = 'Tried to run function "' + func_name + '" but it\'s not registered'
+                bot.core.logger.debug(err_msg)
+                raise BBotException(err_msg)
+            return function
+
+        call_function = functions_proxy.call_function
+
+        def function(f_type: str):
+            bot.nested_level_exec += 1
+            response = call_function(func_name, args, f_type, fmap)
+            bot.nested_level_exec -= 1
+            return response
+
+        return function
+
+    def get_calls(self, responses: list) -> list:
+        """
+        Returns function calls with constant arguments found in the responses, including nested ones and calls in templates.
+        Their arguments don't depend on the volley so they can run before the engine reaches them
+
+        :param responses: Path responses
+        :return: List of (function name, args list, f_type)
+        """
+        entry = self.calls.get(id(responses))
+        if entry is not None and entry[0] is responses:
+            return entry[1]
+
+        calls = []
+        for r in responses:
+            self._find_calls(r, calls)
+        self.calls[id(responses)] = (responses, calls)
+        return calls
+
+    def _find_calls(self, value, calls: list):
+        """
+        Adds function calls with constant arguments found in the value
+
+        :param value: DotFlow2 object, template or value
+        :param calls: List where calls are added
+        """
+        if self.bot.is_dotflow2_function(value):
+            args = self.bot.get_args_from_dotflow2_obj(value)
+            if type(args) is not list:
+                args = [args]
+            if all(self._is_constant(arg) for arg in args):
+                calls.append((self.bot.get_func_name_from_dotflow2_obj(value), args, 'R'))
+            for arg in args:
+                self._find_calls(arg, calls)
+        elif type(value) is list:
+            for v in value:
+                self._find_calls(v, calls)
+        elif type(value) is dict:
+            for v in value.values():
+                self._find_calls(v, calls)
+        elif type(value) is str and '$' in value:
+            for func_name, args in self.TEMPLATE_CALL_RE.findall(value):
+                try:
+                    args = list(ast.literal_eval('(' + args + ',)')) if args.strip() else []
+                except (ValueError, SyntaxError):  # variables or expressions as arguments
+                    continue
+                calls.append((func_name, args, 'R'))
+
+    def _is_constant(self, value) -> bool:
+        """
+        Returns True if the value doesn't have functions, templates or variables
+
+        :param value: Value
+        :return: bool
+        """
+        if type(value) is str:
+            return '$' not in value and '{{' not in value and '{%' not in value
+        if type(value) is list:
+            return all(self._is_constant(v) for v in value)
+        if type(value) is dict:
+            return not self.bot.is_dotflow2_function(value) and all(self._is_constant(v) for v in value.values())
+        return True
@@ -137,13 +137,13 @@ class DotFlow2CoreFunctions():
         if type(code) is not str:
             raise BBotException({'code': 131, 'function': 'code', 'arg': 0, 'message': 'Argument 0 should be string'})
 
-        self.logger.debug('$code: Running python code: "' + code + "'...")
+        self.logger.debug('$code: Running python code: "%s"...', code)
 
         codeblock = self._get_codeblock(code, f_type)
-        self.logger.debug('$code: Running template code block: "' + codeblock + "'...")
+        self.logger.debug('$code: Running template code block: "%s"...', codeblock)
         response = self.bot.template_engine.render(codeblock)
         response = self._get_boolean(response, f_type)
-        self.logger.debug('$code: Returning: ' + str(response))
+        self.logger.debug('$code: Returning: %s', response)
         return response
 
     def _get_codeblock(self, code: str, f_type: str):
@@ -362,9 +362,9 @@ class DotFlow2CoreFunctions():
                 if var_value is not None:
                     self.bot.session.set_var(self.bot.user_id, var_name, var_value)
                     self.bot.detected_entities[var_name] = var_value
-                    self.logger.debug('$regexMatch: Storing named group "' + var_name + '" with value "' + var_value + '"')
+                    self.logger.debug('$regexMatch: Storing named group "%s" with value "%s"', var_name, var_value)
                 else:
-                    self.logger.debug('$regexMatch: Named group "' + var_name + '" not found.')
+                    self.logger.debug('$regexMatch: Named group "%s" not found.', var_name)
 
             return True
         else:
@@ -8,6 +8,10 @@ from engines.dotflow2.chatbot_engine import DotFlow2LoggerAdapter
 class DotFlow2ChatScriptMatch():
     """ChatScript DotFlow2 function"""
 
+    # Functions registered by the plugin. Read before it's loaded when it's lazy (see LazyPlugin)
+    REGISTER_METHOD = 'register_dotflow2_function'
+    FUNCTIONS = {'chatscriptMatch': {'method': 'chatscriptMatch', 'cost': 0, 'register_enabled': False}}
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
         Initialize class
@@ -32,7 +36,8 @@ class DotFlow2ChatScriptMatch():
         """
         self.bot = bot
         self.logger = DotFlow2LoggerAdapter(logging.getLogger('df2_ext.csMatch'), self, self.bot, '$chatscriptMatch')
-        bot.register_dotflow2_function('chatscriptMatch', {'object': self, 'method': 'chatscriptMatch', 'cost': 0, 'register_enabled': False})
+        for function_name, fmap in DotFlow2ChatScriptMatch.FUNCTIONS.items():
+            bot.register_dotflow2_function(function_name, {**fmap, 'object': self})
         
     def chatscriptMatch(self, args, f_type):
         """
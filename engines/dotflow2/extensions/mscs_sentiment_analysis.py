@@ -1,5 +1,5 @@
 
-import requests
+from bbot.http_client import HTTPClient
 import logging
 from bbot.core import ChatbotEngine, BBotException, BBotCore, BBotExtensionException
 from engines.dotflow2.chatbot_engine import DotFlow2LoggerAdapter
@@ -8,6 +8,11 @@ from engines.dotflow2.chatbot_engine import DotFlow2LoggerAdapter
 class DotFlow2MSCSSentimentAnalysis():
     """ChatScript DotFlow2 function"""
 
+    # Functions registered by the plugin. Read before it's loaded when it's lazy (see LazyPlugin)
+    REGISTER_METHOD = 'register_dotflow2_function'
+    FUNCTIONS = {'simpleSentimentAnalysis': {'method': 'df2_simpleSentimentAnalysis', 'cost': 0.5, 'register_enabled': True,
+                                             'prefetchable': True}}
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """
         Initialize class
@@ -21,6 +26,7 @@ class DotFlow2MSCSSentimentAnalysis():
         self.azure_location = ''
         self.azure_subscription_key = ''
         self.logger_level = ''
+        self.http_client = HTTPClient.get_default()
 
     def init(self, bot: ChatbotEngine):
         """
@@ -31,7 +37,8 @@ class DotFlow2MSCSSentimentAnalysis():
         """
         self.bot = bot
         self.logger = DotFlow2LoggerAdapter(logging.getLogger('df2_ext.ssent_an'), self, self.bot, '$simpleSentimentAnalysis')
-        bot.register_dotflow2_function('simpleSentimentAnalysis', {'object': self, 'method': 'df2_simpleSentimentAnalysis', 'cost': 0.5, 'register_enabled': True})
+        for function_name, fmap in DotFlow2MSCSSentimentAnalysis.FUNCTIONS.items():
+            bot.register_dotflow2_function(function_name, {**fmap, 'object': self})
         
     def df2_simpleSentimentAnalysis(self, args, f_type):
         """
@@ -63,7 +70,7 @@ class DotFlow2MSCSSentimentAnalysis():
 
         self.logger.debug('Requesting sentiment analysis score to Microsoft Cognitive Services...')
     
-        r = requests.post(
+        r = self.http_client.post(
             f'https://{self.azure_location}.api.cognitive.microsoft.com/text/analytics/v2.0/sentiment',
             json=payload, headers=headers)
         response = r.json()
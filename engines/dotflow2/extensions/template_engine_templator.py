@@ -3,6 +3,7 @@ import logging
 from web.template import *
 from bbot.core import TemplateEngine, ChatbotEngine
 from engines.dotflow2.chatbot_engine import DotFlow2LoggerAdapter
+from bbot.template_cache import templator_cache
 
 
 class TemplateEngineTemplator():
@@ -16,6 +17,7 @@ class TemplateEngineTemplator():
         self.dotbot = dotbot
 
         self.logger_level = ''
+        self.cache_max_size = 0     # Size of compiled templates cache. 0 to use default size
 
         self.bot = None
         self.logger = None
@@ -28,32 +30,22 @@ class TemplateEngineTemplator():
         """
         self.bot = bot
         self.logger = DotFlow2LoggerAdapter(logging.getLogger('df2_ext.template_e'), self, self.bot, 'Templetor')
+        if self.cache_max_size:
+            templator_cache.set_max_size(self.cache_max_size)
 
     def get_functions(self):
         """
-        Adds custom functions to template @TODO this should be initialized just once at runtime, not at every render!!
+        Returns template custom functions from bbot and dotflow2. The namespace is built once by the core
 
         :return:
         """
-        # get functions from bbot
-        c_functions = {}
-        for f_name in self.bot.core.functions_map:  # register template functions from extensions
-            #self.logger.debug('Adding template custom function "' + f_name + '"')
-            c_functions[f_name] = getattr(self.bot.core.bbot, f_name)
-        
-        # get functions from dotflow2        
-        for f_name in self.bot.functions_map:  # register template functions from extensions
-            #self.logger.debug('Adding template custom function "' + f_name + '"')
-            c_functions[f_name] = getattr(self.bot.core.bbot, f_name)
-        
-        return c_functions
-
+        return self.bot.core.bbot.get_functions_namespace()
 
     def render(self, tmpl: str) -> str:
         """
         Renders any string
         """
-        self.logger.debug('Rendering template: "' + tmpl + '"')
+        self.logger.debug('Rendering template: "%s"', tmpl)
 
         # We still need a way to know if a string is a template or not, but Templator don't need enclosing
         # So for Templator, just enclose the whole string with {{ }} for BBot to know it is a template
@@ -68,13 +60,12 @@ class TemplateEngineTemplator():
         c_functions = self.get_functions()
         t_globals = {**df2_vars, **c_functions}
 
-        templator_obj = Template(tmpl, globals=t_globals)
-        response = str(templator_obj())
+        response = templator_cache.render(tmpl, t_globals)
 
         if response[-1:] == '\n':       # Templator seems to add a trailing \n, remove it
             response = response[:-1]
 
-        self.logger.debug('Template response: "' + response + '"')
+        self.logger.debug('Template response: "%s"', response)
 
         if response.find('<function DotFlow2FunctionsProxy') is not -1:
             self.logger.warning('Templator returned an invalid response. Botdev forgot to escape $?')
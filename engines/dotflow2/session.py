@@ -41,3 +41,20 @@ class Session(Plugin, metaclass=abc.ABCMeta):
         :param key: Key to set
         :param value: Value to set
         """
+
+    def begin(self, user_id: str) -> None:
+        """
+        Start a volley for the user. Sessions supporting unit of work will load user data here.
+
+        :param user_id: User ID
+        """
+
+    def commit(self) -> None:
+        """
+        End the volley storing all changes made during it.
+        """
+
+    def rollback(self) -> None:
+        """
+        End the volley discarding all changes made during it.
+        """
@@ -3,25 +3,97 @@ import logging
 import json
 import datetime
 from typing import Any
-from pymongo import MongoClient, DeleteMany
+from pymongo import DeleteMany
+from bbot.core import VolleyState
+from bbot.mongo_registry import MongoRegistry
 from .session import Session
 
 class SessionMongoDB(Session):
     """MongoDB session."""
 
+    # Unit of work data. It's stored per thread so the session can serve concurrent volleys
+    snapshot = VolleyState(None)        # User data loaded at the start of the volley
+    snapshot_user_id = VolleyState(None)
+    in_volley = VolleyState(False)
+    pending_set = VolleyState(dict)     # Changes to be stored at the end of the volley
+    pending_push = VolleyState(dict)
+
     def __init__(self, config: dict, dotbot: dict=None) -> None:
         """Set up MongoDB."""
         super().__init__(config)
         if 'uri' not in config:
             raise RuntimeError("FATAL ERR: Missing config var uri")
 
-        uri = config["uri"]
-        self.client = MongoClient(uri)
-        parts = uri.split("/")
-        last_part = parts.pop()
-        parts = last_part.split("?")
-        self.database_name = parts[0]
-        self.user_data = self.client[self.database_name]["user_data"]
+        self.uri = config["uri"]
+        self.mongo_registry = MongoRegistry.get_default()
+        self.user_data = None
+
+        self.unit_of_work = False   # Load user data once per volley and store all changes at the end of it
+
+    def init(self, parent) -> None:
+        """Get the user data collection from the shared client."""
+        self.user_data = self.mongo_registry.get_database(self.uri)["user_data"]
+
+    def begin(self, user_id: str) -> None:
+        """
+        Start a volley for the user loading all their data.
+
+        :param user_id: User ID
+        """
+        if not self.unit_of_work:
+            return
+        self.snapshot = self.user_data.find_one({'userId': user_id}) or {'userId': user_id}
+        self.snapshot_user_id = user_id
+        self.pending_set = {}
+        self.pending_push = {}
+        self.in_volley = True
+
+    def commit(self) -> None:
+        """
+        End the volley storing all changes with a single update.
+        User data loaded is dropped: reads outside a volley go to the database as other workers may change it.
+        """
+        if not self.in_volley:
+            return
+        self.in_volley = False
+
+        update = {}
+        if self.pending_set:
+            update['$set'] = self.pending_set
+        if self.pending_push:
+            update['$push'] = {key: {'$each': values} for key, values in self.pending_push.items()}
+        self.pending_set = {}
+        self.pending_push = {}
+
+        try:
+            if update:
+                self.user_data.update_one({'userId': self.snapshot_user_id}, update, upsert=True)
+        finally:
+            self.drop_snapshot()
+
+    def rollback(self) -> None:
+        """
+        End the volley discarding all changes made during it.
+        """
+        self.in_volley = False
+        self.pending_set = {}
+        self.pending_push = {}
+        self.drop_snapshot()
+
+    def drop_snapshot(self) -> None:
+        """
+        Discards user data loaded in memory
+        """
+        self.snapshot = None
+        self.snapshot_user_id = None
+
+    def has_snapshot(self, user_id: str) -> bool:
+        """
+        Returns True if user data is loaded in memory
+
+        :param user_id: User ID
+        """
+        return self.snapshot is not None and self.snapshot_user_id == user_id
 
 
     def reset_all(self, user_id: str) -> None:
@@ -32,6 +104,10 @@ class SessionMongoDB(Session):
         """
         super().reset_all(user_id)        
         self.user_data.delete_many({'userId': user_id})
+        if self.has_snapshot(user_id):
+            self.snapshot = {'userId': user_id}
+            self.pending_set = {}
+            self.pending_push = {}
 
 
     def get(self, user_id: str, key: str) -> Any:
@@ -41,7 +117,10 @@ class SessionMongoDB(Session):
         :param user_id: User ID
         :param key: Key to retrieve
         """
-        data = self.user_data.find_one({'userId': user_id})
+        if self.has_snapshot(user_id):
+            data = self.snapshot
+        else:
+            data = self.user_data.find_one({'userId': user_id})
         if data is None:
             return ""
 
@@ -61,6 +140,11 @@ class SessionMongoDB(Session):
         :param key: Key to set
         :param value: Value to set
         """
+        if self.has_snapshot(user_id):
+            self.set_dot_notation(self.snapshot, key, value)
+            if self.in_volley:
+                self.add_pending_set(key)
+                return
         self.user_data.update_one({'userId': user_id}, {"$set": {key: value}}, upsert=True)
 
     def push(self, user_id: str, key: str, value: str):
@@ -72,8 +156,61 @@ class SessionMongoDB(Session):
         :param value:
         :return:
         """
+        if self.has_snapshot(user_id):
+            values = self.get_dot_notation(self.snapshot, key)
+            if not isinstance(values, list):
+                values = []
+                self.set_dot_notation(self.snapshot, key, values)
+            values.append(value)
+            if self.in_volley:
+                if self.get_pending_conflicts(key, self.pending_set) or self.get_pending_parent(key):
+                    self.add_pending_set(key)  # can't push and set the same path in one update. set the whole array
+                else:
+                    self.pending_push.setdefault(key, []).append(value)
+                return
         self.user_data.update_one({'userId': user_id}, {"$push": {key: value}}, upsert=True)
 
+    def add_pending_set(self, key: str) -> None:
+        """
+        Adds a pending $set with the value from the user data in memory.
+        Mongo doesn't allow to update conflicting paths in one update so the pending changes are merged.
+
+        :param key: Key in dot notation
+        """
+        for pending in (self.pending_set, self.pending_push):  # drop changes overwritten by this one
+            for k in self.get_pending_conflicts(key, pending):
+                del pending[k]
+
+        parent = self.get_pending_parent(key)
+        if parent is not None:  # a parent is already being changed. set the whole parent
+            self.pending_push.pop(parent, None)
+            key = parent
+        self.pending_set[key] = self.get_dot_notation(self.snapshot, key)
+
+    def get_pending_parent(self, key: str):
+        """
+        Returns pending change key which is parent of the specified key
+
+        :param key: Key in dot notation
+        :return: Parent key or None
+        """
+        for pending in (self.pending_set, self.pending_push):
+            for k in pending:
+                if key.startswith(k + '.'):
+                    return k
+        return None
+
+    @staticmethod
+    def get_pending_conflicts(key: str, pending: dict) -> list:
+        """
+        Returns pending change keys which are the same key or children of it
+
+        :param key: Key in dot notation
+        :param pending: Pending changes
+        :return: List of keys
+        """
+        return [k for k in pending if k == key or k.startswith(key + '.')]
+
     def set_var(self, user_id: str, key: str, value: any) -> None:
         """
         Set any user data for later use.
@@ -118,3 +255,19 @@ class SessionMongoDB(Session):
             return self.get_dot_notation(d[key], rest)
         else:
             return d.get(dotted_key, None)
+
+    def set_dot_notation(self, d: dict, dotted_key: str, value: Any) -> None:
+        """
+        Allows to set values in a dict using dot notation
+
+        :param d: Dictionary
+        :param dotted_key: Regular key or key with dot notation
+        :param value: Value to set
+        """
+        if "." in dotted_key:
+            key, rest = dotted_key.split(".", 1)
+            if not isinstance(d.get(key), dict):
+                d[key] = {}
+            self.set_dot_notation(d[key], rest, value)
+        else:
+            d[dotted_key] = value
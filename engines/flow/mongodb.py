@@ -2,8 +2,9 @@
 import logging
 import json
 from typing import Any
-from pymongo import MongoClient, DeleteMany
+from pymongo import DeleteMany
 from flow.session import Session
+from bbot.mongo_registry import MongoRegistry
 
 class MongoDB(Session):
     """MongoDB session."""
@@ -11,13 +12,13 @@ class MongoDB(Session):
     def __init__(self, config: dict) -> None:
         """Set up MongoDB."""
         super().__init__(config)
-        uri = config["uri"]
-        self.client = MongoClient(uri)
-        parts = uri.split("/")
-        last_part = parts.pop()
-        parts = last_part.split("?")
-        self.database_name = parts[0]
-        self.user_data = self.client[self.database_name]["userData"]
+        self.uri = config["uri"]
+        self.mongo_registry = MongoRegistry.get_default()
+        self.user_data = None
+
+    def init(self, parent) -> None:
+        """Get the user data collection from the shared client."""
+        self.user_data = self.mongo_registry.get_database(self.uri)["userData"]
 
 
     def reset_all(self, user_id: str) -> None:
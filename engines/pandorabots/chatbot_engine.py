@@ -1,5 +1,5 @@
 import logging
-import requests
+from bbot.http_client import HTTPClient
 from bbot.core import BBotCore, ChatbotEngine, ChatbotEngineError, BBotLoggerAdapter, BBotException
 
 class PandoraBots(ChatbotEngine):
@@ -17,6 +17,7 @@ class PandoraBots(ChatbotEngine):
 
         self.botkey = dotbot.chatbot_engine['botkey']
         self.dotdb = None
+        self.http_client = HTTPClient.get_default()
 
     def init(self, core: BBotCore):
         """
@@ -64,7 +65,7 @@ class PandoraBots(ChatbotEngine):
             'botkey': self.botkey,
             'input': input_txt,    
         }    
-        response = requests.post(self.url + '/atalk', params)
+        response = self.http_client.post(self.url + '/atalk', params)
         self.logger.debug("Response status code: " + str(response.status_code))    
         if response.status_code == 200:
             return response.json()
@@ -81,7 +82,7 @@ class PandoraBots(ChatbotEngine):
             'sessionid': sessionid,
             'client_name': client_name        
         }    
-        response = requests.post(self.url + '/talk', params)
+        response = self.http_client.post(self.url + '/talk', params)
         self.logger.debug("Response status code: " + str(response.status_code))    
         if response.status_code == 200:
             return response.json()
@@ -1,8 +1,7 @@
 """Bot engine based on Rasa Core with Rasa Server"""
 import logging
-import requests
+from bbot.http_client import HTTPClient
 import json
-import socketio
 from bbot.core import ChatbotEngine, ChatbotEngineError, BBotLoggerAdapter, Plugin, BBotCore, BBotException
 
 
@@ -17,8 +16,7 @@ class RasaServer(ChatbotEngine):
         :param config: Configuration values for the instance.
         """
         super().__init__(config, dotbot)
-
-        self.recv = []
+        self.http_client = HTTPClient.get_default()
 
     def init(self, core: BBotCore):
         """
@@ -72,7 +70,7 @@ class RasaServer(ChatbotEngine):
         server_url = self.dotbot.chatbot_engine['serverUrl']
         self.logger.debug('Querying to Rasa Server ' + server_url)
         params = {"sender": self.user_id, "message": msg}
-        r = requests.post(server_url + '/webhooks/rest/webhook', json=params)
+        r = self.http_client.post(server_url + '/webhooks/rest/webhook', json=params)
         self.logger.debug('Rasa Server response code: ' + str(r.status_code) + ' - message: ' + str(r.text)[0:300])
         if r.status_code == 200:
             aw = r.json()            
@@ -81,17 +79,18 @@ class RasaServer(ChatbotEngine):
         return aw
         
     def socketio_server(self, msg):
-        self.recv = []
+        recv = []  # local so concurrent volleys don't mix messages. socketio callbacks run on its own thread
         server_url = self.dotbot.chatbot_engine['serverUrl']
         user_message_evt = self.dotbot.chatbot_engine.get('userMessageEvt') or 'user_uttered'
         bot_message_evt = self.dotbot.chatbot_engine.get('botMessageEvt') or 'bot_uttered'
         
+        import socketio  # only socketio servers need it
         sio = socketio.Client()
         
         @sio.on(bot_message_evt)
         def on_message(data):
             self.logger.debug("Received '%s'" % data)
-            self.recv.append(data)
+            recv.append(data)
         
         @sio.on('session_confirm')
         def on_message(data):
@@ -102,6 +101,6 @@ class RasaServer(ChatbotEngine):
         sio.call('session_request', {"session_id": [self.user_id]})
         sio.call(user_message_evt, data={"message": msg,"customData":{"language":"en"},"session_id": self.user_id})              
         sio.disconnect()
-        return self.recv
+        return recv
         
 
@@ -1,6 +1,6 @@
 """Bot engine based on Wolfram Alpha Short Answers API."""
 import logging
-import requests
+from bbot.http_client import HTTPClient
 from bbot.core import ChatbotEngine, ChatbotEngineError, BBotLoggerAdapter, Plugin, BBotCore
 
 
@@ -15,6 +15,7 @@ class WolframAlphaShortAnswers(ChatbotEngine):
         :param config: Configuration values for the instance.
         """
         super().__init__(config, dotbot)
+        self.http_client = HTTPClient.get_default()
 
     def init(self, core: BBotCore):
         """
@@ -35,7 +36,7 @@ class WolframAlphaShortAnswers(ChatbotEngine):
         appid = self.dotbot.chatbot_engine['appId']
         query = self.request['input']['text']
         self.logger.debug('Querying to Wolfram Alpha Short Answers API with query: ' + query)
-        r = requests.get(f'http://api.wolframalpha.com/v1/result?appid={appid}&i={query}')
+        r = self.http_client.get(f'http://api.wolframalpha.com/v1/result?appid={appid}&i={query}')
         self.logger.debug('Wolfram Alpha Short Answers API response code: ' + str(r.status_code) + ' - message: ' + str(r.text)[0:300])
         if r.status_code == 200:
             aw = r.text
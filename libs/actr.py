@@ -1,7 +1,6 @@
 """ACTR class"""
 
 import os
-import boto3
 import hashlib
 import logging
 import hashlib                
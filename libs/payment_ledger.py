@@ -0,0 +1,360 @@
+"""Asynchronous token payments ledger"""
+import os
+import time
+import atexit
+import logging
+import datetime
+import threading
+from bson.objectid import ObjectId
+from bbot.core import BBotLoggerAdapter
+from bbot.mongo_registry import MongoRegistry
+from bbot.extensions.token_manager import TokenManagerInsufficientFundsException
+
+
+class PaymentLedger():
+    """
+    Stores token transfers in MongoDB and settles them in background.
+    Pending transfers are aggregated by (payer, payee) and settled with one wallet transfer per pair.
+    Volleys only check funds against a locally cached balance (wallet balance minus transfers not settled yet).
+    Each wallet transfer has a deterministic id sent as idempotency key. Transfers are marked settling with it before
+    calling the wallet and they are never put back to pending from then on. If the result is unknown (ie: timeout or
+    crash) they are retried with the same id only when the token manager declares idempotent_transfers (the wallet
+    applies them once). Otherwise, or after max_attempts, they are marked unreconciled for manual reconciliation.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_SETTLING = 'settling'
+    STATUS_SETTLED = 'settled'
+    STATUS_FAILED = 'failed'
+    STATUS_INSUFFICIENT_FUNDS = 'insufficientFunds'
+    STATUS_UNRECONCILED = 'unreconciled'    # result unknown and not retried. Needs manual reconciliation
+
+    workers = {}        # settlement workers by uri. All bots in the process share them
+    balances = {}       # username -> (balance, expiration datetime)
+    lock = threading.Lock()
+
+    def __init__(self, config: dict, dotbot: dict) -> None:
+        """
+        Initialize the plugin.
+        """
+        self.config = config
+        self.dotbot = dotbot
+
+        self.logger_level = ''
+
+        self.settle_interval = 10      # Seconds transfers are aggregated before being settled
+        self.batch_size = 1000         # Max transfers claimed on each settlement
+        self.balance_ttl = 60          # Seconds wallet balances are cached
+        self.claim_timeout = 300       # Seconds after which transfers claimed by a dead worker are released or reconciled
+        self.max_attempts = 5          # Failed settlements before giving up a transfer
+
+        self.mongo_registry = MongoRegistry.get_default()
+        self.ledger = None
+        self.token_manager = None
+        self.logger = BBotLoggerAdapter(logging.getLogger('ext.token_ledger'), self, self, '$ledger')
+
+    def init(self, core):
+        """
+        Initialize the connection
+        """
+        if 'mongodb_uri' not in self.config:
+            raise RuntimeError("FATAL ERR: Missing config var mongodb_uri")
+        self.ledger = self.mongo_registry.get_database(self.config['mongodb_uri']).token_ledger
+
+    def start(self, token_manager):
+        """
+        Starts the settlement worker if it's not running yet in this process
+
+        :param token_manager: Wallet used to settle transfers
+        """
+        self.token_manager = token_manager
+        uri = self.config['mongodb_uri']
+        with PaymentLedger.lock:
+            if uri in PaymentLedger.workers:
+                return
+            worker = PaymentLedgerWorker(self)
+            PaymentLedger.workers[uri] = worker
+        worker.start()
+
+    @staticmethod
+    def reset():
+        """
+        Forgets all workers and cached balances. It runs in forked children: worker threads are not copied by fork
+        so the child starts its own workers
+        """
+        for worker in PaymentLedger.workers.values():
+            atexit.unregister(worker.stop)
+        PaymentLedger.workers = {}
+        PaymentLedger.balances = {}
+        PaymentLedger.lock = threading.Lock()
+
+    def enqueue(self, payer: str, payee: str, amount: float):
+        """
+        Stores a transfer to be settled later
+
+        :param payer: Username paying
+        :param payee: Username receiving the payment
+        :param amount: Amount of tokens
+        """
+        self.logger.debug('Queueing transfer of ' + str(amount) + ' SEED from user ' + payer + ' to user ' + payee)
+        self.ledger.insert_one({
+            'payer': payer,
+            'payee': payee,
+            'amount': amount,
+            'status': PaymentLedger.STATUS_PENDING,
+            'attempts': 0,
+            'createdAt': datetime.datetime.utcnow()
+        })
+        with PaymentLedger.lock:
+            cached = PaymentLedger.balances.get(payer)
+            if cached is not None:
+                PaymentLedger.balances[payer] = (cached[0] - amount, cached[1])
+
+    def has_funds(self, username: str, amount: float) -> bool:
+        """
+        Returns True if the user has at least the amount of tokens
+
+        :param username: Username
+        :param amount: Amount of tokens
+        :return: bool
+        """
+        return self.get_balance(username) >= amount
+
+    def get_balance(self, username: str) -> float:
+        """
+        Returns user balance minus transfers not settled yet. Wallet balance is cached balance_ttl seconds
+
+        :param username: Username
+        :return: Balance
+        """
+        now = datetime.datetime.utcnow()
+        cached = PaymentLedger.balances.get(username)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        balance = self.token_manager.get_balance(username) - self.get_pending_amount(username)
+        with PaymentLedger.lock:
+            PaymentLedger.balances[username] = (balance, now + datetime.timedelta(seconds=self.balance_ttl))
+        return balance
+
+    def set_balance(self, username: str, balance: float):
+        """
+        Sets cached balance of a user
+
+        :param username: Username
+        :param balance: Balance
+        """
+        with PaymentLedger.lock:
+            PaymentLedger.balances[username] = (balance, datetime.datetime.utcnow() + datetime.timedelta(seconds=self.balance_ttl))
+
+    def get_pending_amount(self, username: str) -> float:
+        """
+        Returns amount of tokens of transfers not settled yet. Unreconciled ones are left to manual reconciliation
+
+        :param username: Username paying
+        :return: Amount of tokens
+        """
+        result = list(self.ledger.aggregate([
+            {'$match': {'payer': username, 'status': {'$in': [
+                PaymentLedger.STATUS_PENDING, PaymentLedger.STATUS_PROCESSING, PaymentLedger.STATUS_SETTLING]}}},
+            {'$group': {'_id': None, 'amount': {'$sum': '$amount'}}}
+        ]))
+        return result[0]['amount'] if result else 0
+
+    def settle(self):
+        """
+        Claims a batch of pending transfers and settles them with one wallet transfer per (payer, payee)
+        """
+        self.release_stale_claims()
+        self.reconcile()
+        claim_id = ObjectId()
+        ids = [d['_id'] for d in self.ledger.find({'status': PaymentLedger.STATUS_PENDING}, {'_id': 1}).limit(self.batch_size)]
+        if not ids:
+            return
+        # only pending transfers are claimed so concurrent workers never settle the same transfer twice
+        self.ledger.update_many(
+            {'_id': {'$in': ids}, 'status': PaymentLedger.STATUS_PENDING},
+            {'$set': {'status': PaymentLedger.STATUS_PROCESSING, 'claimId': claim_id, 'claimedAt': datetime.datetime.utcnow()}})
+        transfers = list(self.ledger.find({'claimId': claim_id}))
+
+        for (payer, payee), amount in PaymentLedger.aggregate_transfers(transfers).items():
+            transfer_id = PaymentLedger.get_transfer_id(claim_id, payer, payee)
+            # from here on the wallet might apply the transfer so it's never released
+            self.ledger.update_many(
+                {'claimId': claim_id, 'payer': payer, 'payee': payee, 'status': PaymentLedger.STATUS_PROCESSING},
+                {'$set': {'status': PaymentLedger.STATUS_SETTLING, 'transferId': transfer_id, 'settlingAt': datetime.datetime.utcnow()}})
+            self.settle_transfer(transfer_id, payer, payee, amount)
+
+    def settle_transfer(self, transfer_id: str, payer: str, payee: str, amount: float) -> bool:
+        """
+        Sends a transfer to the wallet and stores its result. Transfers are left settling if the result is unknown
+
+        :param transfer_id: Transfer id. It's the idempotency key of the wallet transfer
+        :param payer: Username paying
+        :param payee: Username receiving the payment
+        :param amount: Amount of tokens
+        :return: True if the transfer result is known
+        """
+        filters = {'transferId': transfer_id, 'status': PaymentLedger.STATUS_SETTLING}
+        try:
+            tx_id = self.token_manager.transfer(payer, payee, amount, idempotency_key=transfer_id)
+        except TokenManagerInsufficientFundsException:
+            self.logger.warning('Insufficient funds settling %s SEED from user %s to user %s', amount, payer, payee)
+            self.ledger.update_many(filters, {'$set': {'status': PaymentLedger.STATUS_INSUFFICIENT_FUNDS}})
+            self.set_balance(payer, 0)
+            return True
+        except Exception as e:
+            self.logger.error('Error settling transfer %s from user %s to user %s. It will be reconciled: %s',
+                              transfer_id, payer, payee, e)
+            return False
+        return self.store_settled(filters, tx_id)
+
+    def store_settled(self, filters: dict, tx_id: str) -> bool:
+        """
+        Marks transfers as settled. The wallet transfer is done so only this update is retried, never the transfer
+
+        :param filters: Settled transfers filters
+        :param tx_id: Wallet transaction id
+        :return: True if stored. Otherwise transfers are left settling and reconciliation stores it
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                self.ledger.update_many(filters, {'$set': {
+                    'status': PaymentLedger.STATUS_SETTLED, 'txId': tx_id, 'settledAt': datetime.datetime.utcnow()}})
+                return True
+            except Exception as e:
+                self.logger.error('Error storing settled transfer %s (attempt %s): %s', tx_id, attempt + 1, e)
+                time.sleep(0.1 * 2 ** attempt)
+        return False
+
+    def reconcile(self):
+        """
+        Retries transfers left settling for more than claim_timeout with their same transfer id, so the wallet
+        returns the transfer already applied instead of paying again. It's only safe if the token manager
+        deduplicates transfers by idempotency key. Otherwise, or after max_attempts, they are marked unreconciled
+        """
+        now = datetime.datetime.utcnow()
+        timeout = now - datetime.timedelta(seconds=self.claim_timeout)
+        stale = {}
+        for t in self.ledger.find({'status': PaymentLedger.STATUS_SETTLING, 'settlingAt': {'$lt': timeout}}):
+            stale.setdefault(t['transferId'], []).append(t)
+
+        idempotent = getattr(self.token_manager, 'idempotent_transfers', False)
+        for transfer_id, transfers in stale.items():
+            if not idempotent or transfers[0].get('attempts', 0) >= self.max_attempts:
+                self.set_unreconciled(transfer_id, transfers[0]['payer'], transfers[0]['payee'])
+                continue
+            # claimed again so concurrent workers don't retry it at the same time
+            result = self.ledger.update_many(
+                {'transferId': transfer_id, 'status': PaymentLedger.STATUS_SETTLING, 'settlingAt': {'$lt': timeout}},
+                {'$set': {'settlingAt': now}, '$inc': {'attempts': 1}})
+            if not result.modified_count:
+                continue
+            self.settle_transfer(transfer_id, transfers[0]['payer'], transfers[0]['payee'], sum(t['amount'] for t in transfers))
+
+    def set_unreconciled(self, transfer_id: str, payer: str, payee: str):
+        """
+        Marks transfers with unknown result as unreconciled. They are not retried since the wallet might have applied them
+
+        :param transfer_id: Transfer id
+        :param payer: Username paying
+        :param payee: Username receiving the payment
+        """
+        self.ledger.update_many({'transferId': transfer_id, 'status': PaymentLedger.STATUS_SETTLING},
+                                {'$set': {'status': PaymentLedger.STATUS_UNRECONCILED}})
+        self.logger.critical('Transfer %s from user %s to user %s needs manual reconciliation', transfer_id, payer, payee)
+
+    def release(self, filters: dict):
+        """
+        Puts claimed transfers back to pending or marks them as failed after max_attempts
+
+        :param filters: Claimed transfers filters
+        """
+        self.ledger.update_many({**filters, 'attempts': {'$gte': self.max_attempts - 1}}, {
+            '$set': {'status': PaymentLedger.STATUS_FAILED}, '$inc': {'attempts': 1}})
+        self.ledger.update_many({**filters, 'status': PaymentLedger.STATUS_PROCESSING}, {
+            '$set': {'status': PaymentLedger.STATUS_PENDING}, '$unset': {'claimId': ''}, '$inc': {'attempts': 1}})
+
+    def release_stale_claims(self):
+        """
+        Releases transfers claimed by workers which didn't start settling them. They were not sent to the wallet
+        """
+        timeout = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.claim_timeout)
+        self.release({'status': PaymentLedger.STATUS_PROCESSING, 'claimedAt': {'$lt': timeout}})
+
+    @staticmethod
+    def get_transfer_id(claim_id: ObjectId, payer: str, payee: str) -> str:
+        """
+        Returns the id of the wallet transfer settling a claimed (payer, payee) pair
+
+        :param claim_id: Claim id
+        :param payer: Username paying
+        :param payee: Username receiving the payment
+        :return: Transfer id
+        """
+        return str(claim_id) + ':' + payer + ':' + payee
+
+    @staticmethod
+    def aggregate_transfers(transfers: list) -> dict:
+        """
+        Sums transfers amounts by (payer, payee)
+
+        :param transfers: Transfer documents
+        :return: Dictionary with amount by (payer, payee)
+        """
+        totals = {}
+        for t in transfers:
+            key = (t['payer'], t['payee'])
+            totals[key] = totals.get(key, 0) + t['amount']
+        return totals
+
+
+class PaymentLedgerWorker():
+    """
+    Settles pending transfers every settle_interval seconds in background
+    """
+
+    def __init__(self, ledger: PaymentLedger) -> None:
+        """
+        Initialize the worker.
+
+        :param ledger: Payment ledger
+        """
+        self.ledger = ledger
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the worker thread
+        """
+        self.thread = threading.Thread(target=self.run, name='payment-ledger', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def run(self):
+        """
+        Worker thread loop
+        """
+        while not self.stopped.wait(self.ledger.settle_interval):
+            self.settle()
+
+    def settle(self):
+        """
+        Settles pending transfers logging any error so the worker keeps running
+        """
+        try:
+            self.ledger.settle()
+        except Exception as e:
+            self.ledger.logger.error('Error settling transfers: ' + str(e))
+
+    def stop(self):
+        """
+        Stops the worker. Transfers still pending are settled by next worker started
+        """
+        self.stopped.set()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=PaymentLedger.reset)
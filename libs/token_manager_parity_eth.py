@@ -6,6 +6,7 @@ from bbot.core import BBotLoggerAdapter
 class TokenManagerParityETH():
 
     web3 = None
+    idempotent_transfers = False    # transfers idempotency keys are ignored by the node
 
     def __init__(self, config: dict, dotbot: dict) -> None:
         """Initializes class"""
@@ -36,7 +37,8 @@ class TokenManagerParityETH():
 
             TokenManagerParityETH.web3 = Web3(provider)
 
-    def transfer(self, fromAddress: str, toAddress: str, amount: float, credential: str=''):
+    def transfer(self, fromAddress: str, toAddress: str, amount: float, credential: str='', idempotency_key: str=''):
+        # idempotency_key is not supported by the node. This manager is for development only
         self.connect()
         self.logger.debug('Transfering ' + str(amount) + 'ETH from ' + fromAddress + ' to ' + toAddress)
         response = TokenManagerParityETH.web3.parity.personal.sendTransaction( 
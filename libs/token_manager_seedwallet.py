@@ -2,7 +2,7 @@
 import logging
 import json
 #from requests_futures.sessions import FuturesSession
-import requests
+from bbot.http_client import HTTPClient
 from bbot.core import BBotLoggerAdapter
 from bbot.extensions.token_manager import TokenManagerInsufficientFundsException
 
@@ -20,6 +20,9 @@ class TokenManagerSeedWallet():
         self.core = None
         self.seed_wallet_api_key = ''
         self.seed_wallet_url = ''
+        self.http_client = HTTPClient.get_default()
+        self.idempotent_transfers = False   # Set it only if the wallet deduplicates transfers by Idempotency-Key header.
+                                            # Transfers with unknown result are retried then. Otherwise they need manual reconciliation
                 
         self.logger = BBotLoggerAdapter(logging.getLogger('token_seedwallet'), self, self, '')        
 
@@ -27,7 +30,7 @@ class TokenManagerSeedWallet():
         """Initializes some values"""
         pass
 
-    def transfer(self, fromUsername: str, toUsername: str, amount: float, credential: str=''):
+    def transfer(self, fromUsername: str, toUsername: str, amount: float, credential: str='', idempotency_key: str=''):
         """
         Transfers tokens from one user to another
 
@@ -35,6 +38,7 @@ class TokenManagerSeedWallet():
         :param toUsername: (string) Username destination
         :param amount: (float) amount of tokens to be transfered
         :param credential: (string) optional. Credentials needed to move funds from source (usually passphrase or private key)
+        :param idempotency_key: (string) optional. Retries with the same key return the first transfer instead of paying again
         :returns: (string) TX hash
         """        
         self.logger.debug('Transfering ' + str(amount) + ' SEED from user ' + fromUsername + ' to user ' + toUsername)
@@ -43,7 +47,7 @@ class TokenManagerSeedWallet():
             'to': toUsername,
             'amount': str(amount)
         }
-        r = self.do_request('post', 'send', payload)
+        r = self.do_request('post', 'send', payload, {'Idempotency-Key': idempotency_key} if idempotency_key else None)
         
         try:
             aw = r.json()
@@ -72,15 +76,15 @@ class TokenManagerSeedWallet():
         
         return float(aw['balance'])
 
-    def do_request(self, type: str, method: str, payload: str=dict):
+    def do_request(self, type: str, method: str, payload: str=dict, extra_headers: dict=None):
         """
         """
-        headers = {'API-INTEGRATION-KEY': self.seed_wallet_api_key, "Content-type": "application/json"}
+        headers = {'API-INTEGRATION-KEY': self.seed_wallet_api_key, "Content-type": "application/json", **(extra_headers or {})}
         self.logger.debug('Requesting to Seed Wallet at url ' + self.seed_wallet_url + method)
         if type == 'post':            
-            r =  requests.post(self.seed_wallet_url + method, json=payload, headers=headers)
+            r =  self.http_client.post(self.seed_wallet_url + method, json=payload, headers=headers)
         if type == 'get':
-            r =  requests.get(self.seed_wallet_url + method, params=payload, headers=headers)
+            r =  self.http_client.get(self.seed_wallet_url + method, params=payload, headers=headers)
         self.logger.debug('Seed Wallet response: Code: ' + str(r.status_code) + ': ' + str(r.text[0:300]))
         return r
         
\ No newline at end of file
@@ -1,24 +1,25 @@
 """TTS wrapper class"""
 
 import os
-import boto3
 import hashlib
 import logging
 import hashlib                
 import json
 from bs4 import BeautifulSoup
 
-from bbot.core import BBotLoggerAdapter
+from bbot.core import BBotLoggerAdapter, VolleyState
 
 class TTSAmazonPolly():
 
+    # Voice of the request. It's stored per thread so concurrent requests can use different voices
+    voice_id = VolleyState(1)
+    voice_locale = VolleyState('en_US')
+
     def __init__(self, config: dict, dotbot: dict) -> None:
         """Initializes class"""
         self.config = config
         self.dotbot = dotbot
         self.logger_level = ''
-        self.voice_id = 1
-        self.voice_locale = 'en_US'
         self.tts_service_name = 'AmazonPolly'
 
         # https://docs.aws.amazon.com/polly/latest/dg/voices-in-polly.html
@@ -55,6 +56,7 @@ class TTSAmazonPolly():
     def gen_speech_audio(self, text: str, filename: str) -> bool:
         """Calls TTS service and places the audio file somewhere"""
 
+        import boto3  # imported on first synthesis
         polly_client = boto3.Session(
                 aws_access_key_id = self.config['aws_access_key_id'],                     
                 aws_secret_access_key = self.config['aws_secret_access_key'],
@@ -127,6 +129,7 @@ class TTSAmazonPolly():
             self.logger.debug('It\'s not. Requsting it to Amazon Polly')
 
         # it's not, lets generate it
+        import boto3  # imported on first synthesis
         polly_client = boto3.Session(
                 aws_access_key_id = self.config['aws_access_key_id'],                     
                 aws_secret_access_key = self.config['aws_secret_access_key'],
@@ -2,7 +2,7 @@
 import os
 import pytest
 from bbot.config import load_configuration
-from bbot.core import create_bot, ChatbotEngine
+from bbot.core import BBotCore, ChatbotEngine
 
 @pytest.fixture
 def get_configuration_path() -> str:
@@ -17,4 +17,4 @@ def create_test_bot(config_settings: dict,
     if not config_settings:
         config_settings = load_configuration(get_configuration_path(),
                                              "BBOT_ENV", "testing")
-    return create_bot(config_settings, chatbot_engine_name)
+    return BBotCore.create_bot(config_settings, chatbot_engine_name)
@@ -0,0 +1,43 @@
+"""Unit tests for module bbot.extensions.activity_logger"""
+import threading
+from bbot.extensions.activity_logger import ActivityWriter
+
+
+class ActivityCollection():
+    """Records bulk inserts."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.unblock = threading.Event()
+        self.unblock.set()
+
+    def insert_many(self, docs: list, ordered: bool=True):
+        self.unblock.wait()
+        self.batches.append(docs)
+
+
+def test_writes_in_batches_and_flushes_on_close():
+    collection = ActivityCollection()
+    writer = ActivityWriter(collection, batch_size=10, flush_interval=60)
+    writer.start()
+    for i in range(25):
+        writer.write({'n': i})
+    writer.close()
+
+    assert [len(b) for b in collection.batches] == [10, 10, 5]
+    assert writer.get_stats()['written'] == 25
+
+
+def test_drops_when_queue_is_full():
+    collection = ActivityCollection()
+    collection.unblock.clear()
+    writer = ActivityWriter(collection, batch_size=1, flush_interval=0.01, max_queue_size=2)
+    writer.start()
+    for i in range(10):
+        writer.write({'n': i})
+    collection.unblock.set()
+    writer.close()
+
+    stats = writer.get_stats()
+    assert stats['dropped'] > 0
+    assert stats['written'] + stats['dropped'] == 10
@@ -0,0 +1,161 @@
+"""Unit tests for module bbot.bot_cache"""
+import time
+import logging
+import smokesignal
+from bbot.bot_cache import BotCache
+from bbot.core import BBotCore
+
+
+class FakeBot():
+    """Cached bot."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.disposed = False
+
+    def acquire(self):
+        pass
+
+    def dispose(self):
+        self.disposed = True
+
+
+class FakeDotRepository():
+    """Repository with bot versions and no change streams."""
+
+    def __init__(self) -> None:
+        self.bot_versions = {}
+        self.sub_versions = {}
+        self.queries = 0
+
+    def find_dotbot_versions(self, bot_ids: list) -> dict:
+        self.queries += 1
+        return {b: self.bot_versions[b] for b in bot_ids if b in self.bot_versions}
+
+    def find_publisherbot_versions(self, subscription_ids: list) -> dict:
+        self.queries += 1
+        return {s: self.sub_versions[s] for s in subscription_ids if s in self.sub_versions}
+
+
+def test_lru_eviction():
+    cache = BotCache(max_bots=2)
+    bots = [FakeBot(str(i)) for i in range(3)]
+    cache.put('a', (1, 1), bots[0], 'a', 's')
+    cache.put('b', (1, 1), bots[1], 'b', 's')
+    assert cache.get('a', (1, 1)) is bots[0]
+    cache.put('c', (1, 1), bots[2], 'c', 's')
+
+    assert cache.get('b', (1, 1)) is None
+    assert bots[1].disposed
+    assert cache.get('a', (1, 1)) is bots[0]
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_version_change_reloads_bot():
+    cache = BotCache()
+    loads = []
+
+    def loader():
+        loads.append(FakeBot(str(len(loads))))
+        return loads[-1]
+
+    bot1 = cache.get_or_load('a', (1, 1), 'a', 's', loader)
+    assert cache.get_or_load('a', (1, 1), 'a', 's', loader) is bot1
+    bot2 = cache.get_or_load('a', (2, 1), 'a', 's', loader)
+    assert bot2 is not bot1
+    assert bot1.disposed
+    assert len(loads) == 2
+
+
+def test_check_versions_is_batched():
+    dotdb = FakeDotRepository()
+    dotdb.bot_versions = {'a': 1, 'b': 1}
+    dotdb.sub_versions = {'s1': 1, 's2': 1}
+    cache = BotCache()
+    cache.put('a_s1', (1, 1), FakeBot('a'), 'a', 's1')
+    cache.put('b_s2', (1, 1), FakeBot('b'), 'b', 's2')
+    dotdb.bot_versions['a'] = 2
+
+    cache.check_versions(dotdb)
+
+    assert dotdb.queries == 2
+    assert cache.get('a_s1', (1, 1)) is None
+    assert cache.get('b_s2', (1, 1)) is not None
+
+
+def test_polling_invalidator_fallback():
+    dotdb = FakeDotRepository()
+    dotdb.bot_versions = {'a': 1}
+    cache = BotCache()
+    cache.put('a_', (1, None), FakeBot('a'), 'a', None)
+    cache.start_invalidator(dotdb, poll_interval=0.01)
+    dotdb.bot_versions['a'] = 2
+
+    for _ in range(100):
+        if not cache.entries:
+            break
+        time.sleep(0.01)
+    cache.invalidator.stop()
+
+    assert not cache.entries
+
+
+def test_bot_in_use_is_disposed_after_its_volley():
+    bot = BBotCore({}, None)
+    received = []
+    bot.on(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, lambda data: received.append(data))
+    cache = BotCache(max_bots=1)
+    cache.put('a', (1, 1), bot, 'a', 's')
+    assert cache.get('a', (1, 1)) is bot    # volley starts
+
+    cache.put('b', (1, 1), FakeBot('b'), 'b', 's')  # evicted by another thread
+    bot.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, 1)
+    bot.release()                           # volley ends
+    bot.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, 2)
+    assert received == [1]
+
+
+def test_reset_drops_bots_in_use():
+    bot = BBotCore({}, None)
+    received = []
+    bot.on(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, lambda data: received.append(data))
+    cache = BotCache()
+    cache.put('a', (1, 1), bot, 'a', 's')
+    assert cache.get('a', (1, 1)) is bot    # volley running in the parent when it forks
+
+    cache.reset()
+    bot.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, 1)
+    assert received == []
+    assert cache.get('a', (1, 1)) is None
+    assert cache.get_stats()['memory_mb'] == 0
+
+
+class EchoEngine():
+    """Chatbot engine answering the input text."""
+
+    def __init__(self) -> None:
+        self.response = {'output': []}
+
+    def reset(self):
+        self.response = {'output': []}
+
+    def get_response(self, request: dict):
+        self.response['output'].append(request['input'])
+
+
+class UncachedCore(BBotCore):
+    """Core with an echo engine and an extension subscribed to its signals."""
+
+    def init(self, parent):
+        self.bot = EchoEngine()
+        self.logger = logging.getLogger('test_bot_cache')
+        self.on(BBotCore.SIGNAL_GET_RESPONSE_AFTER, lambda data: None)
+
+
+def test_uncached_bots_are_disposed_after_their_volley():
+    receivers = len(smokesignal.receivers)
+    config = {'plugin_class': 'tests.bbot.test_bot_cache.UncachedCore', 'bot_caching': False}
+    for _ in range(3):
+        bot = BBotCore.create_bot(config, None)
+        assert bot.get_response(BBotCore.create_request('hi', 'user1')) == {'output': ['hi']}
+    assert len(smokesignal.receivers) == receivers
@@ -0,0 +1,115 @@
+"""Unit tests for cache backends."""
+import time
+import socketserver
+import threading
+import pytest
+from bbot.cache_classvar import CacheClassvar
+from bbot.cache_lru import CacheLRU
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Minimal RESP server supporting commands used by CacheRedis."""
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            command = args[0].upper()
+            if command == b'SET':
+                expiration = None
+                if len(args) > 4 and args[3].upper() == b'PX':
+                    expiration = time.monotonic() + int(args[4]) / 1000
+                store[args[1]] = (args[2], expiration)
+                self.wfile.write(b'+OK\r\n')
+            elif command == b'MGET':
+                self.wfile.write(b'*' + str(len(args) - 1).encode() + b'\r\n')
+                for key in args[1:]:
+                    value, expiration = store.get(key, (None, None))
+                    if value is None or (expiration and expiration <= time.monotonic()):
+                        self.wfile.write(b'$-1\r\n')
+                    else:
+                        self.wfile.write(b'$' + str(len(value)).encode() + b'\r\n' + value + b'\r\n')
+            elif command == b'DEL':
+                self.wfile.write(b':' + str(int(store.pop(args[1], None) is not None)).encode() + b'\r\n')
+            else:
+                self.wfile.write(b'+OK\r\n')
+
+
+@pytest.fixture
+def fake_redis_uri():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeRedisHandler)
+    server.daemon_threads = True
+    server.store = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'redis://127.0.0.1:' + str(server.server_address[1]) + '/0?protocol=2'  # fake server speaks RESP2 only
+    server.shutdown()
+    server.server_close()
+
+
+def test_classvar_ttl():
+    cache = CacheClassvar({}, None)
+    cache.set('key', 'value', 0.05)
+    assert cache.get('key') == 'value'
+    time.sleep(0.06)
+    assert cache.get('key') is None
+
+
+def test_classvar_max_size():
+    CacheClassvar.cache.clear()
+    cache = CacheClassvar({}, None)
+    cache.max_size = 2
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 3)
+    cache.set('c', 4)
+    assert cache.get('b') is None
+    assert cache.get('a') == 3 and cache.get('c') == 4
+    assert cache.evictions == 1
+
+
+def test_lru_eviction_and_many():
+    CacheLRU.entries.clear()
+    cache = CacheLRU({}, None)
+    cache.max_size = 2
+    cache.set_many({'a': 1, 'b': 2})
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+    assert cache.get_stats()['evictions'] == 1
+    cache.delete('a')
+    assert cache.get('a') is None
+
+
+def test_redis_against_fake_server(fake_redis_uri):
+    pytest.importorskip('redis')
+    from bbot.cache_redis import CacheRedis
+    cache = CacheRedis({'uri': fake_redis_uri}, None)
+    cache.init(None)
+
+    cache.set('weather', {'city': 'Paris', 'temp': 20})
+    cache.set_many({'a': [1, 2], 'b': 'text'})
+    cache.set('short', 'lived', 0.05)
+    assert cache.get('weather') == {'city': 'Paris', 'temp': 20}
+    assert cache.get_many(['a', 'b', 'missing']) == {'a': [1, 2], 'b': 'text'}
+    time.sleep(0.06)
+    assert cache.get('short') is None
+    cache.delete('a')
+    assert cache.get('a') is None
+
+
+def test_redis_server_down_is_a_miss():
+    pytest.importorskip('redis')
+    from bbot.cache_redis import CacheRedis
+    cache = CacheRedis({'uri': 'redis://127.0.0.1:1/0'}, None)
+    cache.init(None)
+
+    cache.set('key', 'value')
+    assert cache.get('key') is None
+    assert cache.get_stats()['errors'] == 2
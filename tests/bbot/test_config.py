@@ -22,3 +22,56 @@ def test_load_configuration_file_successfully():
     settings = load_configuration(get_configuration_path(), "BBOT_ENV",
                                   "testing")
     assert settings  # empty dictionaries evaluate to False in Python
+
+
+def test_configuration_snapshot(tmp_path, monkeypatch):
+    """Configuration is interpolated, read only and reused from its snapshot"""
+    import yaml
+    from bbot import config
+    monkeypatch.setattr(config, 'SNAPSHOT_PATH', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(config, 'config_cache', {})
+    monkeypatch.setenv('BBOT_TEST_HOST', 'localhost')
+    monkeypatch.setenv('BBOT_TEST_PORTS', '[80, 443]')
+    (tmp_path / 'config_snapshot.yml').write_text(
+        "server:\n"
+        "  host: <%= ENV['BBOT_TEST_HOST'] %>/path\n"
+        "  ports: <%= ENV_UNQUOTED['BBOT_TEST_PORTS'] %>\n"
+        "  names:\n"
+        "    - a\n")
+
+    settings = config.load_configuration(str(tmp_path), "BBOT_TEST_ENV", "snapshot")
+    assert settings['server']['host'] == 'localhost/path'
+    assert settings['server']['ports'] == (80, 443)
+    assert settings['server']['names'] == ('a',)
+    with pytest.raises(TypeError):
+        settings['server']['host'] = 'other'
+    assert config.load_configuration(str(tmp_path), "BBOT_TEST_ENV", "snapshot") is settings
+
+    # The snapshot is used after a reload if nothing changed
+    def fail(*args, **kwargs):
+        raise AssertionError('Configuration parsed again')
+    with monkeypatch.context() as m:
+        m.setattr(yaml, 'load', fail)
+        config.reload_configuration()
+        assert config.load_configuration(str(tmp_path), "BBOT_TEST_ENV", "snapshot") == settings
+
+    # It's parsed again when an environment variable it uses changes
+    config.reload_configuration()
+    monkeypatch.setenv('BBOT_TEST_HOST', 'example.com')
+    settings = config.load_configuration(str(tmp_path), "BBOT_TEST_ENV", "snapshot")
+    assert settings['server']['host'] == 'example.com/path'
+
+
+def test_no_snapshot_or_signal_by_default(tmp_path, monkeypatch):
+    """Secrets are not written to disk and SIGHUP keeps terminating the process unless the operator enables them"""
+    import signal
+    from bbot import config
+    monkeypatch.setattr(config, 'SNAPSHOT_PATH', None)
+    monkeypatch.setattr(config, 'config_cache', {})
+    monkeypatch.setenv('BBOT_TEST_SECRET', 'secret')
+    (tmp_path / 'config_secret.yml').write_text("password: <%= ENV['BBOT_TEST_SECRET'] %>\n")
+    handler = signal.getsignal(signal.SIGHUP)
+
+    assert config.load_configuration(str(tmp_path), "BBOT_TEST_ENV", "secret")['password'] == 'secret'
+    assert [p.name for p in tmp_path.iterdir()] == ['config_secret.yml']
+    assert signal.getsignal(signal.SIGHUP) == handler
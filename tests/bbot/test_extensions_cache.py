@@ -0,0 +1,94 @@
+"""Unit tests for module bbot.extensions_cache"""
+import time
+import threading
+from bbot.cache_lru import CacheLRU
+from bbot.core import BBotCore
+from bbot.extensions_cache import ExtensionsCache
+
+
+def test_keys_are_canonical():
+    key1 = ExtensionsCache.get_key('bot', 'weather', [{'city': 'Paris', 'country': 'FR'}])
+    key2 = ExtensionsCache.get_key('bot', 'weather', [{'country': 'FR', 'city': 'Paris'}])
+    key3 = ExtensionsCache.get_key('bot', 'weather', [{'city': 'London', 'country': 'UK'}])
+    assert key1 == key2
+    assert key1 != key3
+
+
+def test_none_is_cached():
+    CacheLRU.entries.clear()
+    cache = CacheLRU({}, None)
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        return None
+
+    assert ExtensionsCache.call(cache, 'key', lookup) is None
+    assert ExtensionsCache.call(cache, 'key', lookup) is None
+    assert len(calls) == 1
+
+
+def test_concurrent_calls_are_coalesced():
+    CacheLRU.entries.clear()
+    cache = CacheLRU({}, None)
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return {'text': 'Sunny'}
+
+    threads = [threading.Thread(target=lambda: results.append(ExtensionsCache.call(cache, 'weather', fetch, {'cache_ttl': 60})))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{'text': 'Sunny'}] * 5
+
+
+class FakeCore():
+    """Core resolving {'$get': name} args from the user variables."""
+
+    def __init__(self) -> None:
+        CacheLRU.entries.clear()
+        self.bot_id = 'bot'
+        self.cache = CacheLRU({}, None)
+        self.vars = {}
+        self.bbot = self
+
+    def resolve_arg(self, arg, f_type: str='R', render: bool=False):
+        return self.vars[arg['$get']] if isinstance(arg, dict) and '$get' in arg else arg
+
+    def get_functions_map(self) -> dict:
+        return {'weather': {'cache_ttl': 60}}
+
+
+class Weather():
+    """Extension returning the resolved location."""
+
+    def __init__(self, core: FakeCore) -> None:
+        self.core = core
+        self.logger = None
+        self.calls = 0
+
+    @BBotCore.extensions_cache
+    def weather(self, args, f_type):
+        self.calls += 1
+        return {'location': self.core.resolve_arg(args[0], f_type)}
+
+
+def test_key_uses_resolved_args():
+    core = FakeCore()
+    extension = Weather(core)
+    city = {'$get': 'city'}
+
+    core.vars['city'] = 'Paris'
+    assert extension.weather([city], 'R') == {'location': 'Paris'}
+    core.vars['city'] = 'London'
+    assert extension.weather([city], 'R') == {'location': 'London'}
+    assert extension.weather([city], 'R') == {'location': 'London'}
+    assert extension.calls == 2
@@ -0,0 +1,63 @@
+"""Unit tests for the shared HTTP client."""
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from bbot.http_client import HTTPClient
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    server.daemon_threads = True
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, 'http://127.0.0.1:' + str(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(server_url):
+    server, url = server_url
+    client = HTTPClient.get_default()
+    for _ in range(5):
+        assert client.get(url + '/ping').text == 'ok'
+    assert len(server.connections) == 1
+    assert HTTPClient.get_default() is client
+
+
+def test_clients_with_same_settings_share_pool():
+    a = HTTPClient({})
+    b = HTTPClient({})
+    b.read_timeout = 1
+    assert a.get_pool() is HTTPClient.get_default().get_pool()
+    assert b.get_pool() is not a.get_pool()
+
+
+def test_default_timeout_is_applied():
+    client = HTTPClient({})
+    sent = {}
+
+    class Pool():
+        def request(self, method, url, **kwargs):
+            sent.update(kwargs)
+
+    client.pool = Pool()
+    client.get('http://example.com')
+    assert sent['timeout'] == (client.connect_timeout, client.read_timeout)
+    client.get('http://example.com', timeout=1)
+    assert sent['timeout'] == 1
@@ -0,0 +1,56 @@
+"""Unit tests for plugins loaded on first use."""
+import logging
+from bbot.core import BBotCore, BBotLoggerAdapter, Plugin
+from bbot.lazy_plugin import LazyPlugin
+
+PLUGIN_CLASS = 'tests.bbot.test_lazy_plugin.CountingExtension'
+
+
+class CountingExtension():
+    """Extension counting its instances."""
+    instances = 0
+    FUNCTIONS = {'countCalls': {'method': 'count_calls', 'cost': 1, 'register_enabled': True}}
+
+    def __init__(self, config: dict, dotbot: dict) -> None:
+        CountingExtension.instances += 1
+        self.prefix = ''
+
+    def init(self, core: BBotCore):
+        for function_name, fmap in CountingExtension.FUNCTIONS.items():
+            core.register_function(function_name, {**fmap, 'object': self})
+
+    def count_calls(self, args, f_type):
+        return self.prefix + args[0]
+
+
+class DummyDotBot():
+    """Dummy dotbot."""
+    bot_id = 'bot'
+
+
+def test_plugin_is_loaded_on_first_call():
+    CountingExtension.instances = 0
+    core = BBotCore({}, DummyDotBot())
+    core.logger = BBotLoggerAdapter(logging.getLogger('core'), core, core, 'core')
+
+    lazy = Plugin.load_plugin({'plugin_class': PLUGIN_CLASS, 'prefix': '> '}, DummyDotBot(), core)
+    assert isinstance(lazy, LazyPlugin)
+    assert CountingExtension.instances == 0
+    fmap = core.bbot.get_functions_map()['countCalls']
+    assert fmap['lazy'] and fmap['cost'] == 1
+    function = core.bbot.get_functions_namespace()['countCalls']
+
+    assert getattr(fmap['object'], fmap['method'])(['a'], 'R') == '> a'
+    assert CountingExtension.instances == 1
+    assert isinstance(fmap['object'], CountingExtension) and not fmap['lazy']
+    assert core.bbot.get_functions_namespace()['countCalls'] is function  # no rebuild needed
+    lazy.prefix = '>> '
+    assert lazy.count_calls(['b'], 'R') == '>> b'
+    assert CountingExtension.instances == 1
+    assert any(p['plugin_class'] == PLUGIN_CLASS for p in Plugin.get_load_profile())
+
+
+def test_lazy_can_be_disabled():
+    assert LazyPlugin.is_lazy({'plugin_class': 'bbot.extensions.weather_report.WeatherReport'})
+    assert not LazyPlugin.is_lazy({'plugin_class': 'bbot.extensions.weather_report.WeatherReport', 'lazy': False})
+    assert not LazyPlugin.is_lazy({'plugin_class': 'bbot.extensions.token_manager.TokenManager'})
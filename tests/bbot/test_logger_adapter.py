@@ -0,0 +1,70 @@
+"""Unit tests for BBotLoggerAdapter"""
+import io
+import time
+import logging
+from bbot.core import BBotLoggerAdapter
+
+
+class Module():
+    logger_level = ''
+
+
+class Bot():
+    dotbot = {'id': 'bot1', 'name': 'Bot One'}
+    user_id = 'user1'
+
+
+class Expensive():
+    """Value counting how many times it's converted to string"""
+
+    def __init__(self) -> None:
+        self.str_calls = 0
+
+    def __str__(self) -> str:
+        self.str_calls += 1
+        return 'x' * 10000
+
+
+def get_logger(level):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(bot_id)s %(user_id)s %(message)s'))
+    logger = logging.getLogger('test_logger_adapter.' + logging.getLevelName(level))
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(level)
+    return BBotLoggerAdapter(logger, Module(), Bot(), 'test'), stream
+
+
+def test_context_and_lazy_formatting():
+    logger, stream = get_logger(logging.DEBUG)
+    value = Expensive()
+    logger.debug('Response: %s', value)
+    logger.debug('Again')
+    assert value.str_calls == 1
+    assert stream.getvalue().splitlines()[1] == 'bot1 user1 Again'
+    context = logger.get_context()
+    assert logger.get_context() is context     # built once per volley
+
+    logger.bot.user_id = 'user2'               # next volley
+    assert logger.get_context()['user_id'] == 'user2'
+
+    logger, stream = get_logger(logging.INFO)
+    logger.debug('Response: %s', value)
+    assert value.str_calls == 1
+    assert stream.getvalue() == ''
+
+
+def test_disabled_level_doesnt_format(record_property):
+    """Debug calls with big arguments are not formatted when DEBUG is off"""
+    value = Expensive()
+    logger, stream = get_logger(logging.INFO)
+    start = time.perf_counter()
+    for _ in range(1000):
+        logger.debug('Response: %s', value)
+    record_property('debug_call_at_info_us', round((time.perf_counter() - start) / 1000 * 1e6, 3))
+    assert value.str_calls == 0
+    assert stream.getvalue() == ''
+
+    logger.info('Response: %s', value)
+    assert value.str_calls == 1
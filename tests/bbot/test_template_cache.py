@@ -0,0 +1,28 @@
+"""Unit tests for module bbot.template_cache"""
+from bbot.template_cache import TemplatorCache
+
+
+def test_render_with_globals():
+    """Compiled templates are rendered with the globals of each call."""
+    cache = TemplatorCache()
+    assert cache.render('Hello $name', {'name': 'Joe'}) == 'Hello Joe\n'
+    assert cache.render('Hello $name', {'name': 'Ann'}) == 'Hello Ann\n'
+    assert cache.render('$upper(name)', {'name': 'a', 'upper': str.upper}) == 'A\n'
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 2
+
+
+def test_lru_eviction():
+    """Least recently used templates are evicted first."""
+    cache = TemplatorCache(2)
+    cache.get_code('a')
+    cache.get_code('b')
+    cache.get_code('a')
+    cache.get_code('c')
+    assert list(cache.templates.keys()) == ['a', 'c']
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['size'] == 2
+    cache.set_max_size(1)
+    assert list(cache.templates.keys()) == ['c']
+    assert cache.get_stats()['evictions'] == 2
@@ -0,0 +1,89 @@
+"""Unit tests for module bbot.extensions.token_manager"""
+import logging
+import datetime
+import pytest
+from bbot.extensions.token_manager import TokenManager
+
+
+class PaymentsRepository():
+    """Returns last payment date counting queries."""
+
+    def __init__(self, last_payment_date) -> None:
+        self.last_payment_date = last_payment_date
+        self.queries = 0
+
+    def get_last_payment_date_by_subscription_id(self, subscription_id):
+        self.queries += 1
+        return self.last_payment_date
+
+
+def create_token_manager(last_payment_date) -> TokenManager:
+    TokenManager.invalidate_payment_status()
+    token_manager = TokenManager({}, None)
+    token_manager.logger = logging.getLogger('test')
+    token_manager.greenhousedb = PaymentsRepository(last_payment_date)
+    return token_manager
+
+
+def test_paid_status_is_cached_until_expiry():
+    last_payment = datetime.datetime.now() - datetime.timedelta(days=29)
+    token_manager = create_token_manager(last_payment)
+    assert token_manager.check_period_payment_status('sub1')
+    assert token_manager.check_period_payment_status('sub1')
+    assert token_manager.greenhousedb.queries == 1
+    assert TokenManager.payment_status['sub1'] == (True, last_payment + datetime.timedelta(days=30))
+
+
+def test_unpaid_status_is_invalidated_by_new_payment():
+    token_manager = create_token_manager(datetime.datetime.now() - datetime.timedelta(days=31))
+    assert not token_manager.check_period_payment_status('sub1')
+    assert not token_manager.check_period_payment_status('sub1')
+    assert token_manager.greenhousedb.queries == 1
+
+    token_manager.greenhousedb.last_payment_date = datetime.datetime.now()
+    TokenManager.invalidate_payment_status('sub1')
+    assert token_manager.check_period_payment_status('sub1')
+    assert token_manager.greenhousedb.queries == 2
+
+
+class StopWatching(BaseException):
+    """Ends the watcher loop."""
+
+
+class PaymentsStream():
+    """Change stream of subscription payments."""
+
+    def __init__(self, changes: list) -> None:
+        self.changes = changes
+
+    def __enter__(self):
+        return iter(self.changes)
+
+    def __exit__(self, *args):
+        return False
+
+
+class PaymentsCollection():
+    """Collection whose change streams fail, then return a payment and then stop the test."""
+
+    def __init__(self) -> None:
+        self.streams = [ConnectionError('MongoDB down'), [{'fullDocument': {'subscriptionId': 'sub2'}}], StopWatching()]
+
+    def watch(self, pipeline: list, full_document: str):
+        stream = self.streams.pop(0)
+        if isinstance(stream, BaseException):
+            raise stream
+        return PaymentsStream(stream)
+
+
+def test_payment_watcher_is_restarted_after_errors(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('time.sleep', sleeps.append)
+    token_manager = create_token_manager(None)
+    token_manager.greenhousedb.mongo = type('Database', (), {'subscription_payments': PaymentsCollection()})()
+    TokenManager.payment_status['sub1'] = (False, datetime.datetime.max)
+    TokenManager.payment_status['sub2'] = (False, datetime.datetime.max)
+    with pytest.raises(StopWatching):
+        token_manager.watch_subscription_payments()
+    assert TokenManager.payment_status == {}    # payments stored while it was down are not seen
+    assert sleeps == [2]
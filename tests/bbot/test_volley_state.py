@@ -0,0 +1,46 @@
+"""Unit tests for per-volley state of cached bots."""
+import threading
+from bbot.core import BBotCore, VolleyState
+
+
+class Holder():
+    """Object with volley state."""
+
+    output = VolleyState(list)
+    user_id = VolleyState('')
+
+
+def test_volley_state_is_isolated_per_thread():
+    holder = Holder()
+    holder.user_id = 'main'
+    holder.output.append('main output')
+    seen = {}
+
+    def volley():
+        seen['user_id'] = holder.user_id
+        seen['output'] = holder.output
+        holder.user_id = 'thread'
+
+    t = threading.Thread(target=volley)
+    t.start()
+    t.join()
+
+    assert seen == {'user_id': '', 'output': []}
+    assert holder.user_id == 'main'
+    assert holder.output == ['main output']
+
+
+def test_signals_are_scoped_per_bot():
+    bot1 = BBotCore({}, None)
+    bot2 = BBotCore({}, None)
+    received = []
+    bot1.on(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, lambda data: received.append('bot1'))
+    bot2.on(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, lambda data: received.append('bot2'))
+
+    bot1.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, {})
+    assert received == ['bot1']
+
+    bot1.dispose()
+    bot1.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, {})
+    bot2.emit(BBotCore.SIGNAL_GET_RESPONSE_BEFORE, {})
+    assert received == ['bot1', 'bot2']
@@ -0,0 +1,77 @@
+"""Unit tests for module channels.publisher_cache"""
+import time
+from channels.publisher_cache import PublisherBotCache
+
+
+class Record():
+    """Publisher bot or dotbot."""
+
+    def __init__(self, **kwargs) -> None:
+        self.__dict__.update(kwargs)
+
+
+class FakeDotRepository():
+    """Repository counting queries."""
+
+    def __init__(self) -> None:
+        self.pub_updated_at = 1
+        self.bot_updated_at = 1
+        self.loads = 0
+        self.version_queries = 0
+
+    def find_publisherbot_and_dotbot_by_publisher_token(self, pub_token: str) -> tuple:
+        self.loads += 1
+        if not pub_token.startswith('token'):
+            return None, None
+        return (Record(id='sub1', bot_id='bot1', services=[], channels={'telegram': {}}, updated_at=self.pub_updated_at),
+                Record(bot_id='bot1', updated_at=self.bot_updated_at))
+
+    def find_publisherbot_versions(self, subscription_ids: list) -> dict:
+        self.version_queries += 1
+        return {'sub1': self.pub_updated_at}
+
+    def find_dotbot_versions(self, bot_ids: list) -> dict:
+        self.version_queries += 1
+        return {'bot1': self.bot_updated_at}
+
+
+def test_resolution_is_cached_and_extended():
+    PublisherBotCache.invalidate()
+    dotdb = FakeDotRepository()
+    pub_bot, dotbot = PublisherBotCache.resolve(dotdb, 'token')
+    assert dotbot.botsubscription is pub_bot
+    assert dotbot.channels == {'telegram': {}}
+    assert PublisherBotCache.resolve(dotdb, 'token') == (pub_bot, dotbot)
+    assert dotdb.loads == 1
+
+    assert PublisherBotCache.resolve(dotdb, 'unknown') == (None, None)
+    assert PublisherBotCache.resolve(dotdb, 'unknown') == (None, None)
+    assert dotdb.loads == 3
+
+
+def test_expired_entries_are_revalidated_by_updated_at():
+    PublisherBotCache.invalidate()
+    dotdb = FakeDotRepository()
+    pub_bot, dotbot = PublisherBotCache.resolve(dotdb, 'token', 0.05)
+    time.sleep(0.06)
+    assert PublisherBotCache.resolve(dotdb, 'token', 0.05)[1] is dotbot
+    assert dotdb.loads == 1
+    assert dotdb.version_queries == 2
+
+    dotdb.bot_updated_at = 2
+    time.sleep(0.06)
+    _, new_dotbot = PublisherBotCache.resolve(dotdb, 'token', 0.05)
+    assert new_dotbot is not dotbot
+    assert new_dotbot.updated_at == 2
+    assert dotdb.loads == 2
+
+
+def test_least_recently_used_tokens_are_evicted(monkeypatch):
+    PublisherBotCache.invalidate()
+    monkeypatch.setattr(PublisherBotCache, 'max_entries', 2)
+    dotdb = FakeDotRepository()
+    for token in ('token1', 'token2', 'token1', 'token3'):
+        PublisherBotCache.resolve(dotdb, token)
+
+    assert list(PublisherBotCache.entries) == ['token1', 'token3']
+    assert dotdb.loads == 3
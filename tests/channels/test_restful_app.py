@@ -0,0 +1,128 @@
+"""Cold start of the RESTful channel Flask app."""
+import os
+import sys
+import json
+import subprocess
+from bbot.core import ChatbotEngine
+from dot_repository.models import DotBot, PublisherBot
+
+ROOT = os.path.abspath(os.path.dirname(__file__) + '/../..')
+COLD_START_BUDGET_MS = 5000
+
+# Runs in a new interpreter: time to first served /restful request from process start.
+# Flask app and channel imports only. The channel answers without resolving tokens or building bots
+FLASK_SMOKE_SCRIPT = '''
+import time
+start = time.perf_counter()
+import sys, json
+from channels.restful.app import create_app
+config = {
+    'enabled_channels': ['restful'],
+    'channel_restful': {'plugin_class': 'tests.channels.test_restful_app.EchoChannel', 'cors_origin': '*'},
+    'channel_telegram': {'plugin_class': 'channels.telegram.telegram.Telegram'},
+}
+response = create_app(config).test_client().post('/restful', json={'input': {'text': 'hi'}})
+print(json.dumps({'status': response.status_code, 'body': response.get_data(as_text=True),
+                  'cold_start_ms': (time.perf_counter() - start) * 1000,
+                  'telegram_loaded': 'channels.telegram.telegram' in sys.modules}))
+'''
+
+# Same with the real Restful channel: publisher token resolution, bot build (cached) and volley.
+# The instance configuration is set in memory and the repository is in memory so no database is needed
+RESTFUL_COLD_START_SCRIPT = '''
+import time
+start = time.perf_counter()
+import os, sys, json
+from bbot import config
+from channels.restful.app import create_app
+settings = config.freeze({
+    'enabled_channels': ['restful'],
+    'bbot_core': {'plugin_class': 'bbot.core.BBotCore', 'bot_caching': True},
+    'chatbot_engines': {'echo': {'plugin_class': 'tests.channels.test_restful_app.EchoEngine'}},
+    'channel_restful': {
+        'plugin_class': 'channels.restful.restful.Restful', 'endpoint_path': '/restful', 'cors_origin': '*',
+        'dotdb': {'plugin_class': 'tests.channels.test_restful_app.InMemoryDotRepository'}},
+    'channel_telegram': {'plugin_class': 'channels.telegram.telegram.Telegram'},
+})
+config.config_cache[os.path.abspath('instance') + '|' + os.environ['BBOT_ENV']] = settings  # read by channel and bot
+client = create_app(settings).test_client()
+body = {'userId': 'user1', 'pubToken': 'token1', 'input': {'text': 'hi'}}
+response = client.post('/restful', json=body)
+cold_start = time.perf_counter() - start
+start = time.perf_counter()
+client.post('/restful', json=body)
+print(json.dumps({'status': response.status_code, 'body': response.get_data(as_text=True),
+                  'cold_start_ms': cold_start * 1000, 'warm_request_ms': (time.perf_counter() - start) * 1000,
+                  'telegram_loaded': 'channels.telegram.telegram' in sys.modules}))
+'''
+
+
+class EchoChannel():
+    """RESTful channel answering the input text."""
+
+    def __init__(self, config: dict, dotbot: dict=None) -> None:
+        self.config = config
+
+    def get_endpoint_path(self) -> str:
+        return '/restful'
+
+    def endpoint(self, request) -> dict:
+        return {'response': json.dumps(request.get_json()['input']), 'status': 200, 'mimetype': 'application/json'}
+
+
+class EchoEngine(ChatbotEngine):
+    """Chatbot engine answering the input text."""
+
+    def __init__(self, config: dict, dotbot: dict) -> None:
+        super().__init__(config, dotbot)
+
+    def init(self, core):
+        super().init(core)
+
+    def get_response(self, request: dict) -> dict:
+        self.add_output({'type': 'message', 'text': request['input']['text']})
+        return self.response
+
+
+class InMemoryDotRepository():
+    """Repository with one published bot."""
+
+    def __init__(self, config: dict, dotbot: dict=None) -> None:
+        self.config = config
+
+    def find_publisherbot_and_dotbot_by_publisher_token(self, pub_token: str) -> tuple:
+        if pub_token != 'token1':
+            return None, None
+        pub_bot = PublisherBot.from_document({
+            'subscriptionId': 'sub1', 'token': pub_token, 'publisherName': 'publisher', 'botId': 'bot1', 'botName': 'echo',
+            'subscriptionType': 'free', 'updatedAt': 1, 'channels': {}, 'services': []})
+        dotbot = DotBot.from_document({
+            'ownerName': 'owner', 'botId': 'bot1', 'name': 'echo', 'title': 'Echo', 'chatbotEngine': {'type': 'echo'},
+            'perUseCost': 0, 'perMonthCost': 0, 'updatedAt': 1})
+        return pub_bot, dotbot
+
+
+def run_cold_start(script: str) -> dict:
+    env = {**os.environ, 'BBOT_ENV': 'cold_start'}
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def test_flask_app_smoke(record_property):
+    """Flask app creation and channel imports only. See test_cold_start_to_first_restful_request for the real channel"""
+    result = run_cold_start(FLASK_SMOKE_SCRIPT)
+    record_property('flask_cold_start_ms', round(result['cold_start_ms'], 1))
+    assert result['status'] == 200
+    assert json.loads(result['body']) == {'text': 'hi'}
+    assert not result['telegram_loaded']
+    assert result['cold_start_ms'] < COLD_START_BUDGET_MS
+
+
+def test_cold_start_to_first_restful_request(record_property):
+    result = run_cold_start(RESTFUL_COLD_START_SCRIPT)
+    record_property('cold_start_ms', round(result['cold_start_ms'], 1))
+    record_property('warm_request_ms', round(result['warm_request_ms'], 1))
+    assert result['status'] == 200, result['body']
+    assert json.loads(result['body'])['output'] == [{'type': 'message', 'text': 'hi'}]
+    assert not result['telegram_loaded']
+    assert result['cold_start_ms'] < COLD_START_BUDGET_MS
@@ -0,0 +1,92 @@
+"""Unit tests for the RESTful channel async server."""
+import json
+import time
+import asyncio
+from channels.restful.restful import Restful
+from channels.restful.asgi import RestfulASGIApp
+
+
+class SlowRestful(Restful):
+    """Restful channel whose bot takes 0.1 seconds to respond."""
+
+    def get_response(self, params: dict) -> dict:
+        self.params = params
+        time.sleep(0.1)
+        return {'response': json.dumps({'output': [{'type': 'message', 'text': self.params['input']['text']}]}),
+                'status': 200, 'mimetype': 'application/json'}
+
+
+def create_app(workers: int, max_pending: int) -> RestfulASGIApp:
+    restful = SlowRestful({'endpoint_path': '/restful', 'cors_origin': '*'})
+    restful.async_workers = workers
+    restful.async_max_pending = max_pending
+    return RestfulASGIApp(restful)
+
+
+async def post(app: RestfulASGIApp, body: dict) -> dict:
+    """Sends a request to the app and returns the response messages."""
+    received = [{'type': 'http.request', 'body': json.dumps(body).encode(), 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return received.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app({'type': 'http', 'method': 'POST', 'path': '/restful', 'headers': []}, receive, send)
+    return {'status': sent[0]['status'], 'headers': dict(sent[0]['headers']), 'body': json.loads(sent[1]['body'])}
+
+
+def test_concurrent_requests():
+    """Requests are served concurrently and each one gets its own params."""
+    app = create_app(20, 100)
+
+    async def run():
+        return await asyncio.gather(*[post(app, {'input': {'text': 'user ' + str(i)}}) for i in range(20)])
+
+    start = time.monotonic()
+    responses = asyncio.run(run())
+    assert time.monotonic() - start < 1
+    assert [r['body']['output'][0]['text'] for r in responses] == ['user ' + str(i) for i in range(20)]
+    assert responses[0]['headers'][b'access-control-allow-origin'] == b'*'
+
+
+def test_requests_over_max_pending_are_rejected():
+    """Server answers 503 instead of queueing too many requests."""
+    app = create_app(2, 3)
+
+    async def run():
+        return await asyncio.gather(*[post(app, {'input': {'text': 'hi'}}) for i in range(5)])
+
+    statuses = sorted(r['status'] for r in asyncio.run(run()))
+    assert statuses == [200, 200, 200, 503, 503]
+
+
+def test_shutdown_doesnt_block_the_loop():
+    """Running volleys end while the server shuts down and the loop keeps running meanwhile."""
+    app = create_app(2, 10)
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+    ticks = []
+
+    async def receive():
+        if len(messages) == 1:
+            await asyncio.sleep(0.01)   # shutdown starts once the volley is running
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    async def tick():
+        while 'lifespan.shutdown.complete' not in sent:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        return await asyncio.gather(post(app, {'input': {'text': 'hi'}}), app({'type': 'lifespan'}, receive, send), tick())
+
+    response, _, _ = asyncio.run(run())
+    assert response['status'] == 200
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert len(ticks) > 5
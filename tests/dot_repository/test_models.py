@@ -0,0 +1,35 @@
+"""Unit tests for module dot_repository.models"""
+import pytest
+from dot_repository.models import DotBot, PublisherBot
+from bbot.bot_cache import BotCache
+
+
+DOTBOT_DOC = {'ownerName': 'owner', 'botId': 'bot1', 'name': 'bot', 'title': 'Bot', 'chatbotEngine': {'type': 'dotflow2'},
+              'perUseCost': 1, 'perMonthCost': 0, 'updatedAt': 1}
+
+
+def test_marshall_from_document():
+    dotbot = DotBot.from_document(DOTBOT_DOC)
+    assert dotbot.owner_name == 'owner'
+    assert dotbot.chatbot_engine == {'type': 'dotflow2'}
+    assert dotbot.tts == {}
+    assert dotbot.botsubscription is None
+    assert not hasattr(dotbot, '__dict__')
+
+    with pytest.raises(KeyError):
+        PublisherBot.from_document({'token': 'token'})
+
+
+def test_defaults_are_not_shared():
+    a = DotBot()
+    b = DotBot.from_document(DOTBOT_DOC)
+    a.services.append('service')
+    assert b.services == []
+    with pytest.raises(AttributeError):
+        a.undeclared = True
+
+
+def test_bot_cache_estimates_slot_based_models():
+    dotbot = DotBot.from_document(DOTBOT_DOC)
+    dotbot.tts = {'voiceId': 'x' * 10000}
+    assert BotCache.estimate_size(dotbot) > 10000
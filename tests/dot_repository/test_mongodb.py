@@ -1,8 +1,121 @@
 """Text fixtures for module authorstool.mongodb."""
+import logging
 import pytest
+from bson.objectid import ObjectId
 from dot_repository.mongodb import DotRepository
+from dot_repository.models import DotBot
 
 def test_mongodb_uri_not_found():
     """MongoDB URI not found"""
     with pytest.raises(RuntimeError):
         _ = DotRepository([])
+
+
+class FakeCollection():
+    """Collection returning all its documents and counting queries."""
+
+    def __init__(self, documents: list) -> None:
+        self.documents = documents
+        self.queries = 0
+        self.projection = None
+
+    def find(self, filters: dict, projection: dict=None) -> list:
+        self.queries += 1
+        self.projection = projection
+        return list(self.documents)
+
+    def find_one(self, filters: dict, projection: dict=None) -> dict:
+        self.queries += 1
+        self.projection = projection
+        return self.documents[0] if self.documents else None
+
+
+class FakeDatabase():
+    """Database with fake collections."""
+
+    def __init__(self) -> None:
+        org_id = ObjectId()
+        self.organizations = FakeCollection([{'_id': org_id, 'name': 'org'}])
+        self.dotbot = FakeCollection([{'dotbot': {'id': 'bot1', 'name': 'bot'}, 'organizationId': str(org_id),
+                                       'deleted': 0, 'createdAt': None, 'updatedAt': None}])
+        self.greenhouse_dotbots = FakeCollection([{'ownerName': 'owner', 'botId': 'bot1', 'name': 'bot', 'title': 'Bot',
+                                                   'chatbotEngine': {}, 'perUseCost': 0, 'perMonthCost': 0, 'updatedAt': 1}])
+        self.dotflow = FakeCollection([{'dotflow': {'nodes': [{'id': str(i)}]}, 'dotbotId': 'bot1'} for i in range(50)])
+
+
+def test_dotflows_are_joined_in_batch():
+    dotdb = DotRepository({'uri': ''})
+    dotdb.mongo = FakeDatabase()
+    dotflows = dotdb.find_dotflows({'dotbotId': 'bot1'})
+    assert len(dotflows) == 50
+    assert dotflows[0].dotbot is dotflows[49].dotbot
+    assert dotflows[0].dotbot.organization.name == 'org'
+    assert (dotdb.mongo.dotflow.queries, dotdb.mongo.dotbot.queries, dotdb.mongo.organizations.queries) == (1, 1, 1)
+
+
+def test_lazy_dotbot_reference():
+    dotdb = DotRepository({'uri': ''})
+    dotdb.mongo = FakeDatabase()
+    assert len(dotdb.find_nodes_by_dotbot_id('bot1')) == 50
+    assert dotdb.mongo.dotbot.queries == 0
+
+    dotflow = dotdb.find_one_dotflow({}, lazy=True)
+    assert dotdb.mongo.dotbot.queries == 0
+    assert dotflow.dotbot.dotbot['id'] == 'bot1'
+    assert dotflow.dotbot.dotbot['id'] == 'bot1'
+    assert dotdb.mongo.dotbot.queries == 1
+
+
+def test_minimal_projections():
+    dotdb = DotRepository({'uri': ''})
+    dotdb.mongo = FakeDatabase()
+    assert dotdb.find_one_dotbot({'botId': 'bot1'}).bot_id == 'bot1'
+    assert dotdb.mongo.greenhouse_dotbots.projection == DotBot.projection
+    assert 'botId' in DotBot.projection and 'services' not in DotBot.projection
+
+    dotdb.find_node_by_id('bot1', '3')
+    assert dotdb.mongo.dotflow.projection == {'_id': 0, 'dotflow.nodes.$': 1}
+
+
+class FakeIndexedCollection():
+    """Collection recording its indexes and explaining a collection scan when the query has no index."""
+
+    def __init__(self) -> None:
+        self.indexes = []
+        self.filters = None
+
+    def create_index(self, keys: list, **kwargs) -> str:
+        if keys not in self.indexes:
+            self.indexes.append(keys)
+        return '_'.join(k + '_' + str(d) for k, d in keys)
+
+    def find(self, filters: dict):
+        self.filters = filters
+        return self
+
+    def explain(self) -> dict:
+        indexed = any(k[0][0] in self.filters for k in self.indexes)
+        stage = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}} if indexed else {'stage': 'COLLSCAN'}
+        return {'queryPlanner': {'winningPlan': stage}}
+
+
+class FakeIndexedDatabase(dict):
+    """Database creating collections on access."""
+
+    def __missing__(self, key):
+        self[key] = FakeIndexedCollection()
+        return self[key]
+
+
+def test_ensure_indexes_and_explain():
+    dotdb = DotRepository({'uri': ''})
+    dotdb.logger = logging.getLogger('test')
+    dotdb.mongo = FakeIndexedDatabase()
+    assert dotdb.explain_queries([('greenhouse_publisher_bots', {'token': ''})])[0]['collscan']
+
+    dotdb.ensure_indexes()
+    dotdb.ensure_indexes()
+    assert dotdb.mongo['greenhouse_publisher_bots'].indexes == [[('token', 1)], [('subscriptionId', 1)]]
+    plan = dotdb.explain_queries([('greenhouse_publisher_bots', {'token': ''})])[0]
+    assert plan['stages'] == ['FETCH', 'IXSCAN']
+    assert not plan['collscan']
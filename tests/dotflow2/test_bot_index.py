@@ -0,0 +1,55 @@
+"""Unit tests for module dotflow2.bot_index"""
+from engines.dotflow2.bot_index import DotFlow2BotIndex
+
+
+class DummyDotRepository():
+    """Dummy repository counting queries."""
+    def __init__(self, nodes: list) -> None:
+        self.nodes = nodes
+        self.queries = 0
+
+    def find_nodes_by_dotbot_id(self, dotbot_id: str) -> list:
+        self.queries += 1
+        return self.nodes
+
+
+NODES = [
+    {'id': 'n1', 'context': ['global'], 'paths': []},
+    {'id': 'n2', 'context': ['global', 'custom'], 'paths': []},
+    {'id': 'n3', 'paths': []},
+]
+
+
+def test_lookups():
+    """Nodes are indexed by id and by context keeping their order."""
+    index = DotFlow2BotIndex('bot', 1, NODES)
+    assert index.get_node_by_id('n3') is NODES[2]
+    assert index.get_node_by_id('missing') is None
+    assert index.get_nodes_by_context('global') == [NODES[0], NODES[1]]
+    assert index.get_nodes_by_context('custom') == [NODES[1]]
+    assert index.get_nodes_by_context('missing') == []
+
+
+def test_index_is_rebuilt_only_on_new_version():
+    """Index is compiled once per bot version."""
+    dotdb = DummyDotRepository(NODES)
+    DotFlow2BotIndex.invalidate('bot')
+    first = DotFlow2BotIndex.get_index(dotdb, 'bot', 1)
+    assert DotFlow2BotIndex.get_index(dotdb, 'bot', 1) is first
+    assert dotdb.queries == 1
+    assert DotFlow2BotIndex.get_index(dotdb, 'bot', 2) is not first
+    assert dotdb.queries == 2
+
+
+def test_least_recently_used_bots_are_evicted(monkeypatch):
+    """Only max_indexes bots are kept compiled."""
+    monkeypatch.setattr(DotFlow2BotIndex, 'indexes', type(DotFlow2BotIndex.indexes)())
+    monkeypatch.setattr(DotFlow2BotIndex, 'max_indexes', 2)
+    dotdb = DummyDotRepository(NODES)
+    DotFlow2BotIndex.get_index(dotdb, 'bot1', 1)
+    DotFlow2BotIndex.get_index(dotdb, 'bot2', 1)
+    DotFlow2BotIndex.get_index(dotdb, 'bot1', 1)
+    DotFlow2BotIndex.get_index(dotdb, 'bot3', 1)
+    assert list(DotFlow2BotIndex.indexes) == ['bot1', 'bot3']
+    DotFlow2BotIndex.get_index(dotdb, 'bot2', 1)
+    assert dotdb.queries == 4
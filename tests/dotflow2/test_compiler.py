@@ -0,0 +1,75 @@
+"""Unit tests for module dotflow2.compiler"""
+import logging
+import pytest
+from bbot.core import BBotCore, BBotLoggerAdapter, BBotException
+from engines.dotflow2.chatbot_engine import DotFlow2, DotFlow2LoggerAdapter
+from engines.dotflow2.core_functions import DotFlow2CoreFunctions
+
+
+class DummyDotBot():
+    """Dummy dotbot."""
+    bot_id = 'bot'
+    updated_at = None
+
+
+def create_engine() -> DotFlow2:
+    """Create a DotFlow2 engine with core functions registered."""
+    dotbot = DummyDotBot()
+    core = BBotCore({}, dotbot)
+    bot = DotFlow2({}, dotbot)
+    core.bot = bot
+    core.logger = BBotLoggerAdapter(logging.getLogger('core'), core, bot, 'core')
+    bot.core = core
+    bot.bbot = core.bbot
+    bot.logger = DotFlow2LoggerAdapter(logging.getLogger('dotflow2'), bot, bot)
+    DotFlow2CoreFunctions({}, dotbot).init(bot)
+    return bot
+
+
+def test_compiled_objects_are_cached():
+    """Compiled objects are reused by identity."""
+    bot = create_engine()
+    condition = {'_and': [{'_eq': [1, 1]}, {'_gt': [2, 1]}]}
+    function = bot.compiler.compile(condition)
+    assert bot.compiler.compile(condition) is function
+    assert bot.compiler.get(condition['_and'][0]) is not None
+    assert bot.compiler.get({'_eq': [1, 1]}) is None
+    assert function('C') is True
+    assert [f['function'] for f in bot.core.executed_functions] == ['eq', 'gt', 'and']
+
+
+def test_not_compiled_objects_are_not_cached():
+    """Objects executed outside the bot nodes don't grow the cache."""
+    bot = create_engine()
+    assert bot.execute_function({'_lt': [2, 1]}, 'C') is False
+    assert bot.compiler.compiled == {}
+
+
+def test_unregistered_function():
+    """Unregistered functions fail when executed."""
+    bot = create_engine()
+    function = bot.compiler.compile({'_doesntExist': []})
+    with pytest.raises(BBotException):
+        function('R')
+
+
+def test_compile_nodes():
+    """All conditions and responses from the paths are compiled."""
+    bot = create_engine()
+    node = {'id': 'n1', 'paths': [{'conditions': {'_eq': [1, 2]}, 'responses': [{'_eq': [1, 1]}]}]}
+    bot.compiler.compile_nodes([node])
+    assert bot.compiler.get(node['paths'][0]['conditions'])('C') is False
+    assert bot.compiler.get(node['paths'][0]['responses'][0])('R') is True
+
+
+def test_register_function_resets_compiled_objects():
+    """Registering a function drops compiled objects and the functions namespace."""
+    bot = create_engine()
+    namespace = bot.core.bbot.get_functions_namespace()
+    assert bot.core.bbot.get_functions_namespace() is namespace
+    function = bot.compiler.compile({'_eq': [1, 1]})
+    bot.core.register_function('dummy', {'object': bot, 'method': 'is_command', 'cost': 0, 'register_enabled': False})
+    assert bot.compiler.compiled == {}
+    assert 'dummy' in bot.core.bbot.get_functions_namespace()
+    assert bot.core.bbot.get_functions_namespace() is not namespace
+    assert function('C') is True
@@ -0,0 +1,130 @@
+"""Unit tests for concurrent execution of prefetchable functions"""
+import time
+import logging
+from bbot.core import BBotCore, BBotLoggerAdapter
+from engines.dotflow2.chatbot_engine import DotFlow2, DotFlow2LoggerAdapter
+from engines.dotflow2.core_functions import DotFlow2CoreFunctions
+from bbot.function_prefetcher import FunctionPrefetcher
+from bbot.extensions.token_manager import TokenManager
+
+
+class DummyDotBot():
+    """Dummy dotbot."""
+    bot_id = 'bot'
+    owner_name = 'owner'
+    updated_at = None
+
+
+class SlowService():
+    """Remote service taking 0.2 seconds to respond."""
+
+    def __init__(self):
+        self.calls = []
+
+    def lookup(self, args, f_type):
+        time.sleep(0.2)
+        self.calls.append(args[0])
+        return 'result ' + args[0]
+
+
+def create_engine(service: SlowService) -> DotFlow2:
+    """Create a DotFlow2 engine with a slow prefetchable function registered."""
+    dotbot = DummyDotBot()
+    core = BBotCore({}, dotbot)
+    bot = DotFlow2({}, dotbot)
+    core.bot = bot
+    core.logger = BBotLoggerAdapter(logging.getLogger('core'), core, bot, 'core')
+    bot.core = core
+    bot.bbot = core.bbot
+    bot.logger = DotFlow2LoggerAdapter(logging.getLogger('dotflow2'), bot, bot)
+    DotFlow2CoreFunctions({}, dotbot).init(bot)
+    core.register_function('lookup', {'object': service, 'method': 'lookup', 'cost': 0, 'register_enabled': True, 'prefetchable': True})
+    core.register_function('paidLookup', {'object': service, 'method': 'lookup', 'cost': 1, 'register_enabled': True, 'prefetchable': True,
+                                          'subscription_type': TokenManager.SUBSCRIPTION_TYPE_PER_USE, 'owner_name': 'service'})
+    return bot
+
+
+def test_get_calls():
+    """Only calls with constant arguments are collected."""
+    bot = create_engine(SlowService())
+    responses = [
+        {'_lookup': ['a']},
+        {'_eq': [{'_lookup': ['b']}, 'x']},
+        {'_lookup': [{'_input': []}]},
+        {'_lookup': ['{{ name }}']},
+        "Weather: {{ $lookup('c').text }} {{ $lookup(city) }}",
+    ]
+    calls = bot.compiler.get_calls(responses)
+    assert [(c[0], c[1]) for c in calls if c[0] == 'lookup'] == [('lookup', ['a']), ('lookup', ['b']), ('lookup', ['c'])]
+    assert bot.compiler.get_calls(responses) is calls
+
+
+def test_prefetched_calls_run_concurrently():
+    """Volley time is the slowest call and executed functions and signals are still registered in order."""
+    service = SlowService()
+    bot = create_engine(service)
+    signals = []
+    bot.core.on(BBotCore.SIGNAL_CALL_BBOT_FUNCTION_AFTER, lambda data: signals.append(data['name']))
+    responses = [{'_lookup': ['a']}, {'_lookup': ['b']}, {'_lookup': ['c']}]
+
+    start = time.monotonic()
+    assert bot.core.bbot.prefetch(bot.compiler.get_calls(responses)) == 3
+    results = [bot.execute_function(r, 'R') for r in responses]
+    elapsed = time.monotonic() - start
+
+    assert results == ['result a', 'result b', 'result c']
+    assert elapsed < 0.45
+    assert sorted(service.calls) == ['a', 'b', 'c']
+    assert signals == ['lookup', 'lookup', 'lookup']
+    executed = bot.core.executed_functions
+    assert [f['args'] for f in executed] == [['a'], ['b'], ['c']]
+    assert all(f['prefetched'] and f['responseTime'] >= 190 for f in executed)
+    assert bot.core.prefetched_calls == {}
+
+
+def test_single_call_is_not_prefetched():
+    """One call alone runs in the volley thread."""
+    bot = create_engine(SlowService())
+    assert bot.core.bbot.prefetch([('lookup', ['a'], 'R'), ('eq', [1, 1], 'R')]) == 0
+    bot.core.prefetch_workers = 0
+    assert bot.core.bbot.prefetch([('lookup', ['a'], 'R'), ('lookup', ['b'], 'R')]) == 0
+
+
+class Ledger():
+    """Payment ledger with a cached balance."""
+
+    def __init__(self, balance: float) -> None:
+        self.balance = balance
+
+    def has_funds(self, username: str, amount: float) -> bool:
+        return self.balance >= amount
+
+
+def test_paid_calls_are_prefetched_only_if_payment_is_accepted():
+    """Payments are checked before paid calls run ahead of the engine."""
+    bot = create_engine(SlowService())
+    token_manager = TokenManager({}, DummyDotBot())
+    bot.core.on(BBotCore.SIGNAL_PREFETCH_BBOT_FUNCTION, token_manager.function_prefetch_check)
+    calls = [('paidLookup', ['a'], 'R'), ('paidLookup', ['b'], 'R'), ('lookup', ['c'], 'R')]
+    assert bot.core.bbot.prefetch(calls) == 0     # funds can't be checked without waiting for the wallet
+
+    token_manager.payment_ledger = Ledger(0)
+    assert bot.core.bbot.prefetch(calls) == 0
+    token_manager.payment_ledger = Ledger(1)
+    assert bot.core.bbot.prefetch(calls) == 3
+    FunctionPrefetcher.cancel(bot.core.prefetched_calls)
+
+
+def test_unused_calls_are_cancelled():
+    """Calls not reached are cancelled."""
+    service = SlowService()
+    bot = create_engine(service)
+    bot.core.prefetch_workers = 1
+    assert bot.core.bbot.prefetch([('lookup', ['a'], 'R'), ('lookup', ['b'], 'R')]) == 2
+    calls = list(bot.core.prefetched_calls.values())
+    while not calls[0].future.running():
+        time.sleep(0.001)
+    FunctionPrefetcher.cancel(bot.core.prefetched_calls)
+    calls[0].future.result()
+    assert calls[1].future.cancelled()
+    assert service.calls == ['a']
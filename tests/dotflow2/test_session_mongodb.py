@@ -0,0 +1,71 @@
+"""Test SessionMongoDB unit of work."""
+from engines.dotflow2.session_mongodb import SessionMongoDB
+
+
+class UserDataCollection():
+    """Records updates sent to user_data collection."""
+
+    def __init__(self, doc: dict=None) -> None:
+        self.doc = doc
+        self.finds = 0
+        self.updates = []
+
+    def find_one(self, query: dict):
+        self.finds += 1
+        return self.doc
+
+    def update_one(self, query: dict, update: dict, upsert: bool=False):
+        self.updates.append(update)
+
+
+def create_session(doc: dict=None) -> SessionMongoDB:
+    session = SessionMongoDB({'uri': 'mongodb://localhost:27017/test'})
+    session.unit_of_work = True
+    session.user_data = UserDataCollection(doc)
+    return session
+
+
+def test_volley_loads_once_and_stores_once():
+    session = create_session({'userId': 'u1', 'user_vars': {'name': 'Bob'}})
+    session.begin('u1')
+    assert session.get_var('u1', 'name') == 'Bob'
+    session.set_var('u1', 'name', 'Alice')
+    session.set_var('u1', 'age', 30)
+    assert session.get_var('u1', 'name') == 'Alice'
+    session.push('u1', 'history', 'a')
+    session.push('u1', 'history', 'b')
+    session.commit()
+
+    assert session.user_data.finds == 1
+    assert session.user_data.updates == [{
+        '$set': {'user_vars.name': 'Alice', 'user_vars.age': 30},
+        '$push': {'history': {'$each': ['a', 'b']}}
+    }]
+
+    # Reads after the volley don't use the loaded data, other workers may have changed it
+    assert not session.has_snapshot('u1')
+    session.get_var('u1', 'name')
+    assert session.user_data.finds == 2
+
+
+def test_conflicting_set_and_push_are_merged():
+    session = create_session()
+    session.begin('u1')
+    session.set_var('u1', 'list', [1])
+    session.push('u1', 'user_vars.list', 2)
+    session.set_var('u1', 'obj', {})
+    session.set_var('u1', 'obj.a', 1)
+    session.commit()
+
+    assert session.user_data.updates == [{'$set': {'user_vars.list': [1, 2], 'user_vars.obj': {'a': 1}}}]
+
+
+def test_rollback_discards_changes():
+    session = create_session()
+    session.begin('u1')
+    session.set_var('u1', 'name', 'Alice')
+    session.rollback()
+    session.commit()
+
+    assert session.user_data.updates == []
+    assert not session.has_snapshot('u1')
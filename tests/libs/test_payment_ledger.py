@@ -0,0 +1,181 @@
+"""Unit tests for module libs.payment_ledger"""
+from types import SimpleNamespace
+from libs.payment_ledger import PaymentLedger
+
+
+class Wallet():
+    """Wallet counting balance requests."""
+
+    def __init__(self, balance: float) -> None:
+        self.balance = balance
+        self.balance_requests = 0
+
+    def get_balance(self, username: str) -> float:
+        self.balance_requests += 1
+        return self.balance
+
+
+class LedgerCollection():
+    """Stores inserted transfers."""
+
+    def __init__(self) -> None:
+        self.docs = []
+
+    def insert_one(self, doc: dict):
+        self.docs.append(doc)
+
+    def aggregate(self, pipeline: list):
+        return []
+
+
+def create_ledger(balance: float) -> PaymentLedger:
+    PaymentLedger.balances.clear()
+    ledger = PaymentLedger({'mongodb_uri': 'mongodb://localhost:27017/test'}, None)
+    ledger.ledger = LedgerCollection()
+    ledger.token_manager = Wallet(balance)
+    return ledger
+
+
+def test_aggregate_transfers_by_pair():
+    totals = PaymentLedger.aggregate_transfers([
+        {'payer': 'pub', 'payee': 'owner', 'amount': 1},
+        {'payer': 'pub', 'payee': 'owner', 'amount': 2},
+        {'payer': 'owner', 'payee': 'service', 'amount': 0.5},
+    ])
+    assert totals == {('pub', 'owner'): 3, ('owner', 'service'): 0.5}
+
+
+def test_funds_are_checked_against_cached_balance():
+    ledger = create_ledger(10)
+    for _ in range(4):
+        assert ledger.has_funds('pub', 2)
+        ledger.enqueue('pub', 'owner', 2)
+
+    assert ledger.get_balance('pub') == 2
+    assert not ledger.has_funds('pub', 5)
+    assert ledger.token_manager.balance_requests == 1
+    assert len(ledger.ledger.docs) == 4
+
+
+class SettlingLedgerCollection(LedgerCollection):
+    """Transfers collection supporting the queries used to settle them."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.failing_updates = 0    # next settled status updates failing
+
+    def insert_one(self, doc: dict):
+        super().insert_one({**doc, '_id': len(self.docs)})
+
+    @staticmethod
+    def matches(doc: dict, filters: dict) -> bool:
+        for key, cond in filters.items():
+            value = doc.get(key)
+            if isinstance(cond, dict):
+                if '$in' in cond and value not in cond['$in']:
+                    return False
+                if '$lt' in cond and not (value is not None and value < cond['$lt']):
+                    return False
+                if '$gte' in cond and not (value is not None and value >= cond['$gte']):
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+    def find(self, filters: dict, projection: dict=None):
+        return FakeCursor([d for d in self.docs if self.matches(d, filters)])
+
+    def update_many(self, filters: dict, update: dict):
+        if update.get('$set', {}).get('status') == PaymentLedger.STATUS_SETTLED and self.failing_updates:
+            self.failing_updates -= 1
+            raise ConnectionError('MongoDB down')
+        docs = [d for d in self.docs if self.matches(d, filters)]
+        for d in docs:
+            d.update(update.get('$set', {}))
+            for key in update.get('$unset', {}):
+                d.pop(key, None)
+            for key, value in update.get('$inc', {}).items():
+                d[key] = d.get(key, 0) + value
+        return SimpleNamespace(modified_count=len(docs))
+
+
+class FakeCursor(list):
+    def limit(self, count: int):
+        return self[:count]
+
+
+class SettlingWallet(Wallet):
+    """Wallet recording transfers. It applies them and then times out if asked to."""
+
+    def __init__(self, idempotent_transfers: bool=True) -> None:
+        super().__init__(100)
+        self.idempotent_transfers = idempotent_transfers
+        self.transfers = []
+        self.timeouts = 0
+
+    def transfer(self, payer: str, payee: str, amount: float, idempotency_key: str=''):
+        self.transfers.append((payer, payee, amount, idempotency_key))
+        if self.timeouts:
+            self.timeouts -= 1
+            raise TimeoutError('Read timed out')
+        return 'tx' + str(len(self.transfers))
+
+
+def create_settling_ledger(idempotent_transfers: bool=True) -> PaymentLedger:
+    ledger = create_ledger(100)
+    ledger.ledger = SettlingLedgerCollection()
+    ledger.token_manager = SettlingWallet(idempotent_transfers)
+    for _ in range(3):
+        ledger.enqueue('pub', 'owner', 1)
+    return ledger
+
+
+def test_status_update_is_retried_not_the_transfer(monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    ledger = create_settling_ledger()
+    ledger.ledger.failing_updates = 1
+    ledger.settle()
+    ledger.settle()
+
+    assert len(ledger.token_manager.transfers) == 1
+    assert {d['status'] for d in ledger.ledger.docs} == {PaymentLedger.STATUS_SETTLED}
+
+
+def test_unknown_transfer_result_is_reconciled_with_same_key():
+    ledger = create_settling_ledger()
+    ledger.token_manager.timeouts = 1
+    ledger.settle()
+    ledger.settle()  # transfers settling are never released nor sent again before claim_timeout
+
+    assert len(ledger.token_manager.transfers) == 1
+    assert {d['status'] for d in ledger.ledger.docs} == {PaymentLedger.STATUS_SETTLING}
+
+    ledger.claim_timeout = -1
+    ledger.settle()
+    first, retry = ledger.token_manager.transfers
+    assert first == retry == ('pub', 'owner', 3, ledger.ledger.docs[0]['transferId'])
+    assert {d['status'] for d in ledger.ledger.docs} == {PaymentLedger.STATUS_SETTLED}
+
+
+def test_unknown_transfer_result_is_not_retried_without_idempotency():
+    ledger = create_settling_ledger(idempotent_transfers=False)
+    ledger.token_manager.timeouts = 1
+    ledger.settle()
+    ledger.claim_timeout = -1
+    ledger.settle()
+
+    assert len(ledger.token_manager.transfers) == 1
+    assert {d['status'] for d in ledger.ledger.docs} == {PaymentLedger.STATUS_UNRECONCILED}
+
+
+def test_transfers_are_unreconciled_after_max_attempts():
+    ledger = create_settling_ledger()
+    ledger.max_attempts = 1
+    ledger.token_manager.timeouts = 2
+    ledger.settle()
+    ledger.claim_timeout = -1
+    ledger.settle()     # retried once
+    ledger.settle()
+
+    assert len(ledger.token_manager.transfers) == 2
+    assert {d['status'] for d in ledger.ledger.docs} == {PaymentLedger.STATUS_UNRECONCILED}